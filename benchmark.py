@@ -0,0 +1,113 @@
+"""
+Benchmarks of the generation pipeline, reported through logging.
+Modules import their neighbours by script-relative paths, so run from
+the repository root with:
+
+    PYTHONPATH=.:generation:generation/structure python benchmark.py [NAME ...]
+
+Benchmarks that read terrain need a server, such as the stand-in.
+"""
+from typing import Callable, Dict, NoReturn, Tuple
+import argparse
+import logging
+import random
+import time
+import tracemalloc
+
+logger = logging.getLogger('benchmark')
+
+
+def village_entity(
+        unit_upper_bounds: Tuple[int, ...] = (2000, 4000),
+        queries: int = 50,
+) -> NoReturn:
+    """Units expanded by single-destination Dijkstra and A* queries."""
+    # Imported late, as modules bind the shared connection on import.
+    from village_entity import PathAlgorithm, VillageEntity
+    from village_grid_foundation import VillageGridFoundation
+    for unit_upper_bound in unit_upper_bounds:
+        foundation = VillageGridFoundation(unit_upper_bound=unit_upper_bound)
+        foundation.build_village_grid()
+        destinations = random.sample(list(foundation), min(queries, len(foundation)))
+        for path_algorithm in PathAlgorithm:
+            entity = VillageEntity(
+                grid_foundation=foundation, path_algorithm=path_algorithm
+            )
+            expanded_units = 0
+            start_time = time.perf_counter()
+            for destination in destinations:
+                entity.create_paths([destination])
+                expanded_units += entity.expanded_units
+            elapsed = time.perf_counter() - start_time
+            logger.info(
+                f'{len(foundation):>6} units | {path_algorithm.value:<8} | '
+                f'{expanded_units / len(destinations):>9.1f} expanded/query | '
+                f'{elapsed * 1000 / len(destinations):>7.2f} ms/query'
+            )
+
+
+def village_grid_foundation(unit_upper_bound: int = 2000) -> NoReturn:
+    """Per-unit peak memory and construction time of a full foundation."""
+    from village_grid_foundation import VillageGridFoundation
+    for dense in (False, True):
+        foundation = VillageGridFoundation(unit_upper_bound=unit_upper_bound)
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        if dense:
+            units = len(foundation.build_village_array())
+        else:
+            foundation.build_village_grid()
+            units = len(foundation)
+        elapsed = time.perf_counter() - start_time
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        logger.info(
+            f'{"array" if dense else "object"}: '
+            f'{units} units | {peak / units:.0f} B/unit at peak | '
+            f'{elapsed * 1000:.1f} ms/foundation'
+        )
+
+
+def house_blueprint(runs: int = 20) -> NoReturn:
+    """Per-cell memory and construction time of a full house blueprint."""
+    from mcpi.vec3 import Vec3
+    from blueprint import HouseBlueprint
+    for dense in (False, True):
+        elapsed: float = 0
+        for _ in range(runs):
+            tracemalloc.start()
+            start = time.perf_counter()
+            blueprint = HouseBlueprint(
+                Vec3(10, 10, 10), Vec3(0, 0, 5), Vec3(5, 5, 5), dense=dense
+            )
+            blueprint.run_engine()
+            elapsed += time.perf_counter() - start
+            allocated, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        cells = len(list(blueprint))
+        logger.info(
+            f'{"dense" if dense else "object"}: '
+            f'{cells} cells | {allocated / cells:.0f} B/cell | '
+            f'{elapsed * 1000 / runs:.1f} ms/blueprint'
+        )
+
+
+BENCHMARKS: Dict[str, Callable[[], NoReturn]] = {
+    'village_entity': village_entity,
+    'village_grid_foundation': village_grid_foundation,
+    'house_blueprint': house_blueprint,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'names', nargs='*', metavar='NAME', default=list(BENCHMARKS),
+        help=f'benchmarks to run, out of {", ".join(BENCHMARKS)}; all by default',
+    )
+    args = parser.parse_args()
+    if unknown := set(args.names) - set(BENCHMARKS):
+        parser.error(f'unknown benchmarks: {", ".join(sorted(unknown))}')
+    logging.basicConfig(level=logging.INFO, format='%(name)s | %(message)s')
+    for name in args.names:
+        BENCHMARKS[name]()
@@ -1,33 +1,426 @@
 from mcpi.minecraft import Minecraft
-from typing import NoReturn, Final
+from mcpi.vec3 import Vec3
+from typing import Callable, NoReturn, Final, Iterable, Iterator, List, Optional, Sequence, Tuple
+from contextlib import contextmanager
+from generation.transport.buffer import Cuboid, WriteBuffer, int_floor
+from generation.transport.snapshot import WorldSnapshot
+from generation.transport.pipeline import PipelinedTransport
+from generation.transport.pool import ConnectionPool
+from generation.transport.recording import CommandLog
+from generation.transport.diff import DiffUpload
+from generation.transport.compactor import WriteCompactor
+from generation.transport.mesh import CostModel
+import numpy as np
 import logging
+import atexit
+import os
 import inspect
 
 
 class ServerConnection:
     """Type-safe wrapper for a Minecraft connection."""
+    _write_buffer: Optional[WriteBuffer] = None
+    _snapshots: List[WorldSnapshot] = []
+    _pool: Optional[ConnectionPool] = None
+    _uploads: Optional[DiffUpload] = None
+    _compactor: Optional[WriteCompactor] = None
+    # Prices the boxes that held and diffed writes are meshed into.
+    mesh_cost: CostModel = CostModel()
+
     def postToChat(self, msg) -> NoReturn: ...
     def setBlock(self, *args) -> NoReturn: ...
     def setBlocks(self, *args) -> NoReturn: ...
     def getBlock(self, *args) -> int: ...
+    def getBlocks(self, *args) -> Iterator[int]: ...
+    def getHeight(self, *args) -> int: ...
+
+    def probe_heights(self, columns: Sequence[Tuple[float, float]]) -> List[int]:
+        """
+        Heights of many (x, z) columns, in order. Columns no snapshot can
+        answer are fanned out over the connection pool when there is one.
+        """
+        return self._probe(
+            [tuple(int_floor(column)) for column in columns],
+            WorldSnapshot.get_height,
+            self.getHeight,
+            ConnectionPool.heights,
+        )
+
+    def probe_blocks(self, positions: Sequence[Tuple[float, float, float]]) -> List[int]:
+        """Block ids at many (x, y, z) positions, in order."""
+        return self._probe(
+            [tuple(int_floor(position)) for position in positions],
+            WorldSnapshot.get_block,
+            self.getBlock,
+            ConnectionPool.blocks,
+        )
+
+    def _probe(
+            self,
+            queries: List[Tuple[int, ...]],
+            local: Callable[..., Optional[int]],
+            serial: Callable[..., int],
+            pooled: Callable[[ConnectionPool, List[Tuple[int, ...]]], List[int]],
+    ) -> List[int]:
+        results: List[Optional[int]] = [None] * len(queries)
+        misses: List[int] = []
+        for index, query in enumerate(queries):
+            for snapshot in reversed(self._snapshots):
+                if (result := local(snapshot, *query)) is not None:
+                    results[index] = result
+                    break
+            else:
+                misses.append(index)
+        if not misses:
+            return results
+        if self._pool is None:
+            answers = [serial(*queries[index]) for index in misses]
+        else:
+            # Pooled sockets must observe every write issued before the probe.
+            self.sync()
+            answers = pooled(self._pool, [queries[index] for index in misses])
+        for index, answer in zip(misses, answers):
+            results[index] = answer
+        return results
+
+    def sync(self) -> NoReturn:
+        """Make every write issued so far visible to other connections."""
+        self._release()
+        self.flush()
+
+    @contextmanager
+    def buffered(self, *, max_pending: int = 4096) -> Iterator[WriteBuffer]:
+        """
+        Queue and coalesce every write issued within the scope.
+        Pending writes are flushed before reads and on scope exit.
+        Nested scopes share the outermost buffer.
+        """
+        if self._write_buffer is not None:
+            yield self._write_buffer
+            return
+        self._write_buffer = WriteBuffer(
+            self._send_writes if self._uploads is None else self._uploads,
+            max_pending=max_pending,
+        )
+        try:
+            yield self._write_buffer
+        finally:
+            buffer, self._write_buffer = self._write_buffer, None
+            buffer.flush()
+            logging.debug(
+                f'Write buffer closed: {buffer.issued} writes sent as '
+                f'{buffer.emitted} commands.'
+            )
+
+    @contextmanager
+    def compacted(self, *, ordered: bool = True) -> Iterator[WriteCompactor]:
+        """
+        Hold back every write issued within the scope and send only the
+        final state of each voxel on exit, meshed into as few boxes as
+        the cost model favours. Unordered scopes may reorder blocks.
+        getBlock sees held writes, other reads release them first.
+        Nested scopes share the outermost compactor, so an ordered scope
+        cannot nest within an unordered one. WriteCompactor.tally counts
+        the writes of a nested scope alone.
+        """
+        if self._compactor is not None:
+            assert self._compactor.ordered or not ordered, \
+                'An ordered compaction scope cannot nest within an unordered one.'
+            yield self._compactor
+            return
+        self._compactor = WriteCompactor(ordered=ordered, cost=self.mesh_cost)
+        try:
+            yield self._compactor
+        finally:
+            self._release()
+            self._compactor = None
+
+    def _release(self) -> NoReturn:
+        """Pass the writes held by a compaction scope on to the write buffer."""
+        if self._compactor is None or not len(self._compactor):
+            return
+        with self.buffered() as buffer:
+            for write in self._compactor.release():
+                buffer.push(write)
+
+    def _local_block(self, x: int, y: int, z: int) -> Optional[int]:
+        """Block id known without asking the server, None if there is none."""
+        for snapshot in reversed(self._snapshots):
+            if (block_id := snapshot.get_block(x, y, z)) is not None:
+                return block_id
+        if self._compactor is not None \
+                and (state := self._compactor.get(x, y, z)) is not None:
+            return state[0]
+        return None
+
+    @contextmanager
+    def snapshot(
+            self,
+            lower: Vec3,
+            upper: Vec3,
+            **kwargs
+    ) -> Iterator[WorldSnapshot]:
+        """
+        Answer getBlock/getHeight from an in-memory copy of a region
+        for the duration of the scope. Writes are mirrored into the copy.
+        """
+        self.flush()
+        with self.reading(WorldSnapshot(lower, upper, **kwargs).fetch(self)) as snapshot:
+            yield snapshot
+
+    @contextmanager
+    def reading(self, snapshot: WorldSnapshot) -> Iterator[WorldSnapshot]:
+        """
+        Answer getBlock/getHeight from a snapshot fetched elsewhere, such
+        as over an asyncio connection, for the duration of the scope.
+        Writes are mirrored into it.
+        """
+        self._snapshots = [*self._snapshots, snapshot]
+        try:
+            yield snapshot
+        finally:
+            self._snapshots = [s for s in self._snapshots if s is not snapshot]
+
+    def flush(self) -> NoReturn:
+        """
+        Send any buffered writes. Writes held by a compaction scope are
+        left to it; sync releases them first.
+        """
+        if self._write_buffer is not None:
+            self._write_buffer.flush()
+
+    def _route_write(self, write: Cuboid) -> bool:
+        """
+        Mirror a write into active snapshots and hold or queue it when
+        compacting or buffering. Returns whether the write was taken.
+        """
+        for snapshot in self._snapshots:
+            snapshot.apply(write)
+        if self._compactor is not None:
+            self._compactor.push(write)
+            return True
+        if self._write_buffer is None:
+            if self._uploads is not None:
+                self._uploads.sent(write)
+            return False
+        self._write_buffer.push(write)
+        return True
+
+    def _send_writes(self, writes: List[Cuboid]) -> NoReturn:
+        for write in writes:
+            self.setBlocks(*write.lower, *write.upper, *write.block)
+
+    def _fetch_blocks(
+            self,
+            boxes: Sequence[Tuple[Tuple[int, int, int], Tuple[int, int, int]]],
+    ) -> List[np.ndarray]:
+        """Block ids of inclusive boxes from the server, indexed by [x][y][z]."""
+        return [
+            _box_ids(self.getBlocks(*lower, *upper), lower, upper)
+            for lower, upper in boxes
+        ]
+
+
+def _box_ids(
+        reply: Iterable[int],
+        lower: Tuple[int, int, int],
+        upper: Tuple[int, int, int],
+) -> np.ndarray:
+    nx, ny, nz = (high - low + 1 for low, high in zip(lower, upper))
+    # The server returns blocks ordered by y, then x, then z.
+    ids = np.fromiter(reply, dtype=np.uint16, count=nx * ny * nz)
+    return ids.reshape(ny, nx, nz).transpose(1, 0, 2)
 
 
 class DummyConnection(ServerConnection):
     """Dummy connection for testing."""
 
+    @contextmanager
+    def snapshot(self, lower: Vec3, upper: Vec3, **kwargs) -> Iterator[None]:
+        # There is no world to copy.
+        yield None
+
 
 class ProxiedConnection(Minecraft, ServerConnection):
+    conn: PipelinedTransport
+
+    @classmethod
+    def create(
+            cls,
+            address: str = 'localhost',
+            port: int = 4711,
+            *,
+            frame_size: int = 1 << 16,
+            pool_size: int = 4,
+            diff: bool = False,
+            mesh_cost: CostModel = CostModel(),
+    ):
+        # Minecraft.create always builds the base class.
+        connection = cls(PipelinedTransport(address, port, frame_size=frame_size))
+        connection.mesh_cost = mesh_cost
+        if pool_size > 0:
+            connection._pool = ConnectionPool(address, port, size=pool_size)
+        if diff:
+            connection._uploads = DiffUpload(
+                connection._fetch_blocks, connection._send_writes, cost=mesh_cost
+            )
+        return connection
+
     def postToChat(self, msg: str) -> NoReturn:
         caller: Final[int] = 1
         module = inspect.getmodule(inspect.stack()[caller][0])
         logging.info(f'BROADCAST by {module} : {msg}')
+        self.flush()
         super(ProxiedConnection, self).postToChat(msg)
 
+    def setBlock(self, *args) -> NoReturn:
+        args = int_floor(args)
+        if not self._route_write(Cuboid.from_set_block(args)):
+            super(ProxiedConnection, self).setBlock(*args)
+
+    def setBlocks(self, *args) -> NoReturn:
+        args = int_floor(args)
+        if not self._route_write(Cuboid.from_set_blocks(args)):
+            super(ProxiedConnection, self).setBlocks(*args)
+
+    def getBlock(self, *args) -> int:
+        x, y, z = int_floor(args)
+        if (block_id := self._local_block(x, y, z)) is not None:
+            return block_id
+        # Reads must observe every write issued before them.
+        self.flush()
+        return super(ProxiedConnection, self).getBlock(x, y, z)
+
+    def getBlocks(self, *args) -> Iterator[int]:
+        self._release()
+        self.flush()
+        return super(ProxiedConnection, self).getBlocks(*args)
+
+    def getHeight(self, *args) -> int:
+        x, z = int_floor(args)
+        for snapshot in reversed(self._snapshots):
+            if (height := snapshot.get_height(x, z)) is not None:
+                return height
+        self._release()
+        self.flush()
+        return super(ProxiedConnection, self).getHeight(x, z)
+
+    def flush(self) -> NoReturn:
+        super(ProxiedConnection, self).flush()
+        self.conn.flush()
+
+    def sync(self) -> NoReturn:
+        self._release()
+        self.flush()
+        self.conn.sync()
+
+    def _send_writes(self, writes: List[Cuboid]) -> NoReturn:
+        # Writes never receive a reply, so they join the transport frame as is.
+        for write in writes:
+            self.conn.write(write.encode())
+
+    def _fetch_blocks(
+            self,
+            boxes: Sequence[Tuple[Tuple[int, int, int], Tuple[int, int, int]]],
+    ) -> List[np.ndarray]:
+        # Every box is requested before the first reply is read.
+        replies = self.conn.request_all(
+            b'world.getBlocks', [(*lower, *upper) for lower, upper in boxes]
+        )
+        return [
+            _box_ids(map(int, reply.split(',')), lower, upper)
+            for reply, (lower, upper) in zip(replies, boxes)
+        ]
+
+
+class RecordingConnection(ProxiedConnection):
+    """
+    Connection that also appends every block write to a command log.
+    Writes are logged as issued, before any coalescing, so that a replay
+    can batch them however suits the target server.
+    """
+    log: CommandLog
+
+    @classmethod
+    def create(
+            cls,
+            address: str = 'localhost',
+            port: int = 4711,
+            *,
+            log: CommandLog,
+            **kwargs,
+    ):
+        connection = super(RecordingConnection, cls).create(address, port, **kwargs)
+        connection.log = log
+        return connection
+
+    def _route_write(self, write: Cuboid) -> bool:
+        self.log.append(write)
+        return super(RecordingConnection, self)._route_write(write)
+
+    def flush(self) -> NoReturn:
+        super(RecordingConnection, self).flush()
+        self.log.flush()
+
+
+# Opened on first import by connect, so a server can be chosen beforehand.
+connection: ServerConnection
+
+
+def server_address(
+        address: Optional[str] = None,
+        port: Optional[int] = None,
+) -> Tuple[str, int]:
+    """Server to connect to, MCPI_ADDRESS and MCPI_PORT giving the defaults."""
+    address = os.environ.get('MCPI_ADDRESS', 'localhost') if address is None else address
+    port = int(os.environ.get('MCPI_PORT', 4711)) if port is None else port
+    return address, port
+
+
+def connect(
+        address: Optional[str] = None,
+        port: Optional[int] = None,
+        *,
+        record: Optional[str] = None,
+        diff: Optional[bool] = None,
+) -> ServerConnection:
+    """
+    Open the connection shared by every module, or a dummy one when no
+    server listens. Modules bind it on import, so call this before
+    importing them to pick a server. With record, every write is also
+    logged to that file for replay. With diff, buffered writes only send
+    the blocks they change. MCPI_ADDRESS, MCPI_PORT, MCPI_RECORD and
+    MCPI_DIFF give the defaults.
+    """
+    global connection
+    address, port = server_address(address, port)
+    record = os.environ.get('MCPI_RECORD') if record is None else record
+    diff = os.environ.get('MCPI_DIFF', '0') != '0' if diff is None else diff
+    log: Optional[CommandLog] = None
+    try:
+        if record is None:
+            connection = ProxiedConnection.create(address, port, diff=diff)
+        else:
+            log = CommandLog(record)
+            connection = RecordingConnection.create(address, port, log=log, diff=diff)
+            atexit.register(log.close)
+        if connection._pool is not None:
+            # Exit handlers run in reverse, so the pool closes after the sync.
+            atexit.register(connection._pool.close)
+        # Held writes of an open compaction scope are released as well.
+        atexit.register(connection.sync)
+    except ConnectionRefusedError:
+        logging.critical(
+            'Server connection failed. Using dummy connection.'
+        )
+        if log is not None:
+            # Nothing is recorded through a dummy connection.
+            log.close()
+        connection = DummyConnection()
+    return connection
+
 
-try:
-    connection: ServerConnection = ProxiedConnection.create()
-except ConnectionRefusedError:
-    logging.critical(
-        'Server connection failed. Using dummy connection.'
-    )
-    connection: ServerConnection = DummyConnection()
+def __getattr__(name: str):
+    if name == 'connection':
+        return connect()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
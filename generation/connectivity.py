@@ -0,0 +1,92 @@
+from __future__ import annotations
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Hashable,
+    Iterable,
+    Set,
+    TypeVar,
+)
+from collections import deque
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from generation.grid_array import GridArray
+
+__all__ = [
+    'component_labels',
+    'largest_component',
+    'grid_component_labels',
+    'largest_grid_component',
+]
+
+Node = TypeVar('Node', bound=Hashable)
+
+
+def component_labels(adjacency_list: Dict[Node, Iterable[Node]]) -> Dict[Node, int]:
+    """Label every node with its connected component in one breadth-first pass."""
+    labels: Dict[Node, int] = dict()
+    for label, start in enumerate(adjacency_list):
+        if start in labels:
+            continue
+        labels[start] = label
+        frontier = deque((start,))
+        while frontier:
+            for adjacent in adjacency_list[frontier.popleft()]:
+                if adjacent not in labels:
+                    labels[adjacent] = label
+                    frontier.append(adjacent)
+    return labels
+
+
+def largest_component(adjacency_list: Dict[Node, Iterable[Node]]) -> Set[Node]:
+    """Nodes of the largest connected component, the earliest one on ties."""
+    labels = component_labels(adjacency_list)
+    sizes: Dict[int, int] = dict()
+    for label in labels.values():
+        sizes[label] = sizes.get(label, 0) + 1
+    if not sizes:
+        return set()
+    # Labels increase with discovery order, so max keeps the first on ties.
+    largest = max(sizes, key=sizes.__getitem__)
+    return {node for node, label in labels.items() if label == largest}
+
+
+def grid_component_labels(grid: GridArray) -> np.ndarray:
+    """
+    Label every tile of a grid array with the smallest flat index in its
+    component, -1 where there is no tile.
+    - Vectorized union-find. Each round hooks every root onto the smallest
+      root across its edges, then compresses paths by pointer jumping.
+    - Every component with an edge out merges each round, so the number of
+      rounds is logarithmic in the number of tiles.
+    """
+    height, width = grid.shape
+    flat = np.arange(height * width).reshape(height, width)
+    # Missing edges have zero weight.
+    south = grid.south[:-1].astype(bool)
+    east = grid.east[:, :-1].astype(bool)
+    tails = np.concatenate((flat[:-1][south], flat[:, :-1][east]))
+    heads = np.concatenate((flat[1:][south], flat[:, 1:][east]))
+    parent = np.arange(height * width)
+    while True:
+        tail_roots, head_roots = parent[tails], parent[heads]
+        merging = tail_roots != head_roots
+        if not merging.any():
+            break
+        low = np.minimum(tail_roots[merging], head_roots[merging])
+        high = np.maximum(tail_roots[merging], head_roots[merging])
+        np.minimum.at(parent, high, low)
+        while not np.array_equal(grandparent := parent[parent], parent):
+            parent = grandparent
+    return np.where(grid.present.ravel(), parent, -1).reshape(height, width)
+
+
+def largest_grid_component(grid: GridArray) -> np.ndarray:
+    """Mask of the largest connected component of a grid array."""
+    labels = grid_component_labels(grid)
+    if not (labels >= 0).any():
+        return np.zeros(grid.shape, dtype=bool)
+    sizes = np.bincount(labels[labels >= 0])
+    return labels == int(np.argmax(sizes))
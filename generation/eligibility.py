@@ -0,0 +1,188 @@
+from __future__ import annotations
+from typing import (
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+    Final,
+)
+import random
+
+import numpy as np
+from generation.grid_array import GridArray, NO_EDGE
+
+__all__ = [
+    'window_sum',
+    'PlotEligibility',
+    'PlotAllocator',
+]
+
+Label = Tuple[int, int]
+
+
+def window_sum(
+        array: np.ndarray,
+        /, *,
+        rows: Tuple[int, int],
+        columns: Tuple[int, int],
+) -> np.ndarray:
+    """
+    Sum of array[i + rows[0]:i + rows[1] + 1, j + columns[0]:j + columns[1] + 1]
+    for every (i, j), read from one integral image. Cells outside the array
+    count as zero.
+    """
+    height, width = array.shape
+    integral: np.ndarray = np.zeros((height + 1, width + 1), dtype=np.int32)
+    np.cumsum(np.cumsum(array, axis=0, dtype=np.int32), axis=1, out=integral[1:, 1:])
+    i: np.ndarray = np.arange(height)[:, None]
+    j: np.ndarray = np.arange(width)[None, :]
+    top, bottom = np.clip(i + rows[0], 0, height), np.clip(i + rows[1] + 1, 0, height)
+    left, right = np.clip(j + columns[0], 0, width), np.clip(j + columns[1] + 1, 0, width)
+    return integral[bottom, right] - integral[top, right] \
+        - integral[bottom, left] + integral[top, left]
+
+
+class PlotEligibility:
+    """
+    Tiles that can hold the centre of a square plot.
+    - square marks centres of squares whose every internal edge exists.
+    - eligible further requires that no tile of the square is occupied.
+    - Both masks come from window sums over whole arrays in one pass.
+      Occupying tiles only recomputes the centres whose square they touch.
+    """
+
+    def __init__(self, grid: GridArray, /, *, size: int = 3) -> None:
+        self.grid: Final = grid
+        self.size: Final = size
+        self._reach: Final = size // 2
+        self.square: np.ndarray = self._square_mask()
+        self.occupied: np.ndarray = np.zeros(grid.shape, dtype=bool)
+        self.eligible: np.ndarray = self.square.copy()
+
+    def _square_mask(self) -> np.ndarray:
+        reach, size = self._reach, self.size
+        # A square holds size - 1 rows of size south edges and the transpose in east edges.
+        edges: int = size * (size - 1)
+        south = window_sum(
+            self.grid.south != NO_EDGE,
+            rows=(-reach, reach - 1),
+            columns=(-reach, reach),
+        )
+        east = window_sum(
+            self.grid.east != NO_EDGE,
+            rows=(-reach, reach),
+            columns=(-reach, reach - 1),
+        )
+        return (south == edges) & (east == edges)
+
+    def is_square(self, label: Label) -> bool:
+        index = self.grid.index(label)
+        return index is not None and bool(self.square[index])
+
+    def is_eligible(self, label: Label) -> bool:
+        index = self.grid.index(label)
+        return index is not None and bool(self.eligible[index])
+
+    def labels(self) -> Iterator[Label]:
+        """Labels of every eligible centre."""
+        offset_i, offset_j = self.grid.offset
+        for i, j in zip(*np.nonzero(self.eligible)):
+            yield int(i) + offset_i, int(j) + offset_j
+
+    def occupy(self, labels: Iterable[Label]) -> None:
+        """Mark tiles as taken and refresh the centres whose square contains them."""
+        indices = [
+            index for label in labels
+            if (index := self.grid.index(label)) is not None
+        ]
+        if not indices:
+            return
+        rows, columns = zip(*indices)
+        self.occupied[rows, columns] = True
+        self._refresh(
+            (min(rows) - self._reach, max(rows) + self._reach + 1),
+            (min(columns) - self._reach, max(columns) + self._reach + 1),
+        )
+
+    def occupy_square(self, label: Label, size: Optional[int] = None) -> None:
+        """Mark the square around a label as taken, stamped in place."""
+        rows, columns = _window(self.grid, label, self.size if size is None else size)
+        self.occupied[rows[0]:rows[1], columns[0]:columns[1]] = True
+        self._refresh(
+            (rows[0] - self._reach, rows[1] + self._reach),
+            (columns[0] - self._reach, columns[1] + self._reach),
+        )
+
+    def _refresh(self, rows: Tuple[int, int], columns: Tuple[int, int]) -> None:
+        height, width = self.occupied.shape
+        reach = self._reach
+        top, bottom = max(rows[0], 0), min(rows[1], height)
+        left, right = max(columns[0], 0), min(columns[1], width)
+        # Centres near the window edge read occupancy from just outside it.
+        outer_top, outer_left = max(top - reach, 0), max(left - reach, 0)
+        taken = window_sum(
+            self.occupied[outer_top:min(bottom + reach, height),
+                          outer_left:min(right + reach, width)],
+            rows=(-reach, reach),
+            columns=(-reach, reach),
+        )[top - outer_top:bottom - outer_top, left - outer_left:right - outer_left]
+        self.eligible[top:bottom, left:right] = \
+            self.square[top:bottom, left:right] & (taken == 0)
+
+
+class PlotAllocator:
+    """
+    Picks plot centres from candidate bitmaps.
+    - A pick is uniform over the remaining candidates and draws from the
+      random module exactly as random.choice over them would.
+    - Allocating a plot stamps its exclusion window out of the candidate
+      bitmaps and its square into the occupancy of the eligibility masks.
+    """
+
+    def __init__(
+            self,
+            eligibility: PlotEligibility,
+            /, *,
+            exclusion: int = 7,
+    ) -> None:
+        self.eligibility: Final = eligibility
+        self.grid: Final = eligibility.grid
+        self.exclusion: Final = exclusion
+
+    def choose(self, candidates: np.ndarray) -> Optional[Label]:
+        """Random candidate label, None if there are none."""
+        counts: np.ndarray = np.count_nonzero(candidates, axis=1)
+        ends: np.ndarray = np.cumsum(counts)
+        if not ends.size or not ends[-1]:
+            return None
+        pick: int = random.randrange(int(ends[-1]))
+        # Locate the row holding the pick, then the column within it.
+        row: int = int(np.searchsorted(ends, pick, side='right'))
+        column: int = int(
+            np.flatnonzero(candidates[row])[pick - (ends[row] - counts[row])]
+        )
+        return row + self.grid.offset[0], column + self.grid.offset[1]
+
+    def exclude(self, candidates: np.ndarray, label: Label, size: int) -> None:
+        """Clear the square of the given size around a label from a bitmap."""
+        rows, columns = _window(self.grid, label, size)
+        candidates[rows[0]:rows[1], columns[0]:columns[1]] = False
+
+    def allocate(self, label: Label, *candidates: np.ndarray) -> None:
+        """Take the plot at a label out of every candidate bitmap."""
+        for bitmap in candidates:
+            self.exclude(bitmap, label, self.exclusion)
+        self.eligibility.occupy_square(label)
+
+
+def _window(
+        grid: GridArray,
+        label: Label,
+        size: int,
+) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    # Array bounds of the square of the given size around a label.
+    i, j = label[0] - grid.offset[0], label[1] - grid.offset[1]
+    height, width = grid.shape
+    low, high = -size // 2 + 1, size // 2 + 1
+    return (max(i + low, 0), min(i + high, height)), \
+        (max(j + low, 0), min(j + high, width))
@@ -1,12 +1,40 @@
 from biome import Biome
-from mcpi.minecraft import Minecraft
 from mcpi.vec3 import Vec3
+from generation import connection as server_connection
 import mcpi.block as block
 from typing import TypeVar
+from math import isqrt
+from collections import deque
+from generation.pathfinding import ShortestPaths, SteinerTree
+from generation.grid_array import GridArray
+from generation.eligibility import PlotEligibility
+from generation.connectivity import largest_component
+from generation.terrain import TERRAIN_NAMES, classify_block, is_surface
+from operator import attrgetter
 
 T = TypeVar("T")
 
-mc = Minecraft.create()
+# Biome of every terrain code.
+BIOMES = tuple(
+    {
+        "Ground": Biome.GRASSY,
+        "Water": Biome.WATER,
+        "Sand": Biome.DESSERT,
+        "Lava": Biome.LAVA,
+        "Tree": Biome.JUNGLE,
+    }[name]
+    for name in TERRAIN_NAMES
+)
+
+# Coordinate offsets of the north, east, south and west neighbours.
+OFFSETS = ((-1, 0), (0, 1), (1, 0), (0, -1))
+
+# Kinds of probe a grid generator yields. Tile probes map coordinates to
+# world columns and receive tiles; block probes list positions and receive ids.
+TILES = "tiles"
+BLOCKS = "blocks"
+
+mc = server_connection
 post = mc.postToChat
 player_tile_position = mc.player.getTilePos
 get_blocks = mc.getBlocks
@@ -14,6 +42,8 @@ get_block = mc.getBlock
 set_blocks = mc.setBlocks
 set_block = mc.setBlock
 get_height = mc.getHeight
+probe_heights = mc.probe_heights
+probe_blocks = mc.probe_blocks
 
 
 class Grid:
@@ -21,30 +51,66 @@ class Grid:
     - Dynamically generates and maintains a weighted graph of connected tile objects that respects terrain.
     - Clears trees if necessary to allow for the placement of structures.
     - Implements methods to determine the shortest path from one tile to another, accounting for edge weights.
+    - Caches shortest path searches, repairing them when edge weights decrease.
 
     """
 
-    def __init__(self, max_size):
+    def __init__(self, max_size, start=None):
+        self._setup(max_size, player_tile_position() if start is None else start)
+        # Terrain probes are answered from a single bulk fetch of the area.
+        with mc.snapshot(*self.region()):
+            _drive(self._generate(), self.probe_tiles, probe_blocks)
+        self.center = self.find_center()
+
+    @classmethod
+    async def create_async(cls, max_size, connection):
+        """
+        Builds a grid over an asyncio connection. Every probe of a frontier
+        layer is in flight at once and other coroutines run while the grid
+        waits on the server. Trees are cleared over the same connection, so
+        the probes after a clearing see it.
+        """
+        grid = cls.__new__(cls)
+        grid._setup(max_size, await connection.getTilePos(), set_blocks=connection.setBlocks)
+        await _drive_async(
+            grid._generate(),
+            lambda columns: grid.probe_tiles_async(columns, connection),
+            connection.probe_blocks,
+        )
+        grid.center = grid.find_center()
+        return grid
+
+    def _setup(self, max_size, start, set_blocks=set_blocks):
         self.adjacency_list = dict()
         self.edge_weights = dict()
+        # Lookup tables kept in sync with the adjacency list.
+        self.coordinate_index = dict()
+        self.position_index = dict()
+        self._path_cache = dict()
+        # Built on demand and dropped whenever tiles or edges change.
+        self._eligibility = None
         self.max_size = max_size
-        self.start = player_tile_position()
+        self.start = start
         # Arbitrary constants.
         self.dimension = 8
         self.stride = 4
         self.tolerance = 2
-        # Build smaller square grid of tiles.
-        self.build()
         self.forest = False
+        # Writes go to the connection the probes are answered from.
+        self._set_blocks = set_blocks
+
+    def _generate(self):
+        # Yields the columns to probe at each step and receives their tiles.
+        # Build smaller square grid of tiles.
+        yield from self._build()
         if self.test_trees():
             self.forest = True
-            self.resolve_trees()
+            yield from self._resolve_trees(list(self))
         self.connect()
         # Remove disconnected areas of matrix.
         self.adjacency_list = self.cull(self.connected_area())
-        self.explore()
+        yield from self._explore_layers()
         self.adjacency_list = self.cull(self.connected_area())
-        self.center = self.find_center()
 
     def __iter__(self):
         for tile in self.adjacency_list.keys():
@@ -53,15 +119,45 @@ class Grid:
     def __len__(self):
         return len(self.adjacency_list)
 
+    def to_array(self):
+        """
+        Dense copy of the grid, a few bytes per tile instead of a Tile object.
+        Packed from the tile graph, which generation still builds, as clearing
+        trees lowers tiles that were already placed.
+        """
+        return GridArray.from_graph(
+            self.adjacency_list,
+            self.edge_weights,
+            label=attrgetter("coordinate"),
+            position=attrgetter("position"),
+            terrain=attrgetter("terrain"),
+            terrain_types=tuple(Biome),
+            stride=self.stride,
+        )
+
+    def region(self, depth=32, rise=32):
+        # Box the grid can reach when grown to max_size as a square.
+        radius = self.stride * (isqrt(self.max_size) // 2 + self.dimension)
+        lower = Vec3(self.start.x - radius, self.start.y - depth, self.start.z - radius)
+        upper = Vec3(self.start.x + radius, self.start.y + rise, self.start.z + radius)
+        return lower, upper
+
     def build(self):
+        return _drive(self._build(), self.probe_tiles, probe_blocks)
+
+    def _build(self):
         post(f"Generating matrix. Dimension {self.dimension}.")
+        tiles = yield TILES, {
+            (i, j): (
+                self.start.x + (i - self.dimension / 2) * self.stride,
+                self.start.z + (j - self.dimension / 2) * self.stride,
+            )
+            for i in range(self.dimension)
+            for j in range(self.dimension)
+        }
         for i in range(self.dimension):
-            x = self.start.__x + (i - self.dimension / 2) * self.stride
             for j in range(self.dimension):
-                z = self.start.z + (j - self.dimension / 2) * self.stride
-                y = get_height(x, z)
-                vector = Vec3(x, y, z)
-                self.add_tile(Tile(vector, (i, j)))
+                self.add_tile(tiles[(i, j)])
             percentage = (i * self.dimension) / (self.dimension**2) * 100
             post(f"{percentage:.0f}%")
         post("Matrix complete.")
@@ -79,78 +175,87 @@ class Grid:
         post("Matrix connected.")
 
     def explore(self):
+        return _drive(self._explore_layers(), self.probe_tiles, probe_blocks)
+
+    def _explore_layers(self):
         post("Building organic grid.")
-        stride = self.stride
         maximum = self.max_size
         # minimum = 100
         discovered = set()
         network = list()
         # backup = list()
         indices = {0, self.dimension - 1}
-        frontier = [
+        frontier = deque(
             # All tiles on the edges of the matrix.
             x
             for x in self
             if x.coordinate[0] in indices or x.coordinate[1] in indices
-        ]
+        )
         while frontier and len(network) <= maximum:
-            current = frontier.pop(0)
-            # Ignore anything that isn't a tile.
-            if not isinstance(current, Tile):
-                continue
-            if current not in discovered:
-                discovered.add(current)
-                network.append(current)
-                x, z = current.coordinate
-                tiles = self._connect(current, x, z)
-                # North
-                if tiles[0] is False:
-                    vector = Vec3(
-                        current.position.x - stride,
-                        get_height(current.position.x - stride, current.position.z),
-                        current.position.z,
-                    )
-                    north = Tile(vector, (x - 1, z))
-                    self.resolve_trees(tile=north) if self.forest else None
-                    self._explore(current, north, frontier)
-                # East
-                if tiles[1] is False:
-                    vector = Vec3(
-                        current.position.x,
-                        get_height(current.position.x, current.position.z + stride),
-                        current.position.z + stride,
-                    )
-                    east = Tile(vector, (x, z + 1))
-                    self.resolve_trees(tile=east) if self.forest else None
-                    self._explore(current, east, frontier)
-                # South
-                if tiles[2] is False:
-                    vector = Vec3(
-                        current.position.x + stride,
-                        get_height(current.position.x + stride, current.position.z),
-                        current.position.z,
-                    )
-                    south = Tile(vector, (x + 1, z))
-                    self.resolve_trees(tile=south) if self.forest else None
-                    self._explore(current, south, frontier)
-                # West
-                if tiles[3] is False:
-                    vector = Vec3(
-                        current.position.x,
-                        get_height(current.position.x, current.position.z - stride),
-                        current.position.z - stride,
-                    )
-                    west = Tile(vector, (x, z - 1))
-                    self.resolve_trees(tile=west) if self.forest else None
-                    self._explore(current, west, frontier)
-            # Print percentage.
-            if (percent := len(network)) % 10 == 0:
-                post(f"{percent // (maximum // 100)}%")
+            # Probe every tile the layer could add in one batch, then walk it in order.
+            layer = list(frontier)
+            frontier.clear()
+            probed = yield TILES, self._adjacent_columns(layer, discovered)
+            for current in layer:
+                if len(network) > maximum:
+                    break
+                # Ignore anything that isn't a tile.
+                if not isinstance(current, Tile):
+                    continue
+                if current not in discovered:
+                    discovered.add(current)
+                    network.append(current)
+                    x, z = current.coordinate
+                    tiles = self._connect(current, x, z)
+                    # North, east, south and west.
+                    for exists, (i, j) in zip(tiles, OFFSETS):
+                        if exists is False:
+                            adjacent = probed[(x + i, z + j)]
+                            if self.forest:
+                                yield from self._resolve_trees([adjacent])
+                            self._explore(current, adjacent, frontier)
+                # Print percentage.
+                if (percent := len(network)) % 10 == 0:
+                    post(f"{percent // (maximum // 100)}%")
         for tile in self:
             self._connect(tile)
         post("Organic grid complete.")
         return network
 
+    def _adjacent_columns(self, layer, discovered):
+        # World (x, z) of every missing neighbour of the undiscovered tiles.
+        columns = dict()
+        for tile in layer:
+            if not isinstance(tile, Tile) or tile in discovered:
+                continue
+            x, z = tile.coordinate
+            for i, j in OFFSETS:
+                coordinate = (x + i, z + j)
+                if coordinate not in self.coordinate_index and coordinate not in columns:
+                    columns[coordinate] = (
+                        tile.position.x + i * self.stride,
+                        tile.position.z + j * self.stride,
+                    )
+        return columns
+
+    def probe_tiles(self, columns):
+        """Tiles at the surface of many columns, probed in two batches."""
+        heights = probe_heights(list(columns.values()))
+        vectors = [Vec3(x, y, z) for (x, z), y in zip(columns.values(), heights)]
+        return self._tiles(columns, vectors, probe_blocks(vectors))
+
+    async def probe_tiles_async(self, columns, connection):
+        heights = await connection.probe_heights(list(columns.values()))
+        vectors = [Vec3(x, y, z) for (x, z), y in zip(columns.values(), heights)]
+        return self._tiles(columns, vectors, await connection.probe_blocks(vectors))
+
+    @staticmethod
+    def _tiles(columns, vectors, block_ids):
+        return {
+            coordinate: Tile(vector, coordinate, BIOMES[classify_block(block_id)])
+            for coordinate, vector, block_id in zip(columns, vectors, block_ids)
+        }
+
     def _explore(self, current, adjacent, frontier):
         self.add_tile(adjacent)
         if self.add_edge(current, adjacent):
@@ -175,13 +280,15 @@ class Grid:
         return tiles
 
     def cull(self, tiles):
-        final = self.adjacency_list.copy()
-        loop = self.adjacency_list.copy()
-        for tile in loop:
-            # If tile not in main area, delete from adjacency list.
-            if tile not in tiles:
-                del final[tile]
-        return final
+        # Keep only tiles in the given set, in one pass over the grid.
+        for tile in self.adjacency_list.keys() - tiles:
+            self._unindex(tile)
+        self._eligibility = None
+        return {
+            tile: adjacent
+            for tile, adjacent in self.adjacency_list.items()
+            if tile in tiles
+        }
 
     def test_trees(self, threshold=0.4):
         total = 0
@@ -194,57 +301,49 @@ class Grid:
         return False
 
     def resolve_trees(self, tile=None):
-        if tile is None:
-            trees = [x for x in self if x.terrain == Biome.JUNGLE]
-        else:
-            trees = [tile]
-            if tile.terrain != Biome.JUNGLE:
-                return
-        for tile in trees:
-            x = tile.position.__x
-            z = tile.position.z
-            while True:
-                if get_block(x, tile.position.__y, z) in {
-                    1,
-                    2,
-                    3,
-                    4,
-                    7,
-                    8,
-                    9,
-                    10,
-                    11,
-                    12,
-                    13,
-                    14,
-                    15,
-                    16,
-                    24,
-                    49,
-                    82,
-                }:
-                    set_blocks(
-                        x - 1,
-                        tile.position.__y + 1,
-                        z - 1,
-                        x + 2,
-                        tile.position.__y + 20,
-                        z + 2,
-                        block.AIR.id,
-                    )
-                    tile.terrain = tile.find_terrain()
-                    break
-                tile.position.__y -= 1
+        return _drive(
+            self._resolve_trees(list(self) if tile is None else [tile]),
+            self.probe_tiles,
+            probe_blocks,
+        )
+
+    def _resolve_trees(self, tiles):
+        # Lower every tree tile to the ground below it, one batch of block
+        # probes per step down, and clear the trunk and canopy above it.
+        trees = [tile for tile in tiles if tile.terrain == Biome.JUNGLE]
+        indexed = {tile: self._unindex(tile) for tile in trees}
+        while trees:
+            block_ids = yield BLOCKS, [tile.position for tile in trees]
+            lowered = list()
+            for tile, block_id in zip(trees, block_ids):
+                if not is_surface(block_id):
+                    tile.position.y -= 1
+                    lowered.append(tile)
+                    continue
+                x = tile.position.x
+                z = tile.position.z
+                self._set_blocks(
+                    x - 1,
+                    tile.position.y + 1,
+                    z - 1,
+                    x + 2,
+                    tile.position.y + 20,
+                    z + 2,
+                    block.AIR.id,
+                )
+                # Clearing starts above the ground, so the probed block stands.
+                tile.terrain = BIOMES[classify_block(block_id)]
+            trees = lowered
+        # Re-index under the lowered positions.
+        for tile, was_indexed in indexed.items():
+            if was_indexed:
+                self._index(tile)
 
     def find_tile(self, coordinate=None, vector=None):
         if isinstance(vector, Vec3):
-            for tile in self:
-                if tile.position == vector:
-                    return tile
+            return self.position_index.get((vector.x, vector.y, vector.z))
         elif isinstance(coordinate, tuple) and len(coordinate) == 2:
-            for tile in self:
-                if tile.coordinate == coordinate:
-                    return tile
+            return self.coordinate_index.get(coordinate)
         return None
 
     def add_tile(self, tile):
@@ -252,9 +351,26 @@ class Grid:
             if not isinstance(tile, Tile):
                 raise TypeError("Only tiles can be added to grid.")
             self.adjacency_list[tile] = list()
+            self._index(tile)
+            self._eligibility = None
         except TypeError as error:
             post(error)
 
+    def _index(self, tile):
+        position = tile.position
+        self.coordinate_index[tile.coordinate] = tile
+        self.position_index[(position.x, position.y, position.z)] = tile
+
+    def _unindex(self, tile):
+        # Returns whether the tile was indexed.
+        position = (tile.position.x, tile.position.y, tile.position.z)
+        if self.coordinate_index.get(tile.coordinate) is not tile:
+            return False
+        del self.coordinate_index[tile.coordinate]
+        if self.position_index.get(position) is tile:
+            del self.position_index[position]
+        return True
+
     def add_edge(self, tile_a, tile_b):
         # If edge already exists, return false.
         if (tile_a, tile_b) in self.edge_weights or (
@@ -272,6 +388,7 @@ class Grid:
                 self.edge_weights[(x, y)] = weight
             except KeyError as error:
                 post(error)
+        self._eligibility = None
         # If successful, return true.
         return True
 
@@ -279,7 +396,7 @@ class Grid:
         prohibited = {Biome.LAVA, Biome.JUNGLE}
         if (tile_a.terrain in prohibited) or (tile_b.terrain in prohibited):
             return None
-        difference = abs(tile_a.position.__y - tile_b.position.__y)
+        difference = abs(tile_a.position.y - tile_b.position.y)
         if difference > self.tolerance:
             return None
 
@@ -291,27 +408,7 @@ class Grid:
 
     def connected_area(self):
         post("Finding largest connected area.")
-        discovered = set()
-        largest = list()
-        for tile in self:
-            # Breadth first search begins.
-            if tile not in discovered:
-                discovered.add(tile)
-                frontier = list()
-                network = list()
-                frontier.append(tile)
-                while frontier:
-                    current_tile = frontier.pop(0)
-                    network.append(current_tile)
-                    for adjacent_tile in self.adjacency_list[current_tile]:
-                        if adjacent_tile not in discovered:
-                            discovered.add(adjacent_tile)
-                            frontier.append(adjacent_tile)
-                if len(network) > len(largest):
-                    largest.clear()
-                    largest.extend(network)
-                    network.clear()
-        return largest
+        return largest_component(self.adjacency_list)
 
     def find_center(self):
         post("Finding center.")
@@ -348,38 +445,30 @@ class Grid:
 
     def show_edges(self, tile):
         for neighbour in self.adjacency_list[tile]:
-            if neighbour.position.__x > tile.position.__x:
+            if neighbour.position.x > tile.position.x:
                 mc.setBlock(
-                    tile.position.__x + 2,
-                    tile.position.__y,
+                    tile.position.x + 2,
+                    tile.position.y,
                     tile.position.z,
                     block.STONE.id,
                 )
             if neighbour.position.z > tile.position.z:
                 mc.setBlock(
-                    tile.position.__x,
-                    tile.position.__y,
+                    tile.position.x,
+                    tile.position.y,
                     tile.position.z + 2,
                     block.STONE.id,
                 )
 
-    def is_3x3(self, point, threshold=7):
-        if len(self.adjacency_list[point]) < 4:
-            return False
-        count = 0
-        px, pz = point.coordinate[0], point.coordinate[1]
-        for coordinate in {
-            (px - 1, pz - 1),
-            (px - 1, pz + 1),
-            (px + 1, pz - 1),
-            (px + 1, pz + 1),
-        }:
-            for neighbour in self.adjacency_list[point]:
-                if coordinate in list(
-                    map(lambda tile: tile.coordinate, self.adjacency_list[neighbour])
-                ):
-                    count += 1
-        return True if count > threshold else False
+    @property
+    def eligibility(self):
+        """3x3 plot masks over the whole grid, computed in one vectorized pass."""
+        if self._eligibility is None:
+            self._eligibility = PlotEligibility(self.to_array())
+        return self._eligibility
+
+    def is_3x3(self, point):
+        return self.eligibility.is_square(point.coordinate)
 
     def get_square(self, point, size=3):
         tiles = set()
@@ -393,48 +482,67 @@ class Grid:
         tiles = tiles.difference({None})
         return tiles
 
-    def dijkstra(self, available: set = None):
-        if available is None:
-            available = self
-        start = self.center
-        unvisited = list()
-        for tile in available:
-            unvisited.append(tile)
-        # Start tile has distance 0 from itself.
-        start.distance = 0
-        while unvisited:
-            # Find index of tile with minimum distance from center.
-            smallest = 0
-            for index in range(1, len(unvisited)):
-                if unvisited[index].distance < unvisited[smallest].distance:
-                    smallest = index
-            # Visit tile with minimum distance.
-            current = unvisited.pop(smallest)
-
-            # Check potential path lengths from current vertex to neighbours.
-            for adjacent in self.adjacency_list[current]:
-                if adjacent in available:
-                    edge_weight = self.edge_weights[(current, adjacent)]
-                    path_distance = current.distance + edge_weight
-                    # If shorter path found, update adjacent distance and predecessor.
-                    if path_distance < adjacent.distance:
-                        adjacent.distance = path_distance
-                        adjacent.predecessor = current
-
-    def shortest_path(self, destination, start=None):
+    def dijkstra(self, available: set = None, targets=None, start=None):
+        """
+        Shortest paths from start (the center by default) over available tiles.
+        Stops once every target is settled. Results are cached and repaired
+        when edge weights decrease, and a cached search resumes where it stopped.
+        """
         if start is None:
             start = self.center
-        path = list()
-        current = destination
-        while current is not start:
-            try:
-                if not isinstance(current, Tile):
-                    raise TypeError
-                path.append(current)
-                current = current.predecessor
-            except (AttributeError, TypeError):
-                return False
-        path.append(start)
+        key = (start, None if available is None else frozenset(available))
+        paths = self._path_cache.get(key)
+        if paths is None:
+            paths = ShortestPaths(
+                self.adjacency_list.__getitem__,
+                self.edge_weights,
+                start,
+                available=key[1],
+            )
+            self._path_cache[key] = paths
+        return paths.settle(targets)
+
+    def steiner_tree(self, available: set = None, sources=None):
+        """
+        Road network grown from the sources (the center by default) over
+        available tiles. Each connect joins one tile of every group to it,
+        nearest group first.
+        """
+        if sources is None:
+            sources = (self.center,)
+        return SteinerTree(
+            self.adjacency_list.__getitem__,
+            self.edge_weights,
+            sources,
+            available=available,
+        )
+
+    def set_edge_weight(self, tile_a, tile_b, weight):
+        if weight <= self.edge_weights[(tile_a, tile_b)]:
+            self.lower_edge_weights([(tile_a, tile_b)], weight)
+            return
+        self.edge_weights[(tile_a, tile_b)] = weight
+        self.edge_weights[(tile_b, tile_a)] = weight
+        # Cached searches can't be repaired after an increase.
+        self._path_cache.clear()
+
+    def lower_edge_weights(self, edges, weight):
+        lowered = list()
+        for tile_a, tile_b in edges:
+            if weight < self.edge_weights[(tile_a, tile_b)]:
+                self.edge_weights[(tile_a, tile_b)] = weight
+                self.edge_weights[(tile_b, tile_a)] = weight
+                lowered.append((tile_a, tile_b))
+        # Repair cached searches instead of discarding them.
+        for paths in self._path_cache.values():
+            paths.decrease(lowered)
+
+    def shortest_path(self, destination, start=None, paths=None):
+        if paths is None:
+            paths = self.dijkstra(targets=(destination,), start=start)
+        path = paths.path(destination)
+        if path is None:
+            return False
 
         # Debugging messages.
         # coords = list(
@@ -450,22 +558,44 @@ class Grid:
         return path
 
 
+def _drive(steps, probe_tiles, probe_blocks):
+    # Run a generator of probe requests, answering each by its kind.
+    probes = {TILES: probe_tiles, BLOCKS: probe_blocks}
+    try:
+        kind, request = next(steps)
+        while True:
+            kind, request = steps.send(probes[kind](request))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def _drive_async(steps, probe_tiles, probe_blocks):
+    probes = {TILES: probe_tiles, BLOCKS: probe_blocks}
+    try:
+        kind, request = next(steps)
+        while True:
+            kind, request = steps.send(await probes[kind](request))
+    except StopIteration as stop:
+        return stop.value
+
+
 class Tile:
     """
     - 3x3 block vertices of graph structure in Grid.
     - Store the position of center block as a Vec3.
     - Store their unique Cartesian coordinate relative to the overall grid.
-    - Store their distance from starting tile of last iteration of Dijkstra's algorithm.
     - Determines and stores the terrain type of the center tile.
 
     """
 
-    def __init__(self, position, coordinate):
+    # Grids hold thousands of tiles, so skip the per-instance dict.
+    __slots__ = ("_position", "_coordinate", "terrain")
+
+    def __init__(self, position, coordinate, terrain=None):
         self.position = position
         self.coordinate = coordinate
-        self.predecessor = None
-        self.distance = float("inf")
-        self.terrain = self.find_terrain()
+        # Terrain may be probed in advance along with other tiles.
+        self.terrain = self.find_terrain() if terrain is None else terrain
 
     @property
     def position(self):
@@ -491,18 +621,7 @@ class Tile:
         x = self.position.x
         y = self.position.y
         z = self.position.z
-        under = get_block(x, y, z)
-
-        if under in {8, 9}:
-            return Biome.WATER
-        elif under in {10, 11}:
-            return Biome.LAVA
-        elif under in {18, 81, 83, 39, 40, 17, 261, 579, 580}:
-            return Biome.JUNGLE
-        elif under in {12, 24}:
-            return Biome.DESSERT
-        else:
-            return Biome.GRASSY
+        return BIOMES[classify_block(get_block(x, y, z))]
 
 
 def main():
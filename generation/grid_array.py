@@ -0,0 +1,305 @@
+from __future__ import annotations
+from typing import (
+    Callable,
+    Collection,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Final,
+)
+from enum import Enum
+
+import numpy as np
+from mcpi.vec3 import Vec3
+from generation.pathfinding import ShortestPaths
+from generation.connectivity import largest_grid_component
+
+__all__ = [
+    'GridArray',
+]
+
+Label = Tuple[int, int]
+Node = TypeVar('Node', bound=Hashable)
+
+# Code of a missing tile in the terrain array and of a missing edge.
+NO_TILE: Final[int] = 0
+NO_EDGE: Final[int] = 0
+
+
+class GridArray:
+    """
+    Dense array backend for a grid of tiles addressed by (i, j) labels.
+    - heights[i, j] is the world y of a tile and terrain[i, j] is a code
+      into terrain_types, where 0 marks a missing tile.
+    - Undirected edges are stored once. south[i, j] joins (i, j) to
+      (i + 1, j) and east[i, j] joins (i, j) to (i, j + 1), 0 marks none.
+    - Array indices are labels minus offset; label i runs along world x
+      and label j along world z, one stride apart.
+    - Grids are packed from a graph of tile objects or grown in place
+      with add_tile, which extends the arrays as labels require.
+    """
+
+    def __init__(
+            self,
+            heights: np.ndarray,
+            terrain: np.ndarray,
+            south: np.ndarray,
+            east: np.ndarray,
+            /, *,
+            terrain_types: Sequence[Optional[Enum]],
+            offset: Label = (0, 0),
+            origin: Tuple[float, float] = (0, 0),
+            stride: int = 1,
+    ) -> None:
+        if not heights.shape == terrain.shape == south.shape == east.shape:
+            raise ValueError('Grid arrays must share one shape.')
+        self.heights: np.ndarray = heights
+        self.terrain: np.ndarray = terrain
+        self.south: np.ndarray = south
+        self.east: np.ndarray = east
+        # terrain_types[0] stands for a missing tile.
+        self.terrain_types: Final = tuple(terrain_types)
+        self._terrain_codes: Final = {
+            terrain_type: code for code, terrain_type in enumerate(self.terrain_types)
+        }
+        # Moves when add_tile extends the arrays below the first label.
+        self.offset: Label = offset
+        # World (x, z) of label (0, 0).
+        self.origin: Final = origin
+        self.stride: Final = stride
+
+    @classmethod
+    def empty(
+            cls,
+            shape: Tuple[int, int],
+            /, *,
+            terrain_types: Sequence[Enum],
+            **kwargs,
+    ) -> GridArray:
+        """Grid without tiles or edges, ready to be filled in place."""
+        return cls(
+            np.zeros(shape, dtype=np.int32),
+            np.zeros(shape, dtype=np.uint8),
+            np.zeros(shape, dtype=np.uint16),
+            np.zeros(shape, dtype=np.uint16),
+            terrain_types=(None, *terrain_types),
+            **kwargs,
+        )
+
+    @classmethod
+    def from_graph(
+            cls,
+            adjacency_list: Dict[Node, Iterable[Node]],
+            edge_weights: Dict[Tuple[Node, Node], int],
+            /, *,
+            label: Callable[[Node], Label],
+            position: Callable[[Node], Vec3],
+            terrain: Callable[[Node], Enum],
+            terrain_types: Sequence[Enum],
+            stride: int,
+    ) -> GridArray:
+        """Pack a graph of tile objects into arrays."""
+        labels: Dict[Node, Label] = {node: label(node) for node in adjacency_list}
+        if not labels:
+            return cls.empty((0, 0), terrain_types=terrain_types, stride=stride)
+        rows, columns = zip(*labels.values())
+        offset: Label = (min(rows), min(columns))
+        # Any tile fixes the world position of label (0, 0).
+        node, (i, j) = next(iter(labels.items()))
+        grid = cls.empty(
+            (max(rows) - offset[0] + 1, max(columns) - offset[1] + 1),
+            terrain_types=terrain_types,
+            offset=offset,
+            origin=(position(node).x - i * stride, position(node).z - j * stride),
+            stride=stride,
+        )
+        for node, (i, j) in labels.items():
+            grid.heights[i - offset[0], j - offset[1]] = position(node).y
+            grid.terrain[i - offset[0], j - offset[1]] = \
+                grid._terrain_codes[terrain(node)]
+        for node, adjacent_nodes in adjacency_list.items():
+            for adjacent in adjacent_nodes:
+                grid.set_weight(
+                    labels[node], labels[adjacent], edge_weights[(node, adjacent)]
+                )
+        return grid
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.terrain.shape
+
+    @property
+    def present(self) -> np.ndarray:
+        return self.terrain != NO_TILE
+
+    @property
+    def nbytes(self) -> int:
+        return self.heights.nbytes + self.terrain.nbytes \
+            + self.south.nbytes + self.east.nbytes
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.present))
+
+    def __iter__(self) -> Iterator[Label]:
+        for i, j in zip(*np.nonzero(self.present)):
+            yield int(i) + self.offset[0], int(j) + self.offset[1]
+
+    def __contains__(self, label: Label) -> bool:
+        index = self.index(label)
+        return index is not None and self.terrain[index] != NO_TILE
+
+    def index(self, label: Label) -> Optional[Tuple[int, int]]:
+        """Array index of a label, None if outside the arrays."""
+        i, j = label[0] - self.offset[0], label[1] - self.offset[1]
+        if 0 <= i < self.shape[0] and 0 <= j < self.shape[1]:
+            return i, j
+        return None
+
+    def position(self, label: Label) -> Vec3:
+        i, j = label
+        return Vec3(
+            self.origin[0] + i * self.stride,
+            int(self.heights[self.index(label)]),
+            self.origin[1] + j * self.stride,
+        )
+
+    def terrain_type(self, label: Label) -> Optional[Enum]:
+        return self.terrain_types[self.terrain[self.index(label)]]
+
+    def terrain_mask(self, terrain_type: Enum) -> np.ndarray:
+        return self.terrain == self._terrain_codes[terrain_type]
+
+    def add_tile(self, label: Label, height: int, terrain_type: Enum) -> None:
+        """Add or replace the tile at a label, extending the arrays if needed."""
+        self.reserve(label)
+        index = self.index(label)
+        self.heights[index] = height
+        self.terrain[index] = self._terrain_codes[terrain_type]
+
+    def reserve(self, label: Label) -> None:
+        """
+        Extend the arrays to cover a label. Each side at least doubles, so
+        a grid grown one tile at a time is copied a logarithmic number of times.
+        """
+        if self.index(label) is not None:
+            return
+        lower = list(self.offset)
+        upper = [low + size for low, size in zip(self.offset, self.shape)]
+        for axis in (0, 1):
+            extent = max(upper[axis] - lower[axis], 1)
+            if label[axis] < lower[axis]:
+                lower[axis] = min(label[axis], lower[axis] - extent)
+            elif label[axis] >= upper[axis]:
+                upper[axis] = max(label[axis] + 1, upper[axis] + extent)
+        shape = (upper[0] - lower[0], upper[1] - lower[1])
+        # Where the current arrays land in the extended ones.
+        i, j = self.offset[0] - lower[0], self.offset[1] - lower[1]
+        region = (slice(i, i + self.shape[0]), slice(j, j + self.shape[1]))
+        for name in ('heights', 'terrain', 'south', 'east'):
+            array = getattr(self, name)
+            extended = np.zeros(shape, dtype=array.dtype)
+            extended[region] = array
+            setattr(self, name, extended)
+        self.offset = (lower[0], lower[1])
+
+    def _edge(self, label_a: Label, label_b: Label) -> Tuple[np.ndarray, Label]:
+        # Array and label holding the edge between two adjacent labels.
+        (ia, ja), (ib, jb) = label_a, label_b
+        if abs(ia - ib) + abs(ja - jb) != 1:
+            raise ValueError(f'Labels {label_a} and {label_b} are not adjacent.')
+        if ia != ib:
+            return self.south, min(label_a, label_b)
+        return self.east, min(label_a, label_b)
+
+    def weight(self, label_a: Label, label_b: Label) -> int:
+        """Weight of the edge between two labels, 0 if there is none."""
+        array, label = self._edge(label_a, label_b)
+        index = self.index(label)
+        if index is None or self.index(max(label_a, label_b)) is None:
+            return NO_EDGE
+        return int(array[index])
+
+    def set_weight(self, label_a: Label, label_b: Label, weight: int) -> None:
+        array, label = self._edge(label_a, label_b)
+        array[self.index(label)] = weight
+
+    def neighbours(self, label: Label) -> List[Label]:
+        i, j = label
+        return [
+            adjacent
+            for adjacent in ((i - 1, j), (i, j + 1), (i + 1, j), (i, j - 1))
+            if self.weight(label, adjacent) != NO_EDGE
+        ]
+
+    def is_3x3(self, label: Label) -> bool:
+        """Whether all twelve edges of the 3x3 square around a label exist."""
+        index = self.index(label)
+        if index is None:
+            return False
+        i, j = index
+        if not (1 <= i < self.shape[0] - 1 and 1 <= j < self.shape[1] - 1):
+            return False
+        return bool(
+            self.south[i - 1:i + 1, j - 1:j + 2].all()
+            and self.east[i - 1:i + 2, j - 1:j + 1].all()
+        )
+
+    def get_square(self, label: Label, size: int = 3) -> Set[Label]:
+        """Present labels in the square of the given size around a label."""
+        i, j = label
+        return {
+            (i + di, j + dj)
+            for di in range(-size // 2 + 1, size // 2 + 1)
+            for dj in range(-size // 2 + 1, size // 2 + 1)
+            if (i + di, j + dj) in self
+        }
+
+    def connected_area(self) -> np.ndarray:
+        """Mask of the largest connected area."""
+        return largest_grid_component(self)
+
+    def cull(self, keep: np.ndarray) -> None:
+        """Remove every tile outside the mask along with its edges."""
+        self.terrain[~keep] = NO_TILE
+        self.south[~keep] = NO_EDGE
+        self.east[~keep] = NO_EDGE
+        # Edges whose far end was removed.
+        self.south[:-1][~keep[1:]] = NO_EDGE
+        self.east[:, :-1][~keep[:, 1:]] = NO_EDGE
+
+    def dijkstra(
+            self,
+            available: Optional[Collection[Label]] = None,
+            targets: Optional[Iterable[Label]] = None,
+            start: Optional[Label] = None,
+    ) -> ShortestPaths:
+        """
+        Shortest paths from start (label (0, 0) by default) over available labels.
+        Stops once every target is settled.
+        """
+        return ShortestPaths(
+            self.neighbours,
+            _EdgeWeights(self),
+            (0, 0) if start is None else start,
+            available=available,
+        ).settle(targets)
+
+
+class _EdgeWeights:
+    """Read-only view of the edge arrays keyed by pairs of labels."""
+
+    def __init__(self, grid: GridArray) -> None:
+        self._grid: Final = grid
+
+    def __getitem__(self, edge: Tuple[Label, Label]) -> int:
+        weight = self._grid.weight(*edge)
+        if weight == NO_EDGE:
+            raise KeyError(edge)
+        return weight
@@ -0,0 +1,219 @@
+"""
+Connections that build without a server, for rendering and for planning
+writes in other processes. Kept out of the package root, so importing
+generation to reach a server does not load them.
+"""
+from __future__ import annotations
+from typing import (
+    Iterator,
+    List,
+    NoReturn,
+    Optional,
+    Protocol,
+    Final,
+)
+import logging
+
+import numpy as np
+from mcpi.vec3 import Vec3
+import generation
+from generation import ProxiedConnection, ServerConnection
+from generation.transport.buffer import Cuboid, int_floor
+from generation.render.canvas import VoxelCanvas
+
+__all__ = [
+    'Terrain',
+    'ServerTerrain',
+    'OfflineConnection',
+    'CaptureConnection',
+    'connect_offline',
+    'connect_capture',
+]
+
+logger = logging.getLogger(__name__)
+
+
+class Terrain(Protocol):
+    """Read-only world under an offline connection, such as a SyntheticWorld."""
+
+    def get_block(self, x: int, y: int, z: int) -> int:
+        """Block id at a position."""
+
+    def get_blocks(self, x1: int, y1: int, z1: int, x2: int, y2: int, z2: int) -> List[int]:
+        """Block ids of an inclusive box ordered by y, then x, then z."""
+
+    def get_height(self, x: int, z: int) -> int:
+        """y of the highest non-air block in a column."""
+
+
+class ServerTerrain:
+    """
+    Terrain source that reads a server over a connection of its own, for
+    offline connections in other processes. It pickles as its address,
+    connects on first read and again on the first read after a close.
+    """
+
+    def __init__(self, address: str, port: int, /) -> None:
+        self.address: Final = address
+        self.port: Final = port
+        self._connection: Optional[ProxiedConnection] = None
+
+    def __reduce__(self):
+        return ServerTerrain, (self.address, self.port)
+
+    def close(self) -> NoReturn:
+        """Close the connection, if one is open."""
+        if self._connection is not None:
+            self._connection.conn.socket.close()
+            self._connection = None
+
+    def _server(self) -> ProxiedConnection:
+        if self._connection is None:
+            self._connection = ProxiedConnection.create(self.address, self.port, pool_size=0)
+        return self._connection
+
+    def get_block(self, x: int, y: int, z: int) -> int:
+        return self._server().getBlock(x, y, z)
+
+    def get_blocks(self, x1: int, y1: int, z1: int, x2: int, y2: int, z2: int) -> List[int]:
+        return list(self._server().getBlocks(x1, y1, z1, x2, y2, z2))
+
+    def get_height(self, x: int, z: int) -> int:
+        return self._server().getHeight(x, z)
+
+
+class _OfflinePlayer:
+    """Player of an offline connection, standing where it was put."""
+
+    def __init__(self, position: Vec3) -> None:
+        self.position = position
+
+    def getPos(self) -> Vec3:
+        return self.position.clone()
+
+    def getTilePos(self) -> Vec3:
+        return Vec3(*int_floor(self.position))
+
+    def setPos(self, *args) -> NoReturn:
+        self.position = Vec3(*args)
+
+    def setTilePos(self, *args) -> NoReturn:
+        self.position = Vec3(*int_floor(args))
+
+
+class OfflineConnection(ServerConnection):
+    """
+    Connection that renders into a voxel canvas instead of a server.
+    - Writes fill the canvas, so a whole city is built at CPU speed and
+      can be exported with generation.render for a single paste.
+    - Reads see the canvas laid over a terrain source, such as a
+      SyntheticWorld, which is never modified.
+    """
+
+    def __init__(
+            self,
+            terrain: Terrain,
+            /, *,
+            canvas: Optional[VoxelCanvas] = None,
+    ) -> None:
+        self.terrain: Final = terrain
+        self.canvas: Final = VoxelCanvas() if canvas is None else canvas
+        self.player: Final = _OfflinePlayer(Vec3(0, terrain.get_height(0, 0) + 1, 0))
+
+    def postToChat(self, msg) -> NoReturn:
+        logger.info(f'BROADCAST offline : {msg}')
+
+    def setBlock(self, *args) -> NoReturn:
+        write = Cuboid.from_set_block(int_floor(args))
+        if not self._route_write(write):
+            self._send_writes([write])
+
+    def setBlocks(self, *args) -> NoReturn:
+        write = Cuboid.from_set_blocks(int_floor(args))
+        if not self._route_write(write):
+            self._send_writes([write])
+
+    def getBlock(self, *args) -> int:
+        x, y, z = int_floor(args)
+        if (block_id := self._local_block(x, y, z)) is not None:
+            return block_id
+        self.flush()
+        return self._block(x, y, z)
+
+    def getBlocks(self, *args) -> Iterator[int]:
+        x1, y1, z1, x2, y2, z2 = int_floor(args)
+        self._release()
+        self.flush()
+        lower = min(x1, x2), min(y1, y2), min(z1, z2)
+        upper = max(x1, x2), max(y1, y2), max(z1, z2)
+        # Both are ordered by y, then x, then z, like server replies.
+        blocks = np.array(self.terrain.get_blocks(*lower, *upper), dtype=np.uint32)
+        codes = self.canvas.region(lower, upper).transpose(1, 0, 2).ravel()
+        written = codes != 0
+        blocks[written] = (codes[written] - 1) >> 4
+        return iter(blocks.tolist())
+
+    def getHeight(self, *args) -> int:
+        x, z = int_floor(args)
+        for snapshot in reversed(self._snapshots):
+            if (height := snapshot.get_height(x, z)) is not None:
+                return height
+        self._release()
+        self.flush()
+        top = self.canvas.top(x, z)
+        height = self.terrain.get_height(x, z)
+        y = height if top is None else max(top, height)
+        # Air written over the terrain lowers its surface.
+        while y > 0 and self._block(x, y, z) == 0:
+            y -= 1
+        return y
+
+    def _block(self, x: int, y: int, z: int) -> int:
+        state = self.canvas.get(x, y, z)
+        return self.terrain.get_block(x, y, z) if state is None else state[0]
+
+    def _send_writes(self, writes: List[Cuboid]) -> NoReturn:
+        for write in writes:
+            self.canvas.fill(write)
+
+
+class CaptureConnection(OfflineConnection):
+    """
+    Offline connection that keeps every box it was sent, so that one
+    process can plan writes that another sends to the server.
+    """
+
+    def __init__(self, terrain: Terrain, /) -> None:
+        super(CaptureConnection, self).__init__(terrain)
+        self._captured: List[Cuboid] = list()
+
+    def take(self) -> List[Cuboid]:
+        """Writes sent since the last take, after which the canvas is empty."""
+        self._release()
+        self.flush()
+        writes, self._captured = self._captured, list()
+        self.canvas.clear()
+        return writes
+
+    def _send_writes(self, writes: List[Cuboid]) -> NoReturn:
+        super(CaptureConnection, self)._send_writes(writes)
+        self._captured.extend(writes)
+
+
+def connect_offline(terrain: Terrain, /) -> OfflineConnection:
+    """
+    Render into a voxel canvas over the given terrain instead of a server.
+    Like connect, this must run before the modules that build are imported.
+    """
+    # Set on the package, where every module looks the connection up.
+    generation.connection = OfflineConnection(terrain)
+    return generation.connection
+
+
+def connect_capture(terrain: Terrain, /) -> CaptureConnection:
+    """
+    Capture writes over the given terrain for another process to send.
+    Like connect, this must run before the modules that build are imported.
+    """
+    generation.connection = CaptureConnection(terrain)
+    return generation.connection
@@ -0,0 +1,299 @@
+from __future__ import annotations
+from typing import (
+    Callable,
+    Collection,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Final,
+)
+import heapq
+import itertools
+import math
+
+__all__ = [
+    'ShortestPaths',
+    'AStar',
+    'SteinerTree',
+]
+
+Node = TypeVar('Node', bound=Hashable)
+Key = TypeVar('Key', bound=Hashable)
+
+
+class ShortestPaths(Generic[Node]):
+    """
+    Single-source shortest paths over a weighted, undirected graph.
+    - Distances and predecessors are kept on the result, never on the nodes,
+      so several queries can coexist and be cached.
+    - The search is lazy. It stops as soon as the requested targets are
+      settled and resumes from its frontier when a later query needs more.
+    - Edge weight decreases are repaired in place. Only nodes whose distance
+      improves are revisited, the rest of the tree is kept.
+    """
+
+    def __init__(
+            self,
+            neighbours: Callable[[Node], Iterable[Node]],
+            weights: Dict[Tuple[Node, Node], float],
+            source: Node,
+            /, *,
+            available: Optional[Collection[Node]] = None,
+    ) -> None:
+        self._neighbours: Final = neighbours
+        self._weights: Final = weights
+        self._available: Final = available
+        self.source: Final = source
+        self.distance: Dict[Node, float] = {source: 0}
+        self.predecessor: Dict[Node, Optional[Node]] = {source: None}
+        self.settled: Set[Node] = set()
+        # Heap entries are (distance, tie breaker, node).
+        self._order: Final = itertools.count()
+        self._frontier: List[Tuple[float, int, Node]] = [
+            (0, next(self._order), source)
+        ]
+        self.expanded: int = 0
+
+    def settle(self, targets: Optional[Iterable[Node]] = None) -> ShortestPaths:
+        """
+        Run the search until every target is settled or unreachable.
+        Without targets the whole reachable graph is settled.
+        """
+        targets = None if targets is None else tuple(targets)
+        frontier = self._frontier
+        while frontier and not self._is_final(targets):
+            distance, _, current = heapq.heappop(frontier)
+            if current in self.settled or distance > self.distance[current]:
+                continue  # Stale entry.
+            self.settled.add(current)
+            self.expanded += 1
+            for adjacent in self._neighbours(current):
+                self._relax(current, adjacent)
+        return self
+
+    def decrease(self, edges: Iterable[Tuple[Node, Node]]) -> ShortestPaths:
+        """
+        Repair the tree after the weights of the given edges were lowered.
+        Improved nodes are returned to the frontier and the improvement is
+        propagated by the next settle.
+        """
+        for node_a, node_b in edges:
+            for current, adjacent in ((node_a, node_b), (node_b, node_a)):
+                if current in self.settled:
+                    self._relax(current, adjacent)
+        return self
+
+    def _relax(self, current: Node, adjacent: Node) -> None:
+        if self._available is not None and adjacent not in self._available:
+            return
+        path_distance = self.distance[current] + self._weights[(current, adjacent)]
+        if path_distance < self.distance.get(adjacent, math.inf):
+            self.distance[adjacent] = path_distance
+            self.predecessor[adjacent] = current
+            # Only possible for settled nodes after a weight decrease.
+            self.settled.discard(adjacent)
+            heapq.heappush(
+                self._frontier, (path_distance, next(self._order), adjacent)
+            )
+
+    def _is_final(self, targets: Optional[Tuple[Node, ...]]) -> bool:
+        # Targets are final once settled and nothing cheaper is queued.
+        if targets is None:
+            return False
+        if not all(target in self.settled for target in targets):
+            return False
+        bound = max((self.distance[target] for target in targets), default=0)
+        return self._frontier[0][0] >= bound
+
+    @property
+    def complete(self) -> bool:
+        return not self._frontier
+
+    def distance_to(self, destination: Node) -> float:
+        self.settle((destination,))
+        return self.distance.get(destination, math.inf)
+
+    def path(self, destination: Node) -> Optional[List[Node]]:
+        """Nodes from the destination back to the source, or None if unreachable."""
+        self.settle((destination,))
+        if destination not in self.settled:
+            return None
+        return list(self.walk(destination))
+
+    def walk(self, destination: Node) -> Iterator[Node]:
+        current: Optional[Node] = destination
+        while current is not None:
+            yield current
+            current = self.predecessor[current]
+
+    def tree(self) -> Dict[Node, Optional[Node]]:
+        """Predecessor of every settled node."""
+        return {node: self.predecessor[node] for node in self.settled}
+
+
+class AStar(Generic[Node]):
+    """
+    Single-pair shortest paths guided by a heuristic.
+    - The heuristic must never overestimate the remaining distance,
+      otherwise returned paths may not be shortest.
+    - Each search starts fresh as the heuristic depends on the target.
+    """
+
+    def __init__(
+            self,
+            neighbours: Callable[[Node], Iterable[Node]],
+            weights: Dict[Tuple[Node, Node], float],
+            source: Node,
+            /, *,
+            heuristic: Callable[[Node, Node], float],
+            available: Optional[Collection[Node]] = None,
+    ) -> None:
+        self._neighbours: Final = neighbours
+        self._weights: Final = weights
+        self._heuristic: Final = heuristic
+        self._available: Final = available
+        self.source: Final = source
+        self.expanded: int = 0
+
+    def search(self, destination: Node) -> Optional[List[Node]]:
+        """Nodes from the destination back to the source, or None if unreachable."""
+        order = itertools.count()
+        distance: Dict[Node, float] = {self.source: 0}
+        predecessor: Dict[Node, Optional[Node]] = {self.source: None}
+        closed: Set[Node] = set()
+        # Heap entries are (estimated total, tie breaker, node).
+        frontier: List[Tuple[float, int, Node]] = [
+            (self._heuristic(self.source, destination), next(order), self.source)
+        ]
+        while frontier:
+            _, _, current = heapq.heappop(frontier)
+            if current in closed:
+                continue  # Stale entry.
+            if current == destination:
+                path: List[Node] = list()
+                while current is not None:
+                    path.append(current)
+                    current = predecessor[current]
+                return path
+            closed.add(current)
+            self.expanded += 1
+            for adjacent in self._neighbours(current):
+                if adjacent in closed:
+                    continue
+                if self._available is not None and adjacent not in self._available:
+                    continue
+                path_distance = distance[current] + self._weights[(current, adjacent)]
+                if path_distance < distance.get(adjacent, math.inf):
+                    distance[adjacent] = path_distance
+                    predecessor[adjacent] = current
+                    estimate = path_distance + self._heuristic(adjacent, destination)
+                    heapq.heappush(frontier, (estimate, next(order), adjacent))
+        return None
+
+
+class SteinerTree(Generic[Node]):
+    """
+    Approximate minimum Steiner tree grown from a set of source nodes.
+    - Terminals come in groups and a group is joined by reaching any one
+      of its members, such as the candidate doors of a plot.
+    - The nearest unjoined terminal is grafted onto the tree first.
+    - One multi-source search serves every graft. Grafted nodes become
+      sources at distance zero and the search is repaired, not restarted.
+    """
+
+    def __init__(
+            self,
+            neighbours: Callable[[Node], Iterable[Node]],
+            weights: Dict[Tuple[Node, Node], float],
+            sources: Iterable[Node],
+            /, *,
+            available: Optional[Collection[Node]] = None,
+    ) -> None:
+        self._neighbours: Final = neighbours
+        self._weights: Final = weights
+        self._available: Final = available
+        self.nodes: Set[Node] = set(sources)
+        self.distance: Dict[Node, float] = {node: 0 for node in self.nodes}
+        self.predecessor: Dict[Node, Optional[Node]] = {
+            node: None for node in self.nodes
+        }
+        self.settled: Set[Node] = set()
+        # Heap entries are (distance to tree, tie breaker, node).
+        self._order: Final = itertools.count()
+        self._frontier: List[Tuple[float, int, Node]] = [
+            (0, next(self._order), node) for node in self.nodes
+        ]
+        self.expanded: int = 0
+        # Total weight of the edges grafted onto the tree.
+        self.length: float = 0
+
+    def connect(self, groups: Dict[Key, Collection[Node]]) -> Dict[Key, Node]:
+        """
+        Graft one terminal of every group onto the tree.
+        Returns the terminal joined for each group; unreachable groups are left out.
+        May be called again with new groups, which resume the same search.
+        """
+        owners: Dict[Node, List[Key]] = dict()
+        for key, terminals in groups.items():
+            for terminal in terminals:
+                owners.setdefault(terminal, list()).append(key)
+        joined: Dict[Key, Node] = dict()
+        frontier = self._frontier
+        for terminal in [node for node in owners if node in self.settled]:
+            # Settled by an earlier call, so no entry of it is left to pop.
+            # Its distance is final, so it is queued again at that distance.
+            self.settled.discard(terminal)
+            heapq.heappush(
+                frontier, (self.distance[terminal], next(self._order), terminal)
+            )
+        while frontier and len(joined) < len(groups):
+            distance, _, current = heapq.heappop(frontier)
+            if current in self.settled or distance > self.distance[current]:
+                continue  # Stale entry.
+            keys = [key for key in owners.pop(current, ()) if key not in joined]
+            if keys:
+                # Nearest unjoined terminal, as nodes are popped by distance.
+                self._graft(current)
+                joined.update((key, current) for key in keys)
+            self.settled.add(current)
+            self.expanded += 1
+            for adjacent in self._neighbours(current):
+                self._relax(current, adjacent)
+        return joined
+
+    def _graft(self, terminal: Node) -> None:
+        # Predecessors of grafted nodes are kept as the edges of the tree.
+        self.length += self.distance[terminal]
+        current = terminal
+        while current not in self.nodes:
+            self.nodes.add(current)
+            self.distance[current] = 0
+            self.settled.discard(current)
+            heapq.heappush(self._frontier, (0, next(self._order), current))
+            current = self.predecessor[current]
+
+    def _relax(self, current: Node, adjacent: Node) -> None:
+        if self._available is not None and adjacent not in self._available:
+            return
+        path_distance = self.distance[current] + self._weights[(current, adjacent)]
+        if path_distance < self.distance.get(adjacent, math.inf):
+            self.distance[adjacent] = path_distance
+            self.predecessor[adjacent] = current
+            # Settled nodes improve once a graft brings the tree closer.
+            self.settled.discard(adjacent)
+            heapq.heappush(
+                self._frontier, (path_distance, next(self._order), adjacent)
+            )
+
+    def edges(self) -> Iterator[Tuple[Node, Node]]:
+        """Every edge of the tree as (node, parent)."""
+        for node in self.nodes:
+            if (parent := self.predecessor[node]) is not None:
+                yield node, parent
@@ -0,0 +1,202 @@
+from __future__ import annotations
+from typing import (
+    Callable,
+    List,
+    NamedTuple,
+    NoReturn,
+    Optional,
+    Sequence,
+)
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import queue
+import random
+import threading
+
+import numpy as np
+from mcpi.vec3 import Vec3
+import generation
+from generation import ProxiedConnection, ServerConnection
+from generation.offline import (
+    OfflineConnection,
+    ServerTerrain,
+    Terrain,
+    connect_capture,
+)
+from generation.transport.buffer import Cuboid
+from generation.transport.recording import RECORD_DTYPE, cuboids
+
+__all__ = [
+    'HouseJob',
+    'plan_houses',
+]
+
+logger = logging.getLogger(__name__)
+
+# Builds a house through the shared connection, like House or a function
+# that registers a HouseBuilder with the DirectorFactory.
+Build = Callable[..., object]
+Progress = Callable[[int, int], NoReturn]
+
+
+class HouseJob(NamedTuple):
+    """Everything a worker needs to plan one house."""
+    center: Vec3
+    door: Vec3
+    biome: int
+    # Seeds the random module, so a job plans the same house anywhere.
+    seed: int
+
+
+def plan_houses(
+        connection: ServerConnection,
+        build: Build,
+        jobs: Sequence[HouseJob],
+        /, *,
+        workers: Optional[int] = None,
+        progress: Optional[Progress] = None,
+) -> int:
+    """
+    Plan houses in a pool of processes and send them from this one,
+    returning the number of commands sent.
+    - Each worker builds into a capture connection over the same terrain,
+      compacted to the final state of every block, and returns its writes
+      as command log records.
+    - A single uploader thread sends the records of each house in job
+      order, so where neighbours overlap the later one wins, as when they
+      are built one by one.
+    - Houses are planned against the terrain as it was before any of them,
+      so they must not read each other's blocks. Offline terrain never
+      changes, so houses are sent while the workers plan the rest. Workers
+      read a server live, so over a server nothing is sent until every
+      house is planned.
+    build is called as build(center, door, biome=biome) in the workers and
+    must pickle by reference. progress is called with the houses sent so
+    far and the total, from the uploader thread.
+    """
+    if (terrain := _terrain(connection)) is None:
+        logger.warning(
+            f'{type(connection).__name__} has no terrain to share, '
+            f'so houses are built in this process.'
+        )
+        # Seeding must not disturb the random state the caller goes on with.
+        state = random.getstate()
+        try:
+            for built, job in enumerate(jobs, 1):
+                random.seed(job.seed)
+                build(job.center, job.door, biome=job.biome)
+                if progress is not None:
+                    progress(built, len(jobs))
+        finally:
+            random.setstate(state)
+        return 0
+    # Reads in the workers must see every write issued so far.
+    connection.sync()
+    payloads: queue.Queue[Optional[np.ndarray]] = queue.Queue()
+    uploader = _Uploader(connection, payloads, len(jobs), progress)
+    # Writes sent while workers read the server would race their reads.
+    streaming = not isinstance(terrain, ServerTerrain)
+    if streaming:
+        uploader.start()
+    try:
+        # Spawned workers import afresh, so none shares this connection.
+        with ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=connect_capture,
+                initargs=(terrain,),
+        ) as executor:
+            futures = [executor.submit(_plan_house, build, job) for job in jobs]
+            try:
+                for future in futures:
+                    payloads.put(future.result())
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        if not streaming:
+            uploader.start()
+    finally:
+        payloads.put(None)
+        # Never started when planning failed before a held upload.
+        if uploader.ident is not None:
+            uploader.join()
+    if uploader.error is not None:
+        raise uploader.error
+    logger.info(
+        f'Planned {len(jobs)} houses in parallel, sent as {uploader.commands} commands.'
+    )
+    return uploader.commands
+
+
+def _terrain(connection: ServerConnection) -> Optional[Terrain]:
+    # What the workers read from, None if there is nothing to share.
+    if isinstance(connection, OfflineConnection):
+        return connection.terrain
+    if isinstance(connection, ProxiedConnection):
+        return ServerTerrain(*connection.conn.socket.getpeername()[:2])
+    return None
+
+
+def _plan_house(build: Build, job: HouseJob) -> np.ndarray:
+    # Runs in a worker, where the shared connection captures writes.
+    capture = generation.connection
+    random.seed(job.seed)
+    try:
+        with capture.compacted(ordered=False) as compactor:
+            build(job.center, job.door, biome=job.biome)
+    finally:
+        if isinstance(capture.terrain, ServerTerrain):
+            # A connection per house, so none outlives the pool.
+            capture.terrain.close()
+    writes = capture.take()
+    logger.debug(
+        f'Planned house at {job.center}: {compactor.issued} writes as '
+        f'{len(writes)} commands.'
+    )
+    return _records(writes)
+
+
+def _records(writes: List[Cuboid]) -> np.ndarray:
+    return np.array(
+        [(*write.lower, *write.upper, *write.block) for write in writes],
+        dtype=RECORD_DTYPE,
+    )
+
+
+class _Uploader(threading.Thread):
+    """Sends the records of each planned house, the only user of the connection."""
+
+    def __init__(
+            self,
+            connection: ServerConnection,
+            payloads: queue.Queue[Optional[np.ndarray]],
+            total: int,
+            progress: Optional[Progress],
+    ) -> None:
+        super().__init__(name='house-uploader', daemon=True)
+        self._connection = connection
+        self._payloads = payloads
+        self._total = total
+        self._progress = progress
+        self.commands: int = 0
+        self.error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        sent = 0
+        while (records := self._payloads.get()) is not None:
+            if self.error is not None:
+                continue
+            try:
+                # Through setBlocks, so recording and diffing see every write.
+                with self._connection.buffered():
+                    for write in cuboids(records):
+                        self._connection.setBlocks(*write.lower, *write.upper, *write.block)
+                self._connection.flush()
+                self.commands += len(records)
+                sent += 1
+                if self._progress is not None:
+                    self._progress(sent, self._total)
+            except BaseException as error:
+                self.error = error
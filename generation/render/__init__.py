@@ -0,0 +1,18 @@
+from generation.render.canvas import VoxelCanvas
+
+__all__ = [
+    'VoxelCanvas',
+    'block_state',
+    'export',
+    'write_npz',
+    'write_schematic',
+]
+
+
+def __getattr__(name: str):
+    # The exporter reads its block state table on import, so it only loads
+    # when asked for. Connections need no more than the canvas.
+    if name in ('block_state', 'export', 'write_npz', 'write_schematic'):
+        from generation.render import schematic
+        return getattr(schematic, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
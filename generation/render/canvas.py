@@ -0,0 +1,183 @@
+from __future__ import annotations
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Final,
+)
+import bisect
+import logging
+
+import numpy as np
+from generation.transport.buffer import Cuboid, BlockState
+
+__all__ = [
+    'VoxelCanvas',
+    'encode_states',
+    'decode_states',
+]
+
+logger = logging.getLogger(__name__)
+
+Position = Tuple[int, int, int]
+
+CHUNK: Final[int] = 16
+# Code of a voxel that was never written.
+UNWRITTEN: Final[int] = 0
+
+
+def encode_states(block_ids: np.ndarray, block_data: np.ndarray) -> np.ndarray:
+    """Pack block ids and 4-bit data values into non-zero voxel codes."""
+    return (block_ids.astype(np.uint32) << 4 | (block_data.astype(np.uint32) & 0xF)) + 1
+
+
+def decode_states(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Block ids and data values of voxel codes, air where unwritten."""
+    states = np.where(codes == UNWRITTEN, 0, codes - 1)
+    return (states >> 4).astype(np.uint16), (states & 0xF).astype(np.uint8)
+
+
+class VoxelCanvas:
+    """
+    Sparse buffer of written voxels.
+    - Space is cut into 16^3 chunks that are allocated on first write, so
+      memory follows what was built rather than the extent of the world.
+    - A voxel holds a code packing its block id and data value, with 0
+      marking voxels that were never written. Written air is kept, so
+      the canvas can clear terrain when pasted.
+    - paint and code store and read raw codes, so any non-zero label
+      per voxel can be kept the same way.
+    - Allocated chunks are indexed by column, so top only reads the
+      chunks above a position.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: Dict[Position, np.ndarray] = dict()
+        # Sorted chunk y coordinates allocated in each chunk column.
+        self._columns: Dict[Tuple[int, int], List[int]] = dict()
+        self.writes: int = 0
+
+    def __len__(self) -> int:
+        """Number of written voxels."""
+        return sum(int(np.count_nonzero(chunk)) for chunk in self._chunks.values())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(chunk.nbytes for chunk in self._chunks.values())
+
+    def chunks(self) -> Iterator[Tuple[Position, np.ndarray]]:
+        """Chunk coordinates and voxel codes of every allocated chunk."""
+        yield from self._chunks.items()
+
+    def chunk(self, key: Position) -> Optional[np.ndarray]:
+        """Voxel codes of the chunk at chunk coordinates, None if unallocated."""
+        return self._chunks.get(key)
+
+    def clear(self) -> None:
+        """Forget every written voxel."""
+        self._chunks.clear()
+        self._columns.clear()
+
+    def fill(self, write: Cuboid) -> None:
+        """Paint an inclusive box with a single block state."""
+        self.paint(
+            write.lower,
+            write.upper,
+            int(encode_states(np.array(write.block[0]), np.array(write.block[1]))),
+        )
+
+    def paint(self, lower: Position, upper: Position, code: int) -> None:
+        """Set every voxel of an inclusive box to a non-zero code."""
+        for key, local in self._spans(lower, upper):
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                chunk = self._chunks[key] = np.zeros((CHUNK,) * 3, dtype=np.uint32)
+                cx, cy, cz = key
+                bisect.insort(self._columns.setdefault((cx, cz), list()), cy)
+            chunk[local] = code
+        self.writes += 1
+
+    def code(self, x: int, y: int, z: int) -> int:
+        """Code of a voxel, UNWRITTEN if it was never written."""
+        chunk = self._chunks.get((x // CHUNK, y // CHUNK, z // CHUNK))
+        if chunk is None:
+            return UNWRITTEN
+        return int(chunk[x % CHUNK, y % CHUNK, z % CHUNK])
+
+    def get(self, x: int, y: int, z: int) -> Optional[BlockState]:
+        """Block state of a voxel, None if it was never written."""
+        code = self.code(x, y, z)
+        if code == UNWRITTEN:
+            return None
+        return (code - 1) >> 4, (code - 1) & 0xF
+
+    def region(self, lower: Position, upper: Position) -> np.ndarray:
+        """Voxel codes of an inclusive box indexed by [x][y][z]."""
+        codes = np.zeros(
+            tuple(high - low + 1 for low, high in zip(lower, upper)), dtype=np.uint32
+        )
+        for key, local in self._spans(lower, upper):
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                continue
+            origin = tuple(k * CHUNK - low for k, low in zip(key, lower))
+            codes[tuple(
+                slice(o + s.start, o + s.stop) for o, s in zip(origin, local)
+            )] = chunk[local]
+        return codes
+
+    def top(self, x: int, z: int) -> Optional[int]:
+        """Highest written non-air voxel of a column, None if there is none."""
+        cx, cz = x // CHUNK, z // CHUNK
+        # From the highest chunk down, so the first solid voxel is the top.
+        for cy in reversed(self._columns.get((cx, cz), ())):
+            column = self._chunks[cx, cy, cz][x % CHUNK, :, z % CHUNK]
+            # Air codes are the 16 data values of block id 0.
+            solid = np.flatnonzero(column > 0x10)
+            if solid.size:
+                return cy * CHUNK + int(solid[-1])
+        return None
+
+    def bounds(self) -> Optional[Tuple[Position, Position]]:
+        """Inclusive corners of the smallest box holding every written voxel."""
+        lower: Optional[np.ndarray] = None
+        upper: Optional[np.ndarray] = None
+        for key, chunk in self._chunks.items():
+            written = np.nonzero(chunk)
+            if not written[0].size:
+                continue
+            origin = np.array(key) * CHUNK
+            low = origin + [axis.min() for axis in written]
+            high = origin + [axis.max() for axis in written]
+            lower = low if lower is None else np.minimum(lower, low)
+            upper = high if upper is None else np.maximum(upper, high)
+        if lower is None:
+            return None
+        return tuple(map(int, lower)), tuple(map(int, upper))
+
+    def dense(self) -> Tuple[Position, np.ndarray]:
+        """Lower corner and voxel codes of the bounding box of the canvas."""
+        bounds = self.bounds()
+        if bounds is None:
+            return (0, 0, 0), np.zeros((0, 0, 0), dtype=np.uint32)
+        return bounds[0], self.region(*bounds)
+
+    def _spans(
+            self,
+            lower: Position,
+            upper: Position,
+    ) -> Iterator[Tuple[Position, Tuple[slice, slice, slice]]]:
+        # Chunks overlapping an inclusive box and the part of each inside it.
+        ranges = [
+            range(low // CHUNK, high // CHUNK + 1) for low, high in zip(lower, upper)
+        ]
+        for cx in ranges[0]:
+            for cy in ranges[1]:
+                for cz in ranges[2]:
+                    key = (cx, cy, cz)
+                    yield key, tuple(
+                        slice(max(low - k * CHUNK, 0), min(high - k * CHUNK, CHUNK - 1) + 1)
+                        for k, low, high in zip(key, lower, upper)
+                    )
@@ -0,0 +1,107 @@
+from __future__ import annotations
+from typing import (
+    BinaryIO,
+    Dict,
+    Union,
+    Final,
+)
+import gzip
+import os
+import struct
+
+import numpy as np
+
+__all__ = [
+    'Short',
+    'Int',
+    'ByteArray',
+    'IntArray',
+    'write_nbt',
+]
+
+TAG_END: Final[int] = 0
+TAG_BYTE: Final[int] = 1
+TAG_SHORT: Final[int] = 2
+TAG_INT: Final[int] = 3
+TAG_BYTE_ARRAY: Final[int] = 7
+TAG_STRING: Final[int] = 8
+TAG_COMPOUND: Final[int] = 10
+TAG_INT_ARRAY: Final[int] = 11
+
+
+class Short(int):
+    """Integer written as TAG_Short."""
+
+
+class Int(int):
+    """Integer written as TAG_Int."""
+
+
+class ByteArray(bytes):
+    """Bytes written as TAG_Byte_Array."""
+
+
+class IntArray(tuple):
+    """Integers written as TAG_Int_Array."""
+
+
+Tag = Union[Short, Int, ByteArray, IntArray, str, Dict[str, 'Tag']]
+
+
+def write_nbt(path: str | os.PathLike, name: str, root: Dict[str, Tag]) -> None:
+    """
+    Write a gzipped NBT file holding a single named compound.
+    - Only the tags schematics need are supported: short, int, string,
+      byte array, int array and compound.
+    - Python ints are ambiguous, so they must be wrapped in Short or Int.
+    """
+    with gzip.open(path, 'wb') as file:
+        _write_named(file, name, root)
+
+
+def _write_named(file: BinaryIO, name: str, value: Tag) -> None:
+    file.write(struct.pack('>b', _tag_type(value)))
+    _write_string(file, name)
+    _write_payload(file, value)
+
+
+def _tag_type(value: Tag) -> int:
+    if isinstance(value, Short):
+        return TAG_SHORT
+    if isinstance(value, Int):
+        return TAG_INT
+    if isinstance(value, ByteArray):
+        return TAG_BYTE_ARRAY
+    if isinstance(value, IntArray):
+        return TAG_INT_ARRAY
+    if isinstance(value, str):
+        return TAG_STRING
+    if isinstance(value, dict):
+        return TAG_COMPOUND
+    raise TypeError(f'No NBT tag for {type(value).__name__}.')
+
+
+def _write_string(file: BinaryIO, value: str) -> None:
+    encoded = value.encode('utf-8')
+    file.write(struct.pack('>H', len(encoded)))
+    file.write(encoded)
+
+
+def _write_payload(file: BinaryIO, value: Tag) -> None:
+    tag = _tag_type(value)
+    if tag == TAG_SHORT:
+        file.write(struct.pack('>h', value))
+    elif tag == TAG_INT:
+        file.write(struct.pack('>i', value))
+    elif tag == TAG_BYTE_ARRAY:
+        file.write(struct.pack('>i', len(value)))
+        file.write(value)
+    elif tag == TAG_INT_ARRAY:
+        file.write(struct.pack('>i', len(value)))
+        file.write(np.asarray(value, dtype='>i4').tobytes())
+    elif tag == TAG_STRING:
+        _write_string(file, value)
+    else:
+        for name, item in value.items():
+            _write_named(file, name, item)
+        file.write(struct.pack('>b', TAG_END))
@@ -0,0 +1,143 @@
+from __future__ import annotations
+from typing import (
+    Dict,
+    List,
+    Final,
+)
+import json
+import logging
+import os
+import pathlib
+
+import numpy as np
+from generation.render.canvas import VoxelCanvas, UNWRITTEN, decode_states
+from generation.render.nbt import ByteArray, Int, IntArray, Short, write_nbt
+
+__all__ = [
+    'block_state',
+    'write_schematic',
+    'write_npz',
+    'export',
+]
+
+logger = logging.getLogger(__name__)
+
+SPONGE_VERSION: Final[int] = 2
+# Minecraft 1.16.5. Names in the state table exist in every later release.
+DATA_VERSION: Final[int] = 2586
+AIR: Final[str] = 'minecraft:air'
+
+with open(pathlib.Path(__file__).parents[1] / 'config' / 'legacy_block_states.json') as file:
+    _legacy_block_states = json.load(file)
+
+
+def block_state(block_id: int, block_data: int = 0) -> str:
+    """
+    Block state name of a legacy block id and data value.
+    - Data values that select a material, such as wool colours or wood
+      types, pick the matching block. Orientation and other properties
+      carried by the data value are not kept.
+    - Ids without a modern block become air.
+    """
+    blocks: List[str] = _legacy_block_states['blocks']
+    name = blocks[block_id] if 0 <= block_id < len(blocks) else None
+    variants = _legacy_block_states['variants'].get(str(block_id))
+    if variants is not None:
+        data = block_data & _legacy_block_states['variant_masks'].get(str(block_id), 0xF)
+        if data < len(variants) and variants[data] is not None:
+            name = variants[data]
+    if name is None:
+        logger.warning(f'Block {block_id}:{block_data} has no block state. Using air.')
+        return AIR
+    return name
+
+
+def write_schematic(
+        canvas: VoxelCanvas,
+        path: str | os.PathLike,
+        /, *,
+        unwritten: str = AIR,
+) -> None:
+    """
+    Write the canvas as a Sponge schematic (version 2).
+    - The schematic spans the bounding box of every written voxel and its
+      Offset is the lower corner, so pasting at the original position
+      reproduces the world coordinates of the build.
+    - Voxels that were never written take the unwritten block state.
+    """
+    lower, codes = canvas.dense()
+    width, height, length = codes.shape
+    if max(codes.shape) >= 1 << 16:
+        raise ValueError(f'A schematic of size {codes.shape} does not fit its format.')
+    # Sponge schematics are ordered by y, then z, then x.
+    codes = codes.transpose(1, 2, 0).ravel()
+    states, indices = np.unique(codes, return_inverse=True)
+    block_ids, block_data = decode_states(states)
+    palette: Dict[str, int] = dict()
+    remap = np.empty(len(states), dtype=np.uint32)
+    for index, (code, block_id, data) in enumerate(zip(states, block_ids, block_data)):
+        name = unwritten if code == UNWRITTEN else block_state(int(block_id), int(data))
+        remap[index] = palette.setdefault(name, len(palette))
+    write_nbt(path, 'Schematic', {
+        'Version': Int(SPONGE_VERSION),
+        'DataVersion': Int(DATA_VERSION),
+        # Sizes are unsigned shorts stored in signed tags.
+        'Width': Short(np.uint16(width).astype(np.int16)),
+        'Height': Short(np.uint16(height).astype(np.int16)),
+        'Length': Short(np.uint16(length).astype(np.int16)),
+        'Offset': IntArray(lower),
+        'PaletteMax': Int(len(palette)),
+        'Palette': {name: Int(index) for name, index in palette.items()},
+        'BlockData': ByteArray(_varints(remap[indices]).tobytes()),
+    })
+    logger.info(
+        f'Wrote a {width}x{height}x{length} schematic of {len(palette)} '
+        f'block states to {path}.'
+    )
+
+
+def write_npz(canvas: VoxelCanvas, path: str | os.PathLike, /) -> None:
+    """
+    Write the canvas as compressed NumPy arrays indexed by [x][y][z]:
+    legacy block ids, data values, a mask of written voxels and the world
+    position of the first voxel.
+    """
+    lower, codes = canvas.dense()
+    block_ids, block_data = decode_states(codes)
+    np.savez_compressed(
+        path,
+        blocks=block_ids,
+        data=block_data,
+        written=codes != UNWRITTEN,
+        origin=np.array(lower, dtype=np.int32),
+    )
+    logger.info(f'Wrote a {"x".join(map(str, codes.shape))} voxel array to {path}.')
+
+
+def export(canvas: VoxelCanvas, path: str | os.PathLike, /) -> None:
+    """Write the canvas in the format named by the file extension, .schem or .npz."""
+    suffix = pathlib.Path(path).suffix
+    if suffix == '.schem':
+        write_schematic(canvas, path)
+    elif suffix == '.npz':
+        write_npz(canvas, path)
+    else:
+        raise ValueError(f'Cannot export to {suffix or "a file without extension"}.')
+
+
+def _varints(values: np.ndarray) -> np.ndarray:
+    # Little endian base 128, seven bits per byte with the high bit
+    # marking that more bytes follow.
+    values = values.astype(np.uint32)
+    widths = np.ones(len(values), dtype=np.int64)
+    rest = values >> 7
+    while rest.any():
+        widths += rest > 0
+        rest >>= 7
+    encoded = np.empty(int(widths.sum()), dtype=np.uint8)
+    starts = np.cumsum(widths) - widths
+    for byte in range(int(widths.max(initial=0))):
+        present = widths > byte
+        more = np.where(widths[present] > byte + 1, 0x80, 0)
+        encoded[starts[present] + byte] = (values[present] >> (7 * byte)) & 0x7F | more
+    return encoded
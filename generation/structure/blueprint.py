@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from typing import (
     Optional,
+    Dict,
+    Iterable,
     List,
     Annotated,
     Final,
@@ -10,6 +12,7 @@ from typing import (
     Iterator,
     Set,
     Deque,
+    Tuple,
     final,
 )
 from collections import deque
@@ -25,9 +28,14 @@ from enum import (
 import random
 import logging
 
+import numpy as np
 from cell import (
     Cell,
     CellType,
+    CellDirection,
+    CellGrid,
+    GridCell,
+    CELL_TYPE_CODE,
     NeighbouringCells,
 )
 from mcpi.vec3 import Vec3
@@ -51,12 +59,16 @@ logger = logging.getLogger('structure')
 CellStorage = List[List[List[Cell]]]
 CellStorageLevel = List[List[Cell]]
 CellStorageRow = List[Cell]
+# World position of a cell as (x, y, z), as Vec3 does not hash.
+CellKey = Tuple[int, int, int]
 
 
 class Blueprint(metaclass=ABCMeta):
     """
     Defines the minimum design
     requirements for a blueprint.
+    - Dense blueprints keep their cells in a CellGrid instead of Cell
+      objects and hand out GridCell views, which suits large dimensions.
     """
 
     def __init__(
@@ -75,6 +87,7 @@ class Blueprint(metaclass=ABCMeta):
             min_cells: Optional[
                 Annotated[int, 'x > 2']
             ] = None,
+            dense: bool = False,
     ):
         self._dimensions: Final = size
         # Ground floor determined from entrance.
@@ -85,15 +98,19 @@ class Blueprint(metaclass=ABCMeta):
         self._merge_factor: Final = merge_factor
         self._min_cells_per_level: Final = min_cells if min_cells else \
             (self._dimensions.x * self._dimensions.z) // 5
-        # 3D Cell storage ~ [level][row][column].
-        self._cells: CellStorage = [
+        self._inclusive: bool = True
+        self._dense: Final = dense
+        # 3D Cell storage ~ [level][row][column], or a grid when dense.
+        self._cells: CellStorage = [] if dense else [
             [list() for _ in range(self._dimensions.x + 1)]
             for _ in range(self._permissible_levels + 1)
         ]
+        self._grid: Optional[CellGrid] = None
+        # World position to cell, filled with the graph. Grids need none.
+        self._index: Dict[CellKey, Cell] = dict()
         # Flat list of level entrances.
         self._entrances: List[Optional[Cell]] = \
             [None for _ in range(self._permissible_levels)]
-        self._inclusive: bool = True
 
         self._validate_params()
 
@@ -133,28 +150,39 @@ class Blueprint(metaclass=ABCMeta):
         """Create a 3D graph with empty cells."""
         # Begin generation from the ground, south-west corner.
         logger.info('Creating graph...')
-        left_bound: Vec3 = self._structure_center - Vec3(
+        left_bound: Vec3 = self._left_bound()
+        if self._dense:
+            self._grid = CellGrid(self._extent(), left_bound)
+            return
+        for cell_index in self._seq_index_iter():
+            mc_world_pos: Vec3 = left_bound + cell_index
+            cell: Cell = Cell(mc_world_pos, CellType.DETACHED)
+            self._cells[cell_index.y][cell_index.x].append(cell)
+            self._index[tuple(mc_world_pos)] = cell
+
+    def _left_bound(self) -> Vec3:
+        # World position of the ground, south-west corner cell.
+        return self._structure_center - Vec3(
             self._dimensions.x // 2,
             self._dimensions.y // 2,
             self._dimensions.z // 2
         )
-        for cell_index in self._seq_index_iter():
-            mc_world_pos: Vec3 = left_bound + cell_index
-            self._cells[cell_index.y][cell_index.x].append(
-                Cell(mc_world_pos, CellType.DETACHED)
-            )
 
     def _connect_graph(self) -> NoReturn:
         # Connect all cells.
         logger.info('Connecting graph...')
+        if self._dense:
+            # Grid neighbours follow from index arithmetic.
+            return
         for cell_index in self._seq_index_iter():
-            neighbours: NeighbouringCells = NeighbouringCells(
-                NORTH=self._get_cell(cell_index + Vec3(1, 0, 0)),
-                SOUTH=self._get_cell(cell_index + Vec3(-1, 0, 0)),
-                EAST=self._get_cell(cell_index + Vec3(0, 0, 1)),
-                WEST=self._get_cell(cell_index + Vec3(0, 0, -1)),
-                UP=self._get_cell(cell_index + Vec3(0, 1, 0)),
-                DOWN=self._get_cell(cell_index + Vec3(0, -1, 0))
+            # Ordered as CellDirection: north, south, east, west, up, down.
+            neighbours: NeighbouringCells = (
+                self._get_cell(cell_index + Vec3(1, 0, 0)),
+                self._get_cell(cell_index + Vec3(-1, 0, 0)),
+                self._get_cell(cell_index + Vec3(0, 0, 1)),
+                self._get_cell(cell_index + Vec3(0, 0, -1)),
+                self._get_cell(cell_index + Vec3(0, 1, 0)),
+                self._get_cell(cell_index + Vec3(0, -1, 0)),
             )
             target_cell: Cell = self._get_cell(cell_index)
             target_cell.neighbours = neighbours
@@ -250,7 +278,7 @@ class Blueprint(metaclass=ABCMeta):
         assert cell is not None, 'Hook cell cannot be None.'
         neighbours: List[Optional[Cell]] = [
             neighbour
-            for direction, neighbour in cell.neighbours.items()
+            for direction, neighbour in cell.neighbour_items()
             if neighbour is not None and _predicate(direction, neighbour)
         ]
         try:
@@ -260,7 +288,7 @@ class Blueprint(metaclass=ABCMeta):
 
     @staticmethod
     def breadth_traversal(
-            start: Cell,
+            start: Cell | GridCell,
             /, *,
             _predicate: Callable[
                 [str, Cell], bool
@@ -274,6 +302,9 @@ class Blueprint(metaclass=ABCMeta):
              of the breadth-first traversal by filtering cells based on its
              criteria.
         """
+        if isinstance(start, GridCell):
+            yield from start.grid.breadth_traversal(start.index, _predicate=_predicate)
+            return
         visited: Set[Cell] = set()
         queue: Deque[Cell] = deque([start])
         while queue:
@@ -282,7 +313,7 @@ class Blueprint(metaclass=ABCMeta):
                 visited.add(cell)
                 yield cell
                 cells_to_explore: List[Cell] = [
-                    c for k, c in cell.neighbours.items()
+                    c for k, c in cell.neighbour_items()
                     if c is not None and _predicate(k, c)
                 ]
                 queue.extend(cells_to_explore)
@@ -290,6 +321,12 @@ class Blueprint(metaclass=ABCMeta):
     @final
     def _get_cell(self, pos: Vec3) -> Optional[Cell]:
         """Helper to safely get a cell from cell storage."""
+        if self._dense:
+            index: int = self._grid.index(pos.y, pos.x, pos.z)
+            return None if index < 0 else self._grid.cell(index)
+        # Negative indices would wrap around to the far side.
+        if pos.x < 0 or pos.y < 0 or pos.z < 0:
+            return None
         try:
             return self._cells[pos.y][pos.x][pos.z]
         except IndexError:
@@ -298,6 +335,13 @@ class Blueprint(metaclass=ABCMeta):
     @final
     def _flatten(self, level_no: Optional[int] = None) -> List[Cell]:
         # Flatten a 3D signature into a single dimensional list.
+        if self._dense:
+            assert level_no is None or 0 <= level_no <= self._permissible_levels, \
+                f'Level {level_no} is not permitted.'
+            level_size: int = self._grid.types[0].size
+            indices: range = range(len(self._grid)) if level_no is None else \
+                range(level_no * level_size, (level_no + 1) * level_size)
+            return [self._grid.cell(index) for index in indices]
         if level_no is None:
             # Flatten all levels.
             return [
@@ -315,11 +359,15 @@ class Blueprint(metaclass=ABCMeta):
             for cell in row
         ]
 
-    def _seq_index_iter(self) -> Iterator[Vec3]:
-        levels, rows, columns = map(
+    def _extent(self) -> Tuple[int, int, int]:
+        # Number of levels, rows and columns in cell storage.
+        return tuple(map(
             lambda x: x + 1 if self._inclusive else x,
             (self._permissible_levels, self._dimensions.x, self._dimensions.z)
-        )
+        ))
+
+    def _seq_index_iter(self) -> Iterator[Vec3]:
+        levels, rows, columns = self._extent()
         for level in range(levels):
             for row in range(rows):
                 for column in range(columns):
@@ -327,6 +375,9 @@ class Blueprint(metaclass=ABCMeta):
 
     def __iter__(self) -> Iterator[Cell]:
         # Iterate over all cells in numerical order.
+        if self._dense:
+            yield from map(self._grid.cell, range(len(self._grid)))
+            return
         for level in self._cells:
             for row in level:
                 yield from row
@@ -334,6 +385,10 @@ class Blueprint(metaclass=ABCMeta):
     @final
     def __len__(self) -> int:
         # Len of all cells that will be generated.
+        if self._dense:
+            return int(np.count_nonzero(
+                self._grid.types != CELL_TYPE_CODE[CellType.DETACHED]
+            ))
         return len(
             [cell for cell in self._flatten()
              if cell.type_ != CellType.DETACHED]
@@ -348,19 +403,63 @@ class Blueprint(metaclass=ABCMeta):
                f'cells:{len(self)}/{max_cells})'
 
     def __getitem__(self, pos: Vec3) -> Cell:
-        # Get cell by position.
-        cell: Optional[Cell] = next(
-            (cell for cell in self if cell.pos == pos),
-            None
-        )
+        # Get cell by world position.
+        cell: Optional[Cell] = self.get(pos)
         if cell is None:
             raise CellDoesNotExist(pos)
         return cell
 
+    def get(self, pos: Vec3, default: Optional[Cell] = None) -> Optional[Cell]:
+        """Cell at a world position, or default if there is none."""
+        if self._dense:
+            offset: Vec3 = pos - self._grid.origin
+            index: int = self._grid.index(offset.y, offset.x, offset.z)
+            return default if index < 0 else self._grid.cell(index)
+        return self._index.get(tuple(pos), default)
+
+    def get_many(
+            self,
+            positions: Iterable[Vec3],
+            /,
+            default: Optional[Cell] = None
+    ) -> List[Optional[Cell]]:
+        """Cells at many world positions, default where there is none."""
+        if not self._dense:
+            return [self._index.get(tuple(pos), default) for pos in positions]
+        # Offsets become flat indices in one pass over the array.
+        offsets: np.ndarray = np.array(
+            [tuple(pos) for pos in positions], dtype=np.int64
+        ).reshape(-1, 3) - tuple(self._grid.origin)
+        # Grid coordinates are [level][row][column], that is y, x, z.
+        coordinates: np.ndarray = offsets[:, [1, 0, 2]]
+        inside: np.ndarray = ((coordinates >= 0) & (coordinates < self._grid.shape)).all(axis=1)
+        indices: np.ndarray = np.where(
+            inside, np.ravel_multi_index(coordinates.T, self._grid.shape, mode='clip'), -1
+        )
+        return [
+            default if index < 0 else self._grid.cell(index)
+            for index in indices.tolist()
+        ]
+
     @property
     def signature(self) -> CellStorage:
+        if self._dense:
+            # Views are made on request, as dense blueprints hold no cells.
+            levels, rows, columns = self._grid.shape
+            return [
+                [
+                    [self._grid.cell(self._grid.index(level, row, column))
+                     for column in range(columns)]
+                    for row in range(rows)
+                ]
+                for level in range(levels)
+            ]
         return self._cells
 
+    @property
+    def dense(self) -> bool:
+        return self._dense
+
     @property
     def dimensions(self) -> Vec3:
         return self._dimensions
@@ -381,14 +480,10 @@ class ResidentialBlueprint(Blueprint):
         # Register structure entrance on first level.
         logger.debug('Creating structure entry.')
         entrance = self._structure_entrance
-        first_level: CellStorageLevel = self._cells[0]
-        cell = next(
-            (cell
-             for row in first_level
-             for cell in row
-             if cell.pos == entrance), None
-        )
-        assert cell is not None, f'Entrance at {entrance} not found.'
+        cell = self.get(entrance)
+        # The entrance must be on the first level.
+        assert cell is not None and cell.pos.y == self._left_bound().y, \
+            f'Entrance at {entrance} not found.'
         cell.type_ = CellType.STRUCTURE_ENTRY
         self._entrances[0] = cell
 
@@ -407,7 +502,7 @@ class ResidentialBlueprint(Blueprint):
         # Entrance to level is on previous level.
         level_entry: Cell = self._create_higher_level_entry(level_no)
         # Current floor.
-        above_level_entry: Optional[Cell] = level_entry.neighbours.get('UP')
+        above_level_entry: Optional[Cell] = level_entry.neighbour(CellDirection.UP)
         # Reserve the room above level entry.
         if above_level_entry is not None:
             above_level_entry.type_ = CellType.ABOVE_LEVEL_ENTRY
@@ -415,7 +510,7 @@ class ResidentialBlueprint(Blueprint):
         self._level_traversal(
             above_level_entry,
             _predicate=lambda k, c: k not in ('UP', 'DOWN') and
-                                    c.neighbours.get('DOWN') is not None
+                                    c.neighbour(CellDirection.DOWN) is not None
         )
 
     def _create_higher_level_entry(
@@ -431,7 +526,7 @@ class ResidentialBlueprint(Blueprint):
         level_entry: Optional[Cell] = self._get_random_cell(
             previous_level_no,
             _predicate=lambda c: c.type_ == CellType.REGULAR and
-                                 c.neighbours.get('UP') is not None
+                                 c.neighbour(CellDirection.UP) is not None
         )
         # Ensure level guidelines are followed.
         assert level_entry is not None, \
@@ -464,7 +559,8 @@ class ResidentialBlueprint(Blueprint):
             halt_traversal: bool = random.random() > self._explore_factor
             if halt_traversal and cell_count > self._min_cells_per_level:
                 break
-            if cell is not start_cell:
+            # Dense blueprints make a new view per visit, so compare positions.
+            if cell != start_cell:
                 cell.type_ = generative_type
 
     def _merge_cells(self) -> NoReturn:
@@ -536,7 +632,8 @@ class BlueprintFactory:
             ] = 0.5,
             min_cells: Optional[
                 Annotated[int, 'x > 2']
-            ] = None
+            ] = None,
+            dense: bool = False
     ) -> Blueprint:
         logger.debug(f'Creating blueprint of type {type_}.')
         return cls.__blueprint_types[type_](
@@ -545,5 +642,6 @@ class BlueprintFactory:
             center,
             explore_factor=explore_factor,
             merge_factor=merge_factor,
-            min_cells=min_cells
-        )
\ No newline at end of file
+            min_cells=min_cells,
+            dense=dense
+        )
@@ -15,6 +15,7 @@ from typing import (
     final,
 )
 
+from contextlib import ExitStack
 import random
 import logging
 
@@ -67,6 +68,8 @@ from blueprint import (
 )
 
 from mcpi.vec3 import Vec3
+from generation import connection as server_conn
+from generation.transport.compactor import WriteTally
 from generation.biome import Biome
 from generation.structure.errors.structure import BuilderNotImplemented
 
@@ -132,6 +135,10 @@ class Builder(metaclass=ABCMeta):
         self._global_component_spec: Optional[
             GlobalComponents
         ] = None
+        # Holds the buffered write scope open while building.
+        self._write_scope: ExitStack = ExitStack()
+        # Writes of this structure alone, as the compactor may be shared.
+        self._tally: Optional[WriteTally] = None
 
     @abstractmethod
     def _generate_blueprint(self) -> Blueprint:
@@ -179,16 +186,30 @@ class Builder(metaclass=ABCMeta):
         building and logging.
         """
         logger.info(f'Building structure of type {self.__class__.__name__}')
-        self._global_component_spec = self._evaluate_components(
-            self.global_component_preference()
+        # Component writes are coalesced and flushed on exit.
+        self._write_scope.enter_context(server_conn.buffered())
+        # Components overwrite each other heavily, so only the final
+        # state of each block is sent, meshed into large boxes.
+        compactor = self._write_scope.enter_context(
+            server_conn.compacted(ordered=False)
         )
-        self._blueprint = self._generate_blueprint()
-        env = Environment(
-            biome=self._biome,
-            builder=type(self)
-        )
-        env.clear_block(self._size, ground=self._entrance.y)
-        self._materials = env.get_material_pack()
+        self._tally = self._write_scope.enter_context(compactor.tally())
+        try:
+            self._global_component_spec = self._evaluate_components(
+                self.global_component_preference()
+            )
+            self._blueprint = self._generate_blueprint()
+            env = Environment(
+                biome=self._biome,
+                builder=type(self)
+            )
+            env.clear_block(self._size, ground=self._entrance.y)
+            self._materials = env.get_material_pack()
+        except BaseException:
+            # __exit__ is not called when __enter__ raises, so the shared
+            # connection must not be left buffered or compacting.
+            self._write_scope.close()
+            raise
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> Optional[bool]:
@@ -196,14 +217,18 @@ class Builder(metaclass=ABCMeta):
         Perform clean up, add external decorative
         items and logging.
         """
-        if exc_type is not None:
-            # If error occurs while building, reset the build area.
-            logger.error(f'Error occurred while building: {exc_val}')
-            logger.exception(exc_tb)
-            Environment.clear_block(self._size, ground=self._entrance.y)
-            return False  # Let the exception propagate.
-        self._add_external_obj()
-        logger.info(f'Finished building structure {self}.')
+        with self._write_scope:
+            if exc_type is not None:
+                # If error occurs while building, reset the build area.
+                logger.error(f'Error occurred while building: {exc_val}')
+                logger.exception(exc_tb)
+                Environment.clear_block(self._size, ground=self._entrance.y)
+                return False  # Let the exception propagate.
+            self._add_external_obj()
+        logger.info(
+            f'Finished building structure {self}: {self._tally.issued} writes '
+            f'to {self._tally.resolved} blocks, overdraw {self.overdraw:.2f}.'
+        )
 
     def __repr__(self) -> str:
         return f'<{self.__class__.__name__} at {self._structure_center}>'
@@ -221,6 +246,11 @@ class Builder(metaclass=ABCMeta):
     def blueprint(self) -> Blueprint:
         return self._blueprint
 
+    @property
+    def overdraw(self) -> float:
+        """Blocks written per block of the finished structure."""
+        return 0.0 if self._tally is None else self._tally.overdraw
+
 
 class ResidentialBuilder(Builder, metaclass=ABCMeta):
     @abstractmethod
@@ -426,6 +456,8 @@ class SkyscraperBuilder(ResidentialBuilder):
             self._size,
             entrance=self._entrance,
             center=self._structure_center,
+            # Skyscrapers have too many cells for an object each.
+            dense=True,
         )
         blueprint.run_engine()
         return blueprint
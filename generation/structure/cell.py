@@ -2,25 +2,34 @@ from __future__ import annotations
 from mcpi.vec3 import Vec3
 
 from typing import (
-    TypedDict,
     Optional,
     Final,
+    Iterator,
+    Callable,
+    Deque,
     Set,
     Self,
     NoReturn,
     Tuple,
 )
+from collections import deque
 from enum import (
     StrEnum,
     unique,
     auto,
 )
 
+import numpy as np
+
 __all__ = [
     'CellType',
     'CellDirection',
+    'DIRECTION_INDEX',
+    'CELL_TYPE_CODE',
     'NeighbouringCells',
     'Cell',
+    'CellGrid',
+    'GridCell',
 ]
 
 
@@ -46,20 +55,25 @@ class CellDirection(StrEnum):
     DOWN = 'DOWN'
 
 
-class NeighbouringCells(TypedDict):
-    """Contains references to neighbouring cells."""
-    # X-Axis.
-    NORTH: Optional[Cell]
-    SOUTH: Optional[Cell]
-    # Z-Axis.
-    EAST: Optional[Cell]
-    WEST: Optional[Cell]
-    # Y-Axis.
-    UP: Optional[Cell]
-    DOWN: Optional[Cell]
+# Slot of each direction in a cell's neighbour tuple.
+DIRECTION_INDEX: Final = {
+    direction: index for index, direction in enumerate(CellDirection)
+}
+
+# Code of each cell type in a CellGrid, and the type of each code.
+CELL_TYPE_CODE: Final = {type_: code for code, type_ in enumerate(CellType)}
+CELL_TYPES: Final = tuple(CellType)
+
+# Axis of a [level][row][column] index and step of each direction,
+# ordered as CellDirection.
+DIRECTION_STEP: Final = ((1, 1), (1, -1), (2, 1), (2, -1), (0, 1), (0, -1))
+
+# Neighbours ordered as CellDirection; None where there is no cell.
+NeighbouringCells = Tuple[Optional['Cell'], ...]
 
 
 class Cell:
+    __slots__ = ('pos', '_type', '_neighbours', '_merged')
 
     def __init__(
             self,
@@ -72,46 +86,55 @@ class Cell:
         self.pos: Final = center_pos
         self._type: CellType = cell_type
         self._neighbours: NeighbouringCells = neighbours \
-            if neighbours else dict.fromkeys(NeighbouringCells.__required_keys__)
-        # Cells that coalesce to form a larger cell.
-        self._merged_cells: Set[Cell] = set()
+            if neighbours else (None,) * len(CellDirection)
+        # Directions of neighbours that coalesce with this cell, as a bitmask.
+        self._merged: int = 0
+
+    def neighbour(self, direction: CellDirection) -> Optional[Cell]:
+        return self._neighbours[DIRECTION_INDEX[direction]]
+
+    def neighbour_items(self) -> Iterator[Tuple[CellDirection, Optional[Cell]]]:
+        return zip(CellDirection, self._neighbours)
 
     def add_merged_cell(self, other: Cell) -> NoReturn:
-        assert other not in self._merged_cells, \
-            f'{other!r} is already in connected_cells'
-        assert any([other == neighbour for neighbour in self._neighbours.values()]), \
+        index: Optional[int] = next(
+            (index for index, neighbour in enumerate(self._neighbours)
+             if neighbour is not None and neighbour == other),
+            None
+        )
+        assert index is not None, \
             f'{other!r} is not a neighbour of {self!r}'
-        self._merged_cells.add(other)
+        assert not self._merged & 1 << index, \
+            f'{other!r} is already in connected_cells'
+        self._merged |= 1 << index
 
     def get_merged_directions(self) -> Tuple[CellDirection, ...]:
         return tuple(
-            [CellDirection[direction]
-             for direction, neighbour in self._neighbours.items()
-             if neighbour in self._merged_cells]
+            direction for index, direction in enumerate(CellDirection)
+            if self._merged & 1 << index
         )
 
     def faces_environment(self) -> bool:
         return any(
-            [neighbour is None or neighbour._type == CellType.DETACHED
-                for neighbour in self._neighbours.values()]
+            neighbour is None or neighbour._type == CellType.DETACHED
+            for neighbour in self._neighbours
         )
 
     def faces_environment_direction(self) -> Tuple[CellDirection, ...]:
         return tuple(
-            [CellDirection[direction]
-             for direction, neighbour in self._neighbours.items()
-             if neighbour is None or neighbour._type == CellType.DETACHED]
+            direction for direction, neighbour in self.neighbour_items()
+            if neighbour is None or neighbour._type == CellType.DETACHED
         )
 
     def faces_internal_directions(self) -> Tuple[CellDirection, ...]:
+        external: Tuple[CellDirection, ...] = self.faces_environment_direction()
         return tuple(
-            [CellDirection[internal_direction]
-             for internal_direction in CellDirection
-             if internal_direction not in self.faces_environment_direction()]
+            direction for direction in CellDirection
+            if direction not in external
         )
 
     def __len__(self) -> int:
-        return len(self._merged_cells)
+        return self._merged.bit_count()
 
     def __repr__(self) -> str:
         return f"Cell({str(self.pos)}, type: {self._type}, merged: {len(self)})"
@@ -126,7 +149,10 @@ class Cell:
 
     @property
     def connected_cells(self) -> Set[Cell]:
-        return self._merged_cells
+        return {
+            self._neighbours[DIRECTION_INDEX[direction]]
+            for direction in self.get_merged_directions()
+        }
 
     @property
     def type_(self) -> CellType:
@@ -142,4 +168,198 @@ class Cell:
 
     @neighbours.setter
     def neighbours(self, neighbours: NeighbouringCells) -> NoReturn:
+        assert len(neighbours) == len(CellDirection), \
+            f'Expected one neighbour per direction, got {len(neighbours)}.'
         self._neighbours = neighbours
+
+
+class CellGrid:
+    """
+    Dense storage of the cells of a blueprint, indexed by [level][row][column].
+    - Cell types and merge bitmasks are int8 arrays, so a cell costs two
+      bytes rather than an object with a tuple of neighbours.
+    - Cells are addressed by flat index. Neighbours are found by index
+      arithmetic and never stored.
+    - GridCell views stand in for Cell objects where one is needed.
+    """
+
+    def __init__(self, shape: Tuple[int, int, int], origin: Vec3) -> None:
+        self.shape: Final = shape
+        # World position of the cell at index 0.
+        self.origin: Final = origin
+        self.types: Final = np.full(shape, CELL_TYPE_CODE[CellType.DETACHED], dtype=np.int8)
+        self.merges: Final = np.zeros(shape, dtype=np.int8)
+        # Flat views share memory with the arrays above.
+        self._types: Final = self.types.reshape(-1)
+        self._merges: Final = self.merges.reshape(-1)
+        levels, rows, columns = shape
+        self._strides: Final = (rows * columns, columns, 1)
+
+    def __len__(self) -> int:
+        return self.types.size
+
+    def index(self, level: int, row: int, column: int) -> int:
+        """Flat index of a cell, -1 outside the grid."""
+        if not all(0 <= i < n for i, n in zip((level, row, column), self.shape)):
+            return -1
+        return level * self._strides[0] + row * self._strides[1] + column
+
+    def coordinates(self, index: int) -> Tuple[int, int, int]:
+        level, rest = divmod(index, self._strides[0])
+        return (level, *divmod(rest, self._strides[1]))
+
+    def neighbour(self, index: int, slot: int) -> int:
+        """Flat index of the neighbour in a slot of CellDirection, -1 past the edge."""
+        axis, step = DIRECTION_STEP[slot]
+        if 0 <= self.coordinates(index)[axis] + step < self.shape[axis]:
+            return index + step * self._strides[axis]
+        return -1
+
+    def neighbours(self, index: int) -> Tuple[int, ...]:
+        """Flat indices of the neighbours of a cell ordered as CellDirection."""
+        levels, rows, columns = self.shape
+        level_size, row_size, _ = self._strides
+        level, rest = divmod(index, level_size)
+        row, column = divmod(rest, row_size)
+        return (
+            index + row_size if row + 1 < rows else -1,
+            index - row_size if row > 0 else -1,
+            index + 1 if column + 1 < columns else -1,
+            index - 1 if column > 0 else -1,
+            index + level_size if level + 1 < levels else -1,
+            index - level_size if level > 0 else -1,
+        )
+
+    def cell(self, index: int) -> GridCell:
+        return GridCell(self, index)
+
+    def type_of(self, index: int) -> CellType:
+        return CELL_TYPES[self._types[index]]
+
+    def set_type(self, index: int, type_: CellType) -> NoReturn:
+        self._types[index] = CELL_TYPE_CODE[type_]
+
+    def merged(self, index: int) -> int:
+        return int(self._merges[index])
+
+    def merge(self, index: int, slot: int) -> NoReturn:
+        self._merges[index] |= 1 << slot
+
+    def breadth_traversal(
+            self,
+            start: int,
+            /, *,
+            _predicate: Callable[
+                [str, GridCell], bool
+            ] = lambda k, c: True
+    ) -> Iterator[GridCell]:
+        """
+        Breadth first traversal over flat indices, visiting cells in the
+        same order as Blueprint.breadth_traversal does over Cell objects.
+        """
+        visited: bytearray = bytearray(len(self))
+        queue: Deque[int] = deque([start])
+        while queue:
+            index = queue.popleft()
+            if visited[index]:
+                continue
+            visited[index] = True
+            yield GridCell(self, index)
+            for direction, neighbour in zip(CellDirection, self.neighbours(index)):
+                if neighbour >= 0 and _predicate(direction, GridCell(self, neighbour)):
+                    queue.append(neighbour)
+
+
+class GridCell:
+    """View of one cell of a CellGrid with the interface of Cell."""
+    __slots__ = ('grid', 'index')
+
+    def __init__(self, grid: CellGrid, index: int, /) -> None:
+        self.grid: Final = grid
+        self.index: Final = index
+
+    @property
+    def pos(self) -> Vec3:
+        level, row, column = self.grid.coordinates(self.index)
+        return self.grid.origin + Vec3(row, level, column)
+
+    def neighbour(self, direction: CellDirection) -> Optional[GridCell]:
+        neighbour: int = self.grid.neighbour(self.index, DIRECTION_INDEX[direction])
+        return None if neighbour < 0 else GridCell(self.grid, neighbour)
+
+    def neighbour_items(self) -> Iterator[Tuple[CellDirection, Optional[GridCell]]]:
+        return zip(CellDirection, self.neighbours)
+
+    def add_merged_cell(self, other: GridCell) -> NoReturn:
+        index: Optional[int] = next(
+            (index for index, neighbour in enumerate(self.grid.neighbours(self.index))
+             if neighbour >= 0 and neighbour == other.index),
+            None
+        )
+        assert index is not None, \
+            f'{other!r} is not a neighbour of {self!r}'
+        assert not self.grid.merged(self.index) & 1 << index, \
+            f'{other!r} is already in connected_cells'
+        self.grid.merge(self.index, index)
+
+    def get_merged_directions(self) -> Tuple[CellDirection, ...]:
+        merged: int = self.grid.merged(self.index)
+        return tuple(
+            direction for index, direction in enumerate(CellDirection)
+            if merged & 1 << index
+        )
+
+    def faces_environment(self) -> bool:
+        return bool(self.faces_environment_direction())
+
+    def faces_environment_direction(self) -> Tuple[CellDirection, ...]:
+        detached: Final = CELL_TYPE_CODE[CellType.DETACHED]
+        return tuple(
+            direction
+            for direction, neighbour in zip(CellDirection, self.grid.neighbours(self.index))
+            if neighbour < 0 or self.grid._types[neighbour] == detached
+        )
+
+    def faces_internal_directions(self) -> Tuple[CellDirection, ...]:
+        external: Tuple[CellDirection, ...] = self.faces_environment_direction()
+        return tuple(
+            direction for direction in CellDirection
+            if direction not in external
+        )
+
+    def __len__(self) -> int:
+        return self.grid.merged(self.index).bit_count()
+
+    def __repr__(self) -> str:
+        return f"Cell({str(self.pos)}, type: {self.type_}, merged: {len(self)})"
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, GridCell) and other.grid is self.grid:
+            return other.index == self.index
+        return False if other is None else self.pos == other.pos
+
+    def __hash__(self) -> int:
+        pos: Vec3 = self.pos
+        return hash((pos.x, pos.y, pos.z))
+
+    @property
+    def connected_cells(self) -> Set[GridCell]:
+        return {
+            self.neighbour(direction)
+            for direction in self.get_merged_directions()
+        }
+
+    @property
+    def type_(self) -> CellType:
+        return self.grid.type_of(self.index)
+
+    @type_.setter
+    def type_(self, new_type: CellType) -> NoReturn:
+        self.grid.set_type(self.index, new_type)
+
+    @property
+    def neighbours(self) -> NeighbouringCells:
+        return tuple(
+            None if neighbour < 0 else GridCell(self.grid, neighbour)
+            for neighbour in self.grid.neighbours(self.index)
+        )
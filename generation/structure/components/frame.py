@@ -113,7 +113,7 @@ class DefaultFrame(Frame):
         )
 
     def set_cell_floor(self) -> NoReturn:
-        is_ground_floor: bool = self._cell.neighbours['DOWN'] is None
+        is_ground_floor: bool = self._cell.neighbour(CellDirection.DOWN) is None
         if is_ground_floor:
             self._set_ground_floor()
         else:
@@ -44,8 +44,8 @@ TLDR; House class decides and instructs, room class just execute upon those inst
 
 authors: Raf, Matt
 """
-from mcpi.minecraft import Minecraft
 from mcpi import block
+from generation import connection
 from mcpi.vec3 import Vec3
 import random
 from time import sleep
@@ -58,7 +58,8 @@ from house_config import (
     furniture,
 )
 
-mc = Minecraft.create()
+# Shares the pipelined connection so its writes stay ordered with the rest.
+mc = connection
 sleep_time = 0
 
 
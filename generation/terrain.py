@@ -0,0 +1,62 @@
+from __future__ import annotations
+from typing import (
+    Tuple,
+    Final,
+)
+import pathlib
+import json
+
+import numpy as np
+
+__all__ = [
+    'TERRAIN_NAMES',
+    'BLOCK_TERRAIN',
+    'BLOCK_SURFACE',
+    'classify',
+    'classify_block',
+    'is_surface',
+]
+
+# Block ids are 12-bit, so every id has an entry.
+BLOCK_ID_LIMIT: Final[int] = 4096
+
+with open(pathlib.Path(__file__).parent / 'config' / 'block_terrain_types.json') as file:
+    _block_terrain_types = json.load(file)
+
+# Terrain codes index this tuple; the first name is the default.
+TERRAIN_NAMES: Final[Tuple[str, ...]] = tuple(_block_terrain_types['terrain'])
+
+
+def _build_terrain_table() -> np.ndarray:
+    table: np.ndarray = np.zeros(BLOCK_ID_LIMIT, dtype=np.uint8)
+    # Filled in reverse so the first listed terrain wins an overlap.
+    for code, name in reversed(tuple(enumerate(TERRAIN_NAMES))):
+        table[_block_terrain_types['terrain'][name]] = code
+    table.flags.writeable = False
+    return table
+
+
+def _build_surface_table() -> np.ndarray:
+    table: np.ndarray = np.zeros(BLOCK_ID_LIMIT, dtype=bool)
+    table[_block_terrain_types['surface']] = True
+    table.flags.writeable = False
+    return table
+
+
+# Terrain code of every block id.
+BLOCK_TERRAIN: Final[np.ndarray] = _build_terrain_table()
+# Whether a block id is natural ground that structures may stand on.
+BLOCK_SURFACE: Final[np.ndarray] = _build_surface_table()
+
+
+def classify(block_ids: np.ndarray) -> np.ndarray:
+    """Terrain codes of an array of block ids, in one indexing operation."""
+    return BLOCK_TERRAIN[block_ids]
+
+
+def classify_block(block_id: int) -> int:
+    return int(BLOCK_TERRAIN[block_id])
+
+
+def is_surface(block_id: int) -> bool:
+    return bool(BLOCK_SURFACE[block_id])
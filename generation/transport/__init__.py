@@ -0,0 +1,26 @@
+from generation.transport.buffer import (
+    Cuboid,
+    WriteBuffer,
+)
+from generation.transport.snapshot import WorldSnapshot
+from generation.transport.pipeline import PipelinedTransport
+from generation.transport.pool import ConnectionPool
+from generation.transport.aio import AsyncConnection
+from generation.transport.recording import CommandLog, read_commands, replay
+from generation.transport.diff import DiffUpload
+from generation.transport.compactor import WriteCompactor, WriteTally
+
+__all__ = [
+    'Cuboid',
+    'WriteBuffer',
+    'WorldSnapshot',
+    'PipelinedTransport',
+    'ConnectionPool',
+    'AsyncConnection',
+    'CommandLog',
+    'read_commands',
+    'replay',
+    'DiffUpload',
+    'WriteCompactor',
+    'WriteTally',
+]
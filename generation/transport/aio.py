@@ -0,0 +1,153 @@
+from __future__ import annotations
+from typing import (
+    Deque,
+    Iterator,
+    List,
+    Sequence,
+    Final,
+    Tuple,
+)
+from collections import deque
+import asyncio
+import logging
+
+from mcpi.connection import Connection, RequestError
+from mcpi.util import flatten_parameters_to_bytestring
+from mcpi.vec3 import Vec3
+from generation.transport.buffer import int_floor
+
+__all__ = [
+    'AsyncConnection',
+]
+
+logger = logging.getLogger(__name__)
+
+# Longest reply line the reader accepts. A snapshot chunk of a million
+# blocks takes a few bytes per id.
+MAX_LINE: Final[int] = 1 << 24
+
+
+class AsyncConnection:
+    """
+    asyncio client for the mcpi line protocol.
+    - Writes never receive a reply, so they are queued on the stream and
+      return at once. drain waits for the queue to reach the socket.
+    - Reads are awaitable. The server replies in command order, so every
+      read takes the next slot in a queue of futures and a single reader
+      task settles them as lines arrive. Any number of reads can be in
+      flight on the one socket.
+    """
+
+    def __init__(
+            self,
+            reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter,
+    ) -> None:
+        self._reader: Final = reader
+        self._writer: Final = writer
+        self._replies: Deque[Tuple[asyncio.Future, bytes]] = deque()
+        self._receiver: Final = asyncio.get_running_loop().create_task(
+            self._receive()
+        )
+        self.commands: int = 0
+
+    @classmethod
+    async def open(
+            cls,
+            address: str = 'localhost',
+            port: int = 4711,
+    ) -> AsyncConnection:
+        reader, writer = await asyncio.open_connection(address, port, limit=MAX_LINE)
+        return cls(reader, writer)
+
+    def send(self, command: bytes, *args) -> None:
+        """Queue a command that has no reply."""
+        self._writer.write(
+            b''.join((command, b'(', flatten_parameters_to_bytestring(args), b')\n'))
+        )
+        self.commands += 1
+
+    def request(self, command: bytes, *args) -> asyncio.Future:
+        """Queue a command and return a future of its reply."""
+        if self._receiver.done():
+            raise ConnectionError('The server connection is closed.')
+        reply: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._replies.append((reply, command))
+        self.send(command, *args)
+        return reply
+
+    async def drain(self) -> None:
+        await self._writer.drain()
+
+    async def sync(self) -> None:
+        """
+        Wait until the server has handled every queued command, so that
+        other connections observe them. Costs one round trip.
+        """
+        await self.request(b'world.getHeight', 0, 0)
+
+    async def close(self) -> None:
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._receiver.cancel()
+
+    async def _receive(self) -> None:
+        try:
+            while line := await self._reader.readline():
+                if not self._replies:
+                    logger.warning(f'Dropped unexpected reply: {line.strip()}')
+                    continue
+                reply, command = self._replies.popleft()
+                text = line.decode().rstrip('\n')
+                if text == Connection.RequestFailed:
+                    reply.set_exception(RequestError(f'{command.decode()} failed'))
+                else:
+                    reply.set_result(text)
+        finally:
+            # Fail every outstanding read once the socket is gone.
+            while self._replies:
+                reply, _ = self._replies.popleft()
+                if not reply.done():
+                    reply.set_exception(ConnectionError('The server connection closed.'))
+
+    # mcpi style API. Writes return immediately and reads must be awaited.
+
+    def postToChat(self, msg) -> None:
+        self.send(b'chat.post', msg)
+
+    def setBlock(self, *args) -> None:
+        self.send(b'world.setBlock', int_floor(args))
+
+    def setBlocks(self, *args) -> None:
+        self.send(b'world.setBlocks', int_floor(args))
+
+    async def getBlock(self, *args) -> int:
+        return int(await self.request(b'world.getBlock', int_floor(args)))
+
+    async def getHeight(self, *args) -> int:
+        return int(await self.request(b'world.getHeight', int_floor(args)))
+
+    async def getBlocks(self, *args) -> Iterator[int]:
+        reply = await self.request(b'world.getBlocks', int_floor(args))
+        return map(int, reply.split(','))
+
+    async def getTilePos(self) -> Vec3:
+        reply = await self.request(b'player.getTile')
+        return Vec3(*map(int, reply.split(',')))
+
+    async def probe_heights(self, columns: Sequence[Tuple[float, float]]) -> List[int]:
+        """Heights of many (x, z) columns, in order, all requested at once."""
+        replies = [
+            self.request(b'world.getHeight', int_floor(column)) for column in columns
+        ]
+        return [int(reply) for reply in await asyncio.gather(*replies)]
+
+    async def probe_blocks(
+            self,
+            positions: Sequence[Tuple[float, float, float]],
+    ) -> List[int]:
+        """Block ids at many (x, y, z) positions, in order, all requested at once."""
+        replies = [
+            self.request(b'world.getBlock', int_floor(position)) for position in positions
+        ]
+        return [int(reply) for reply in await asyncio.gather(*replies)]
@@ -0,0 +1,185 @@
+from __future__ import annotations
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    NoReturn,
+    Final,
+    List,
+    Tuple,
+)
+import logging
+import math
+
+from mcpi.util import flatten
+
+__all__ = [
+    'Cuboid',
+    'WriteBuffer',
+    'int_floor',
+]
+
+logger = logging.getLogger(__name__)
+
+BlockState = Tuple[int, int]  # (block id, block data).
+
+
+def int_floor(args: Iterable) -> List[int]:
+    """Flatten mcpi style arguments (Vec3, BlockExt, ints) into ints."""
+    return [int(math.floor(arg)) for arg in flatten(args)]
+
+
+class Cuboid(NamedTuple):
+    """An inclusive, axis-aligned box filled with a single block state."""
+    x1: int
+    y1: int
+    z1: int
+    x2: int
+    y2: int
+    z2: int
+    block: BlockState
+
+    @classmethod
+    def from_set_block(cls, args: List[int]) -> Cuboid:
+        x, y, z, *state = args
+        return cls(x, y, z, x, y, z, _block_state(state))
+
+    @classmethod
+    def from_set_blocks(cls, args: List[int]) -> Cuboid:
+        x1, y1, z1, x2, y2, z2, *state = args
+        return cls(
+            min(x1, x2), min(y1, y2), min(z1, z2),
+            max(x1, x2), max(y1, y2), max(z1, z2),
+            _block_state(state),
+        )
+
+    @property
+    def lower(self) -> Tuple[int, int, int]:
+        return self.x1, self.y1, self.z1
+
+    @property
+    def upper(self) -> Tuple[int, int, int]:
+        return self.x2, self.y2, self.z2
+
+    @property
+    def volume(self) -> int:
+        return (self.x2 - self.x1 + 1) \
+            * (self.y2 - self.y1 + 1) \
+            * (self.z2 - self.z1 + 1)
+
+    def contains(self, other: Cuboid) -> bool:
+        return all(
+            lo <= other_lo and other_hi <= hi
+            for lo, hi, other_lo, other_hi
+            in zip(self.lower, self.upper, other.lower, other.upper)
+        )
+
+    def union(self, other: Cuboid) -> Cuboid | None:
+        """
+        Union of two same-block cuboids, or None if the union
+        is not itself a cuboid.
+        """
+        if self.block != other.block:
+            return None
+        if self.contains(other):
+            return self
+        if other.contains(self):
+            return other
+        # Mergeable when two extents match and the third is contiguous.
+        differing: List[int] = [
+            axis for axis in range(3)
+            if self.lower[axis] != other.lower[axis]
+            or self.upper[axis] != other.upper[axis]
+        ]
+        if len(differing) != 1:
+            return None
+        axis: int = differing[0]
+        if self.upper[axis] + 1 < other.lower[axis] \
+                or other.upper[axis] + 1 < self.lower[axis]:
+            return None
+        lower = [min(a, b) for a, b in zip(self.lower, other.lower)]
+        upper = [max(a, b) for a, b in zip(self.upper, other.upper)]
+        return Cuboid(*lower, *upper, self.block)
+
+    def encode(self) -> bytes:
+        """Encode as an mcpi protocol line."""
+        block_id, block_data = self.block
+        if self.volume == 1:
+            return b'world.setBlock(%d,%d,%d,%d,%d)\n' % (
+                *self.lower, block_id, block_data
+            )
+        return b'world.setBlocks(%d,%d,%d,%d,%d,%d,%d,%d)\n' % (
+            *self.lower, *self.upper, block_id, block_data
+        )
+
+
+def _block_state(state: List[int]) -> BlockState:
+    # The server treats a missing data value as zero.
+    block_id, block_data, *_ = (*state, 0)
+    return block_id, block_data
+
+
+class WriteBuffer:
+    """
+    Queues block writes and coalesces them before they reach the socket.
+    - Adjacent same-block writes are merged into a single cuboid.
+    - Writes that are completely covered by the next write are dropped.
+    - Queued writes are handed to the sink in issue order.
+    """
+
+    def __init__(
+            self,
+            sink: Callable[[List[Cuboid]], NoReturn],
+            /, *,
+            max_pending: int = 4096,
+    ) -> NoReturn:
+        self._sink: Final = sink
+        self._max_pending: Final = max_pending
+        self._pending: List[Cuboid] = list()
+        # Totals used to report the coalescing ratio.
+        self.issued: int = 0
+        self.emitted: int = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __iter__(self) -> Iterator[Cuboid]:
+        yield from self._pending
+
+    def set_block(self, *args) -> NoReturn:
+        self.push(Cuboid.from_set_block(int_floor(args)))
+
+    def set_blocks(self, *args) -> NoReturn:
+        self.push(Cuboid.from_set_blocks(int_floor(args)))
+
+    def push(self, cuboid: Cuboid) -> NoReturn:
+        self.issued += 1
+        pending: List[Cuboid] = self._pending
+        # Earlier writes hidden entirely by this write never need to be sent.
+        while pending and cuboid.contains(pending[-1]):
+            pending.pop()
+        pending.append(cuboid)
+        # Cascade so that merged rows can grow into planes and volumes.
+        while len(pending) > 1:
+            merged = pending[-2].union(pending[-1])
+            if merged is None:
+                break
+            pending[-2:] = [merged]
+        if len(pending) >= self._max_pending:
+            self.flush()
+
+    def flush(self) -> NoReturn:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, list()
+        self.emitted += len(pending)
+        logger.debug(
+            f'Flushing {len(pending)} writes ({self.issued} issued so far).'
+        )
+        self._sink(pending)
+
+    @property
+    def ratio(self) -> float:
+        """Issued writes per emitted command."""
+        return self.issued / self.emitted if self.emitted else 0.0
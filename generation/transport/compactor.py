@@ -0,0 +1,169 @@
+from __future__ import annotations
+from typing import (
+    FrozenSet,
+    Final,
+    Iterator,
+    List,
+    NoReturn,
+    Optional,
+)
+from contextlib import contextmanager
+import logging
+
+import numpy as np
+from generation.transport.buffer import Cuboid, BlockState
+from generation.transport.mesh import CostModel, mesh
+from generation.render.canvas import UNWRITTEN, VoxelCanvas, decode_states, encode_states
+
+__all__ = [
+    'WriteCompactor',
+    'WriteTally',
+]
+
+logger = logging.getLogger(__name__)
+
+# Legacy ids of blocks that break without a neighbour to hold them, and of
+# liquids, which flow until they are enclosed.
+DEPENDENT: Final[FrozenSet[int]] = frozenset({
+    6, 8, 9, 10, 11, 26, 27, 28, 31, 32, 37, 38, 39, 40, 50, 51, 55, 59,
+    63, 64, 65, 66, 68, 69, 70, 71, 72, 75, 76, 77, 78, 81, 83, 92, 93, 94,
+    96, 104, 105, 106, 111, 115, 127, 131, 132, 140, 141, 142, 143, 144,
+    147, 148, 149, 150, 157, 167, 171, 175, 176, 177, 193, 194, 195, 196,
+    197, 198, 207,
+})
+_DEPENDENT_IDS: Final = np.array(sorted(DEPENDENT), dtype=np.uint16)
+
+
+class WriteTally:
+    """
+    Writes pushed to a compactor during part of its scope, such as one
+    structure of a scope that spans many. A voxel counts as resolved once
+    a tallied write touches it.
+    """
+
+    def __init__(self) -> NoReturn:
+        self._footprint: VoxelCanvas = VoxelCanvas()
+        self.written: int = 0
+        self.issued: int = 0
+
+    def add(self, write: Cuboid) -> NoReturn:
+        self._footprint.paint(write.lower, write.upper, 1)
+        self.written += write.volume
+        self.issued += 1
+
+    @property
+    def resolved(self) -> int:
+        return len(self._footprint)
+
+    @property
+    def overdraw(self) -> float:
+        """Voxels written per voxel touched."""
+        return self.written / self.resolved if self.resolved else 0.0
+
+
+class WriteCompactor:
+    """
+    Holds back the writes of a scope and resolves every voxel to the last
+    write that touched it.
+    - Each voxel remembers which write set it last. Voxels that a later
+      write covers are never sent.
+    - The survivors of each write are meshed into cuboids and released in
+      the order the writes were issued, so blocks that attach to others
+      still arrive after their support.
+    - Unordered, voxels are labelled by block state instead, so that the
+      survivors of different writes merge into shared boxes. Boxes go out
+      bottom up, and blocks that hang on others or flow go out last.
+    - Overdraw is the number of voxels written per voxel of the result.
+    """
+
+    def __init__(
+            self,
+            /, *,
+            ordered: bool = True,
+            cost: CostModel = CostModel(),
+    ) -> NoReturn:
+        self.ordered: Final = ordered
+        self._cost: Final = cost
+        # Index of the last write to each voxel plus one, or its block state.
+        self._owners: VoxelCanvas = VoxelCanvas()
+        self._writes: List[Cuboid] = list()
+        # Totals over every release of the scope.
+        self.written: int = 0
+        self.resolved: int = 0
+        self.issued: int = 0
+        self.emitted: int = 0
+        self._tallies: List[WriteTally] = list()
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def push(self, write: Cuboid) -> NoReturn:
+        self._writes.append(write)
+        self._owners.paint(write.lower, write.upper, self._label(write))
+        self.written += write.volume
+        for tally in self._tallies:
+            tally.add(write)
+
+    @contextmanager
+    def tally(self) -> Iterator[WriteTally]:
+        """
+        Count the writes pushed for the duration of the scope, whether or
+        not they are released within it.
+        """
+        tally = WriteTally()
+        self._tallies.append(tally)
+        try:
+            yield tally
+        finally:
+            self._tallies.remove(tally)
+
+    def get(self, x: int, y: int, z: int) -> Optional[BlockState]:
+        """Block state held for a voxel, None if no held write touches it."""
+        owner = self._owners.code(x, y, z)
+        return None if owner == UNWRITTEN else self._block(owner)
+
+    def release(self) -> List[Cuboid]:
+        """Writes that reproduce the held state, after which nothing is held."""
+        masks = {key: owners != UNWRITTEN for key, owners in self._owners.chunks()}
+        if self.ordered:
+            boxes = mesh(self._owners, masks, cost=self._cost)
+            # Stable, so the survivors of a write stay ordered bottom up.
+            boxes.sort(key=lambda box: box[2])
+        else:
+            dependent = {
+                key: np.isin(decode_states(owners)[0], _DEPENDENT_IDS)
+                for key, owners in self._owners.chunks()
+            }
+            boxes = mesh(
+                self._owners,
+                {key: mask & ~dependent[key] for key, mask in masks.items()},
+                cost=self._cost,
+            ) + mesh(
+                self._owners,
+                {key: mask & dependent[key] for key, mask in masks.items()},
+                cost=self._cost,
+            )
+        writes = [
+            Cuboid(*lower, *upper, self._block(owner)) for lower, upper, owner in boxes
+        ]
+        self.resolved += sum(int(np.count_nonzero(mask)) for mask in masks.values())
+        self.issued += len(self._writes)
+        self.emitted += len(writes)
+        self._owners = VoxelCanvas()
+        self._writes = list()
+        return writes
+
+    def _label(self, write: Cuboid) -> int:
+        if self.ordered:
+            return len(self._writes)
+        return int(encode_states(np.array(write.block[0]), np.array(write.block[1])))
+
+    def _block(self, label: int) -> BlockState:
+        if self.ordered:
+            return self._writes[label - 1].block
+        return (label - 1) >> 4, (label - 1) & 0xF
+
+    @property
+    def overdraw(self) -> float:
+        """Voxels written per voxel of the resolved state."""
+        return self.written / self.resolved if self.resolved else 0.0
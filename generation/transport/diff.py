@@ -0,0 +1,181 @@
+from __future__ import annotations
+from typing import (
+    Callable,
+    Dict,
+    List,
+    NoReturn,
+    Optional,
+    Sequence,
+    Final,
+    Tuple,
+)
+from collections import defaultdict
+import logging
+
+import numpy as np
+from generation.transport.buffer import Cuboid
+from generation.transport.mesh import CostModel, mesh
+from generation.render.canvas import CHUNK, UNWRITTEN, VoxelCanvas, decode_states
+
+__all__ = [
+    'DiffUpload',
+    'mesh_changes',
+]
+
+logger = logging.getLogger(__name__)
+
+Position = Tuple[int, int, int]
+Box = Tuple[Position, Position]
+# Block ids of inclusive boxes indexed by [x][y][z].
+Fetch = Callable[[Sequence[Box]], List[np.ndarray]]
+
+AIR: Final[int] = 0
+
+
+class DiffUpload:
+    """
+    Write buffer sink that only sends the voxels a batch actually changes.
+    - The batch is painted into a plan, the last write to a voxel winning.
+    - Planned voxels are compared with the world: voxels uploaded earlier
+      are known exactly, the rest are fetched in one getBlocks per chunk
+      column. Servers only report block ids, so a fetched voxel counts as
+      unchanged only when both sides are air.
+    - Changed voxels are meshed back into cuboids. The batch is sent as
+      issued whenever that is cheaper under the cost model.
+    - Batches smaller than min_volume are sent as issued, as the round
+      trip of the comparison would cost more than it saves. Reads flush
+      the write buffer, so most batches are a single block.
+    The known voxels assume no one else edits the area while it is built.
+    """
+
+    def __init__(
+            self,
+            fetch: Fetch,
+            sink: Callable[[List[Cuboid]], NoReturn],
+            /, *,
+            min_volume: int = 128,
+            cost: CostModel = CostModel(),
+    ) -> NoReturn:
+        self._fetch: Final = fetch
+        self._sink: Final = sink
+        self._min_volume: Final = min_volume
+        self._cost: Final = cost
+        # Every voxel this stage put on the server, with its data value.
+        self.known: Final = VoxelCanvas()
+        # Totals used to report how much was saved.
+        self.planned: int = 0
+        self.changed: int = 0
+        self.issued: int = 0
+        self.emitted: int = 0
+
+    def __call__(self, writes: List[Cuboid]) -> NoReturn:
+        if sum(write.volume for write in writes) < self._min_volume:
+            self._send(writes, writes)
+            return
+        plan = VoxelCanvas()
+        for write in writes:
+            plan.fill(write)
+        current = self._current(plan)
+        changes: Dict[Position, np.ndarray] = dict()
+        for key, codes in plan.chunks():
+            planned = codes != UNWRITTEN
+            changed = planned & ~self._unchanged(key, codes, current.get(key))
+            self.planned += int(np.count_nonzero(planned))
+            if changed.any():
+                changes[key] = changed
+                self.changed += int(np.count_nonzero(changed))
+        meshed = mesh_changes(plan, changes, cost=self._cost)
+        cheaper = self._cost.of((write.lower, write.upper) for write in meshed) \
+            < self._cost.of((write.lower, write.upper) for write in writes)
+        self._send(writes, meshed if cheaper else writes)
+
+    def _send(self, writes: List[Cuboid], outgoing: List[Cuboid]) -> NoReturn:
+        for write in outgoing:
+            self.known.fill(write)
+        self.issued += len(writes)
+        self.emitted += len(outgoing)
+        logger.debug(
+            f'Diff upload sent {len(writes)} writes as {len(outgoing)} commands.'
+        )
+        if outgoing:
+            self._sink(outgoing)
+
+    def sent(self, write: Cuboid) -> NoReturn:
+        """Note a write that reached the server without this stage."""
+        self.known.fill(write)
+
+    @property
+    def ratio(self) -> float:
+        """Share of planned voxels that had to be sent."""
+        return self.changed / self.planned if self.planned else 0.0
+
+    def _unchanged(
+            self,
+            key: Position,
+            codes: np.ndarray,
+            fetched: Optional[np.ndarray],
+    ) -> np.ndarray:
+        block_ids, block_data = decode_states(codes)
+        known = self.known.chunk(key)
+        if known is None:
+            known = np.zeros_like(codes)
+        known_ids, known_data = decode_states(known)
+        is_known = known != UNWRITTEN
+        current = known_ids if fetched is None else np.where(is_known, known_ids, fetched)
+        # Data values are only known for voxels uploaded here. Air has none.
+        return (current == block_ids) & (
+            (block_ids == AIR) | (is_known & (known_data == block_data))
+        )
+
+    def _current(self, plan: VoxelCanvas) -> Dict[Position, np.ndarray]:
+        # Block ids of planned voxels that are not known, per chunk.
+        unknown: Dict[Tuple[int, int], List[Tuple[int, np.ndarray]]] = defaultdict(list)
+        for (cx, cy, cz), codes in plan.chunks():
+            known = self.known.chunk((cx, cy, cz))
+            missing = codes != UNWRITTEN
+            if known is not None:
+                missing &= known == UNWRITTEN
+            if missing.any():
+                unknown[cx, cz].append((cy, missing))
+        if not unknown:
+            return dict()
+        # One box per chunk column, trimmed to the voxels that are missing.
+        boxes: List[Box] = []
+        for (cx, cz), chunks in unknown.items():
+            lower = np.full(3, np.iinfo(np.int32).max)
+            upper = np.full(3, np.iinfo(np.int32).min)
+            for cy, missing in chunks:
+                origin = np.array((cx, cy, cz)) * CHUNK
+                indices = np.nonzero(missing)
+                lower = np.minimum(lower, origin + [axis.min() for axis in indices])
+                upper = np.maximum(upper, origin + [axis.max() for axis in indices])
+            boxes.append((tuple(map(int, lower)), tuple(map(int, upper))))
+        current: Dict[Position, np.ndarray] = dict()
+        for ((cx, cz), chunks), (lower, upper), ids in zip(
+                unknown.items(), boxes, self._fetch(boxes)
+        ):
+            for cy, missing in chunks:
+                block_ids = np.zeros(missing.shape, dtype=np.uint16)
+                origin = np.array((cx, cy, cz)) * CHUNK
+                indices = np.nonzero(missing)
+                block_ids[indices] = ids[tuple(
+                    axis + o - low for axis, o, low in zip(indices, origin, lower)
+                )]
+                current[cx, cy, cz] = block_ids
+        return current
+
+
+def mesh_changes(
+        plan: VoxelCanvas,
+        changes: Dict[Position, np.ndarray],
+        /, *,
+        cost: CostModel = CostModel(),
+) -> List[Cuboid]:
+    """
+    Cuboids that put every changed voxel of a plan in its planned state.
+    Unchanged voxels may be written again where that saves a command.
+    """
+    return [
+        Cuboid(*lower, *upper, ((code - 1) >> 4, (code - 1) & 0xF))
+        for lower, upper, code in mesh(plan, changes, cost=cost)
+    ]
@@ -0,0 +1,118 @@
+from __future__ import annotations
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Tuple,
+    Final,
+)
+from collections import defaultdict
+import logging
+
+import numpy as np
+from generation.render.canvas import CHUNK, VoxelCanvas
+
+__all__ = [
+    'CostModel',
+    'mesh',
+]
+
+logger = logging.getLogger(__name__)
+
+Position = Tuple[int, int, int]
+Box = Tuple[Position, Position, int]
+
+# Chunks per side of the dense tiles meshed at once, bounding memory use.
+TILE_CHUNKS: Final[int] = 8
+
+
+class CostModel(NamedTuple):
+    """
+    Price of sending boxes: a fixed cost per command plus a cost per block
+    the server has to set. The default treats a command as worth 32 blocks.
+    """
+    command: float = 1.0
+    voxel: float = 1 / 32
+
+    def of(self, boxes: Iterable[Tuple[Position, Position]]) -> float:
+        return sum(
+            self.command + self.voxel * _volume(lower, upper) for lower, upper in boxes
+        )
+
+
+def mesh(
+        canvas: VoxelCanvas,
+        masks: Dict[Position, np.ndarray],
+        /, *,
+        cost: CostModel = CostModel(),
+) -> List[Box]:
+    """
+    Inclusive boxes of equal voxel codes covering every selected voxel,
+    given a mask per chunk of the canvas.
+    - Greedy: every box starts at the lowest selected voxel left and grows
+      along x, then z, then y while the next layer holds only its code.
+    - A layer may cover voxels that are not selected, or already covered,
+      when the blocks it writes again cost less than the command it saves.
+    - Tiles of the canvas are meshed separately, so memory stays bounded.
+    Boxes are ordered bottom up, so blocks that fall land on their support.
+    """
+    tiles: Dict[Tuple[int, int], List[Position]] = defaultdict(list)
+    for key, mask in masks.items():
+        if mask.any():
+            tiles[key[0] // TILE_CHUNKS, key[2] // TILE_CHUNKS].append(key)
+    boxes: List[Box] = []
+    for keys in tiles.values():
+        lower = tuple(min(key[axis] for key in keys) * CHUNK for axis in range(3))
+        upper = tuple((max(key[axis] for key in keys) + 1) * CHUNK - 1 for axis in range(3))
+        # Dense volumes indexed by [y][z][x], so scans run x first.
+        codes = canvas.region(lower, upper).transpose(1, 2, 0)
+        todo = np.zeros(codes.shape, dtype=bool)
+        for key in keys:
+            x, y, z = (k * CHUNK - low for k, low in zip(key, lower))
+            todo[y:y + CHUNK, z:z + CHUNK, x:x + CHUNK] = \
+                masks[key].transpose(1, 2, 0)
+        boxes.extend(
+            (
+                (lower[0] + x1, lower[1] + y1, lower[2] + z1),
+                (lower[0] + x2, lower[1] + y2, lower[2] + z2),
+                code,
+            )
+            for (y1, z1, x1), (y2, z2, x2), code in _greedy(codes, todo, cost)
+        )
+    boxes.sort(key=lambda box: (box[0][1], box[0][2], box[0][0]))
+    return boxes
+
+
+def _greedy(
+        codes: np.ndarray,
+        todo: np.ndarray,
+        cost: CostModel,
+) -> List[Tuple[Position, Position, int]]:
+    boxes: List[Tuple[Position, Position, int]] = []
+    # A layer may rewrite this many blocks to save one command.
+    slack: float = cost.command / cost.voxel if cost.voxel > 0 else float('inf')
+    for seed in np.argwhere(todo).tolist():
+        if not todo[tuple(seed)]:
+            continue
+        code = codes[tuple(seed)]
+        low, high = list(seed), list(seed)
+        for axis in (2, 1, 0):
+            while high[axis] + 1 < codes.shape[axis]:
+                layer = tuple(
+                    high[axis] + 1 if a == axis else slice(low[a], high[a] + 1)
+                    for a in range(3)
+                )
+                if not (codes[layer] == code).all():
+                    break
+                fresh = int(np.count_nonzero(todo[layer]))
+                if fresh == 0 or codes[layer].size - fresh > slack:
+                    break
+                high[axis] += 1
+        todo[tuple(slice(lo, hi + 1) for lo, hi in zip(low, high))] = False
+        boxes.append((tuple(low), tuple(high), int(code)))
+    return boxes
+
+
+def _volume(lower: Position, upper: Position) -> int:
+    return (upper[0] - lower[0] + 1) * (upper[1] - lower[1] + 1) * (upper[2] - lower[2] + 1)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+from typing import (
+    List,
+    NoReturn,
+    Sequence,
+    Final,
+    Tuple,
+)
+import logging
+import select
+import socket
+
+from mcpi.connection import Connection, RequestError
+
+__all__ = [
+    'PipelinedTransport',
+]
+
+logger = logging.getLogger(__name__)
+
+
+class PipelinedTransport(Connection):
+    """
+    mcpi connection that streams commands without waiting on the socket.
+    - Commands are queued in a local frame instead of draining the socket
+      before each one. The frame goes out in one sendall once it fills,
+      before a read, or on flush.
+    - Writes never receive a reply, so reads are the only point that has
+      to synchronise. The server handles commands in order, so a read sees
+      every write queued before it.
+    """
+
+    def __init__(
+            self,
+            address: str,
+            port: int,
+            /, *,
+            frame_size: int = 1 << 16,
+    ) -> NoReturn:
+        super().__init__(address, port)
+        # Frames are batched here already, so the kernel should not hold them back.
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.frame_size: Final = frame_size
+        self._frame: bytearray = bytearray()
+        # Bytes received but not yet returned as replies. Replies are only
+        # read through this buffer, so drain sees whatever it holds.
+        self._replies: bytearray = bytearray()
+        self.commands: int = 0
+        self.frames: int = 0
+        # Commands sent since the last reply.
+        self.unanswered: int = 0
+
+    def write(self, command: bytes) -> NoReturn:
+        """Queue one encoded command, newline included, without reading a reply."""
+        self.lastSent = command
+        self._frame += command
+        self.commands += 1
+        self.unanswered += 1
+        if len(self._frame) >= self.frame_size:
+            self.flush()
+
+    def _send(self, s: bytes) -> NoReturn:
+        # Every command of the mcpi API is queued like a write.
+        self.write(s)
+
+    def flush(self) -> NoReturn:
+        """Write every queued command to the socket."""
+        if not self._frame:
+            return
+        self.socket.sendall(self._frame)
+        self._frame.clear()
+        self.frames += 1
+
+    def receive(self) -> str:
+        # The search resumes where the last chunk left off, so long
+        # replies such as getBlocks are scanned once.
+        start = 0
+        while (end := self._replies.find(b'\n', start)) < 0:
+            start = len(self._replies)
+            if not (chunk := self.socket.recv(1 << 16)):
+                raise ConnectionError('Server closed the connection.')
+            self._replies += chunk
+        s = self._replies[:end].decode()
+        del self._replies[:end + 1]
+        if s == Connection.RequestFailed:
+            raise RequestError(f'{self.lastSent.strip()} failed')
+        self.unanswered = 0
+        return s
+
+    def drain(self) -> NoReturn:
+        """Discard replies nobody waits for, received or still on the socket."""
+        while select.select([self.socket], [], [], 0.0)[0]:
+            if not (chunk := self.socket.recv(1 << 16)):
+                break
+            self._replies += chunk
+        if self._replies:
+            logger.warning(
+                f'Drained data: <{bytes(self._replies).strip()}>, '
+                f'last message: <{self.lastSent.strip()}>'
+            )
+            self._replies.clear()
+
+    def sendReceive(self, *data) -> str:
+        # Replies to stray earlier commands are dropped before asking.
+        self.drain()
+        # The request rides in the same frame as any queued writes.
+        self.send(*data)
+        self.flush()
+        return self.receive()
+
+    def request_all(
+            self,
+            command: bytes,
+            arguments: Sequence[Tuple[int, ...]],
+    ) -> List[str]:
+        """
+        Replies to one command per set of arguments. Every request leaves
+        in one frame before the first reply is read, so the batch costs a
+        single round trip.
+        """
+        self.drain()
+        for args in arguments:
+            self.send(command, *args)
+        self.flush()
+        return [self.receive() for _ in arguments]
+
+    def sync(self) -> NoReturn:
+        """
+        Wait until the server has handled every queued command, so that
+        other connections observe them. Costs one round trip, and nothing
+        when the last command was a read.
+        """
+        if self.unanswered:
+            self.sendReceive(b'world.getHeight', 0, 0)
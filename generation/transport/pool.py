@@ -0,0 +1,92 @@
+from __future__ import annotations
+from typing import (
+    List,
+    NoReturn,
+    Sequence,
+    Final,
+    Tuple,
+)
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import logging
+
+from generation.transport.pipeline import PipelinedTransport
+
+__all__ = [
+    'ConnectionPool',
+]
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """
+    Fixed set of mcpi connections that answer read probes in parallel.
+    - Every worker thread opens its own transport on first use, so a
+      socket is never shared between threads.
+    - A batch is cut into one contiguous slice per worker and the replies
+      are reassembled in the order of the batch.
+    - The pool only reads. Writes stay on the main connection, which has
+      to be synchronised before a batch is handed over.
+    """
+
+    def __init__(
+            self,
+            address: str,
+            port: int,
+            /, *,
+            size: int = 4,
+    ) -> NoReturn:
+        if size <= 0:
+            raise ValueError('A connection pool needs at least one connection.')
+        self.address: Final = address
+        self.port: Final = port
+        self.size: Final = size
+        self._executor: Final = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix='mcpi-probe'
+        )
+        self._local: Final = threading.local()
+        self._transports: List[PipelinedTransport] = []
+        self._lock: Final = threading.Lock()
+        self.requests: int = 0
+
+    def heights(self, columns: Sequence[Tuple[int, int]]) -> List[int]:
+        """world.getHeight of every (x, z) column, in order."""
+        return self._map(b'world.getHeight', columns)
+
+    def blocks(self, positions: Sequence[Tuple[int, int, int]]) -> List[int]:
+        """world.getBlock of every (x, y, z) position, in order."""
+        return self._map(b'world.getBlock', positions)
+
+    def close(self) -> NoReturn:
+        self._executor.shutdown()
+        with self._lock:
+            for transport in self._transports:
+                transport.socket.close()
+            self._transports.clear()
+
+    def _map(self, command: bytes, arguments: Sequence[Tuple[int, ...]]) -> List[int]:
+        if not arguments:
+            return []
+        self.requests += len(arguments)
+        # Ceiling division, so no slice is left without a worker.
+        step: int = -(-len(arguments) // self.size)
+        slices = [arguments[i:i + step] for i in range(0, len(arguments), step)]
+        results: List[int] = []
+        for replies in self._executor.map(self._probe, [command] * len(slices), slices):
+            results.extend(replies)
+        return results
+
+    def _probe(self, command: bytes, arguments: Sequence[Tuple[int, ...]]) -> List[int]:
+        transport = self._transport()
+        return [int(transport.sendReceive(command, *args)) for args in arguments]
+
+    def _transport(self) -> PipelinedTransport:
+        transport = getattr(self._local, 'transport', None)
+        if transport is None:
+            transport = PipelinedTransport(self.address, self.port)
+            self._local.transport = transport
+            with self._lock:
+                self._transports.append(transport)
+            logger.debug(f'Opened probe connection {len(self._transports)}/{self.size}.')
+        return transport
@@ -0,0 +1,132 @@
+from __future__ import annotations
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Iterator,
+    Final,
+)
+import argparse
+import logging
+import os
+import struct
+import time
+
+import numpy as np
+from generation.transport.buffer import Cuboid
+
+if TYPE_CHECKING:
+    from generation import ServerConnection
+
+__all__ = [
+    'CommandLog',
+    'read_commands',
+    'cuboids',
+    'replay',
+]
+
+logger = logging.getLogger(__name__)
+
+MAGIC: Final[bytes] = b'MCPILOG\x01'
+# x1, y1, z1, x2, y2, z2, block id, block data. Heights fit in 16 bits.
+RECORD: Final = struct.Struct('<ihiihiHB')
+RECORD_DTYPE: Final = np.dtype([
+    ('x1', '<i4'), ('y1', '<i2'), ('z1', '<i4'),
+    ('x2', '<i4'), ('y2', '<i2'), ('z2', '<i4'),
+    ('id', '<u2'), ('data', 'u1'),
+])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+class CommandLog:
+    """
+    Append-only binary log of block writes.
+    - An 8 byte header is followed by fixed size records of the write
+      corners, block id and block data, 23 bytes each.
+    - Fixed size records let a reader map the whole file as one array.
+    """
+
+    def __init__(self, path: str | os.PathLike, /) -> None:
+        self.path: Final = path
+        self._file: BinaryIO = open(path, 'wb')
+        self._file.write(MAGIC)
+        self.records: int = 0
+
+    def append(self, write: Cuboid) -> None:
+        self._file.write(RECORD.pack(*write.lower, *write.upper, *write.block))
+        self.records += 1
+
+    def flush(self) -> None:
+        if not self._file.closed:
+            self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+            logger.info(f'Recorded {self.records} writes to {self.path}.')
+
+    def __enter__(self) -> CommandLog:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_commands(path: str | os.PathLike, /, *, mmap: bool = False) -> np.ndarray:
+    """Records of a command log, mapped from disk rather than read if asked."""
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a command log.')
+        if not mmap:
+            return np.frombuffer(file.read(), dtype=RECORD_DTYPE)
+    if os.path.getsize(path) == len(MAGIC):
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=len(MAGIC))
+
+
+def cuboids(records: np.ndarray) -> Iterator[Cuboid]:
+    for x1, y1, z1, x2, y2, z2, block_id, block_data in records.tolist():
+        yield Cuboid(x1, y1, z1, x2, y2, z2, (block_id, block_data))
+
+
+def replay(
+        path: str | os.PathLike,
+        connection: ServerConnection,
+        /, *,
+        mmap: bool = False,
+        chunk: int = 1 << 16,
+) -> int:
+    """
+    Push a command log to a server in issue order, returning the number of
+    writes. Writes are coalesced in one buffer and leave in large frames.
+    """
+    records = read_commands(path, mmap=mmap)
+    with connection.buffered(max_pending=chunk) as buffer:
+        # Chunks keep a mapped log from being read in all at once.
+        for start in range(0, len(records), chunk):
+            for write in cuboids(records[start:start + chunk]):
+                buffer.push(write)
+    connection.flush()
+    return len(records)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replay a command log to a server.')
+    parser.add_argument('log')
+    parser.add_argument('--address', default='localhost')
+    parser.add_argument('--port', type=int, default=4711)
+    parser.add_argument('--mmap', action='store_true', help='map the log instead of reading it')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    # Imported here so that no connection opens before the target is known.
+    from generation import ProxiedConnection
+    connection = ProxiedConnection.create(args.address, args.port, pool_size=0)
+    start_time = time.perf_counter()
+    writes = replay(args.log, connection, mmap=args.mmap)
+    # Wait for the server to apply everything before stopping the clock.
+    connection.sync()
+    elapsed = time.perf_counter() - start_time
+    logger.info(f'Replayed {writes} writes in {elapsed:.2f} s.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+from __future__ import annotations
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    Iterator,
+    NoReturn,
+    Optional,
+    Final,
+    Tuple,
+)
+import asyncio
+import logging
+
+import numpy as np
+from mcpi.vec3 import Vec3
+from generation.transport.buffer import int_floor
+
+if TYPE_CHECKING:
+    from generation import ServerConnection
+    from generation.transport.aio import AsyncConnection
+    from generation.transport.buffer import Cuboid
+
+__all__ = [
+    'WorldSnapshot',
+]
+
+logger = logging.getLogger(__name__)
+
+AIR: Final[int] = 0
+
+
+class WorldSnapshot:
+    """
+    In-memory copy of a box of the world.
+    - Fetched with a few chunked getBlocks calls into a uint16 volume.
+    - Heights are derived locally from the volume.
+    - Writes are applied to the copy so that it never goes stale.
+    Queries outside the box, or whose answer cannot be known from the
+    box alone, return None so the caller can fall back to the server.
+    """
+
+    def __init__(
+            self,
+            lower: Vec3,
+            upper: Vec3,
+            /, *,
+            max_chunk_volume: int = 1 << 20,
+    ) -> NoReturn:
+        # Grid positions may be floats; the box is snapped to whole blocks.
+        lower, upper = Vec3(*int_floor(lower)), Vec3(*int_floor(upper))
+        self.lower: Final = Vec3(
+            min(lower.x, upper.x), min(lower.y, upper.y), min(lower.z, upper.z)
+        )
+        self.upper: Final = Vec3(
+            max(lower.x, upper.x), max(lower.y, upper.y), max(lower.z, upper.z)
+        )
+        self._max_chunk_volume: Final = max_chunk_volume
+        # Block ids indexed by [x][y][z] relative to the lower corner.
+        self.blocks: np.ndarray = np.zeros(self.shape, dtype=np.uint16)
+        # Index of the highest non-air block per column, -1 if none.
+        self._tops: np.ndarray = np.full(
+            (self.shape[0], self.shape[2]), -1, dtype=np.int32
+        )
+        self.requests: int = 0
+
+    @classmethod
+    def around(
+            cls,
+            center: Vec3,
+            /, *,
+            radius: int,
+            depth: int = 32,
+            rise: int = 32,
+            **kwargs,
+    ) -> WorldSnapshot:
+        """Box centred horizontally on a position."""
+        return cls(
+            Vec3(center.x - radius, center.y - depth, center.z - radius),
+            Vec3(center.x + radius, center.y + rise, center.z + radius),
+            **kwargs,
+        )
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return (
+            int(self.upper.x - self.lower.x + 1),
+            int(self.upper.y - self.lower.y + 1),
+            int(self.upper.z - self.lower.z + 1),
+        )
+
+    def __contains__(self, pos: Tuple[int, int, int]) -> bool:
+        x, y, z = pos
+        return self.lower.x <= x <= self.upper.x \
+            and self.lower.y <= y <= self.upper.y \
+            and self.lower.z <= z <= self.upper.z
+
+    def fetch(self, source: ServerConnection) -> WorldSnapshot:
+        """Fill the volume from the server in chunked getBlocks calls."""
+        for (x1, x2), (z1, z2) in self._chunks():
+            self._store(
+                (x1, x2), (z1, z2),
+                source.getBlocks(x1, self.lower.y, z1, x2, self.upper.y, z2),
+            )
+        return self._fetched()
+
+    async def fetch_async(self, source: AsyncConnection) -> WorldSnapshot:
+        """Fill the volume over an asyncio connection, every chunk requested at once."""
+        chunks = list(self._chunks())
+        replies = await asyncio.gather(*(
+            source.getBlocks(x1, self.lower.y, z1, x2, self.upper.y, z2)
+            for (x1, x2), (z1, z2) in chunks
+        ))
+        for ((x1, x2), (z1, z2)), reply in zip(chunks, replies):
+            self._store((x1, x2), (z1, z2), reply)
+        return self._fetched()
+
+    def _store(
+            self,
+            xs: Tuple[int, int],
+            zs: Tuple[int, int],
+            reply: Iterable[int],
+    ) -> NoReturn:
+        (x1, x2), (z1, z2) = xs, zs
+        ox, oz = x1 - self.lower.x, z1 - self.lower.z
+        nx, nz = x2 - x1 + 1, z2 - z1 + 1
+        ny: int = self.shape[1]
+        # The server returns blocks ordered by y, then x, then z.
+        ids = np.fromiter(reply, dtype=np.uint16, count=nx * ny * nz)
+        self.blocks[ox:ox + nx, :, oz:oz + nz] = \
+            ids.reshape(ny, nx, nz).transpose(1, 0, 2)
+        self.requests += 1
+
+    def _fetched(self) -> WorldSnapshot:
+        self._derive_tops()
+        logger.debug(
+            f'Snapshot of {self.shape} fetched in {self.requests} requests.'
+        )
+        return self
+
+    def _chunks(self) -> Iterator[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        nx, ny, nz = self.shape
+        columns: int = max(1, self._max_chunk_volume // ny)
+        # Prefer whole z rows and split along x, then z if still too large.
+        z_step: int = min(nz, columns)
+        x_step: int = max(1, columns // z_step)
+        for x in range(self.lower.x, self.upper.x + 1, x_step):
+            for z in range(self.lower.z, self.upper.z + 1, z_step):
+                yield (x, min(x + x_step - 1, self.upper.x)), \
+                    (z, min(z + z_step - 1, self.upper.z))
+
+    def _derive_tops(self, xs: slice = slice(None), zs: slice = slice(None)) -> NoReturn:
+        solid: np.ndarray = self.blocks[xs, :, zs] != AIR
+        ny: int = solid.shape[1]
+        tops = ny - 1 - np.argmax(solid[:, ::-1, :], axis=1)
+        self._tops[xs, zs] = np.where(solid.any(axis=1), tops, -1)
+
+    @property
+    def heights(self) -> np.ndarray:
+        """World height of every column, indexed by [x][z]. -1 marks unknown."""
+        known: np.ndarray = (self._tops >= 0) & (self._tops < self.shape[1] - 1)
+        return np.where(known, self._tops + self.lower.y, -1)
+
+    def get_block(self, x: int, y: int, z: int) -> Optional[int]:
+        if (x, y, z) not in self:
+            return None
+        return int(self.blocks[
+            x - self.lower.x, y - self.lower.y, z - self.lower.z
+        ])
+
+    def get_height(self, x: int, z: int) -> Optional[int]:
+        if (x, self.lower.y, z) not in self:
+            return None
+        top = int(self._tops[x - self.lower.x, z - self.lower.z])
+        # An empty or a full column may extend beyond the box.
+        if top < 0 or top == self.shape[1] - 1:
+            return None
+        return top + self.lower.y
+
+    def apply(self, write: Cuboid) -> NoReturn:
+        """Mirror a write into the volume."""
+        lower = [max(a, b) for a, b in zip(write.lower, self.lower)]
+        upper = [min(a, b) for a, b in zip(write.upper, self.upper)]
+        if any(lo > hi for lo, hi in zip(lower, upper)):
+            return
+        xs, ys, zs = (
+            slice(lo - origin, hi - origin + 1)
+            for lo, hi, origin in zip(lower, upper, self.lower)
+        )
+        self.blocks[xs, ys, zs] = write.block[0]
+        self._derive_tops(xs, zs)
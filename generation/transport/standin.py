@@ -0,0 +1,374 @@
+from __future__ import annotations
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Final,
+)
+import argparse
+import functools
+import logging
+import math
+import queue
+import socketserver
+import threading
+import time
+
+import numpy as np
+
+__all__ = [
+    'SyntheticWorld',
+    'StandInServer',
+]
+
+logger = logging.getLogger(__name__)
+
+AIR: Final[int] = 0
+STONE: Final[int] = 1
+GRASS: Final[int] = 2
+DIRT: Final[int] = 3
+BEDROCK: Final[int] = 7
+WATER: Final[int] = 9
+SAND: Final[int] = 12
+LOG: Final[int] = 17
+LEAVES: Final[int] = 18
+
+Shape = Tuple[int, int, int]
+
+
+class SyntheticWorld:
+    """
+    Seeded voxel world held in a NumPy array.
+    - Blocks are indexed by [x][y][z]. x and z are centred on the origin
+      and y is absolute, as in a game world.
+    - Terrain is a sum of randomly oriented sine waves with beaches and
+      water under sea level and scattered trees on grass.
+    - The same seed and shape always give the same world.
+    """
+
+    def __init__(
+            self,
+            seed: int = 0,
+            /, *,
+            shape: Shape = (256, 128, 256),
+            sea_level: int = 62,
+            tree_density: float = 0.01,
+    ) -> None:
+        self.seed: Final = seed
+        self.shape: Final = shape
+        self.sea_level: Final = sea_level
+        self.tree_density: Final = tree_density
+        # World x and z of index 0.
+        self.origin: Final = (-(shape[0] // 2), -(shape[2] // 2))
+        rng = np.random.default_rng(seed)
+        heights = self._heights(rng)
+        self.blocks: np.ndarray = self._fill(heights)
+        self._plant_trees(rng, heights, tree_density)
+        self.lock: Final = threading.Lock()
+
+    def __reduce__(self):
+        # Rebuilt from its seed, so blocks set since are not carried over.
+        return functools.partial(
+            SyntheticWorld,
+            self.seed,
+            shape=self.shape,
+            sea_level=self.sea_level,
+            tree_density=self.tree_density,
+        ), ()
+
+    def _heights(self, rng: np.random.Generator) -> np.ndarray:
+        size_x, size_y, size_z = self.shape
+        x = np.arange(size_x)[:, None]
+        z = np.arange(size_z)[None, :]
+        heights = np.full((size_x, size_z), self.sea_level + 3.0)
+        for wavelength, amplitude in ((128, 6.0), (64, 3.0), (32, 1.5), (16, 0.75)):
+            for _ in range(2):
+                angle, phase = rng.uniform(0, 2 * math.pi, size=2)
+                heights += amplitude * np.sin(
+                    (x * math.cos(angle) + z * math.sin(angle)) * 2 * math.pi / wavelength
+                    + phase
+                )
+        # Leave headroom for trees and structures.
+        return np.clip(np.rint(heights), 1, size_y - 24).astype(np.int32)
+
+    def _fill(self, heights: np.ndarray) -> np.ndarray:
+        y = np.arange(self.shape[1])[None, :, None]
+        top = heights[:, None, :]
+        blocks = np.select(
+            [y == 0, y <= top - 4, y < top, y == top],
+            [BEDROCK, STONE, DIRT, GRASS],
+            AIR,
+        ).astype(np.uint16)
+        beach = (top <= self.sea_level + 1) & (y > top - 4) & (y <= top) & (y > 0)
+        blocks[beach] = SAND
+        blocks[(y > top) & (y <= self.sea_level)] = WATER
+        return blocks
+
+    def _plant_trees(
+            self,
+            rng: np.random.Generator,
+            heights: np.ndarray,
+            density: float,
+    ) -> None:
+        size_x, _, size_z = self.shape
+        grass = self.blocks[np.arange(size_x)[:, None], heights, np.arange(size_z)] == GRASS
+        # Keep crowns inside the world.
+        grass[:2], grass[-2:], grass[:, :2], grass[:, -2:] = False, False, False, False
+        for i, k in zip(*np.nonzero(grass & (rng.random(grass.shape) < density))):
+            y = heights[i, k]
+            crown = self.blocks[i - 2:i + 3, y + 4:y + 6, k - 2:k + 3]
+            crown[crown == AIR] = LEAVES
+            self.blocks[i, y + 1:y + 6, k] = LOG
+            self.blocks[i, y + 6, k] = LEAVES
+
+    def index(self, x: int, y: int, z: int) -> Optional[Tuple[int, int, int]]:
+        i, k = x - self.origin[0], z - self.origin[1]
+        if 0 <= i < self.shape[0] and 0 <= y < self.shape[1] and 0 <= k < self.shape[2]:
+            return i, y, k
+        return None
+
+    def _clip(
+            self,
+            x1: int, y1: int, z1: int,
+            x2: int, y2: int, z2: int,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Array corner of an inclusive box, and the part of it inside the world.
+        corner = np.array([
+            min(x1, x2) - self.origin[0], min(y1, y2), min(z1, z2) - self.origin[1],
+        ])
+        far = np.array([
+            max(x1, x2) - self.origin[0], max(y1, y2), max(z1, z2) - self.origin[1],
+        ]) + 1
+        return corner, np.maximum(corner, 0), np.minimum(far, self.shape)
+
+    def get_block(self, x: int, y: int, z: int) -> int:
+        index = self.index(x, y, z)
+        return AIR if index is None else int(self.blocks[index])
+
+    def get_blocks(
+            self,
+            x1: int, y1: int, z1: int,
+            x2: int, y2: int, z2: int,
+    ) -> List[int]:
+        """Blocks of an inclusive box ordered by y, then x, then z. Air outside the world."""
+        corner, low, high = self._clip(x1, y1, z1, x2, y2, z2)
+        box = np.zeros(
+            (abs(x2 - x1) + 1, abs(y2 - y1) + 1, abs(z2 - z1) + 1), dtype=np.uint16
+        )
+        if (high > low).all():
+            box[tuple(map(slice, low - corner, high - corner))] = \
+                self.blocks[tuple(map(slice, low, high))]
+        return box.transpose(1, 0, 2).ravel().tolist()
+
+    def get_height(self, x: int, z: int) -> int:
+        """y of the highest non-air block in a column, 0 if there is none."""
+        index = self.index(x, 0, z)
+        if index is None:
+            return 0
+        solid = np.flatnonzero(self.blocks[index[0], :, index[2]])
+        return int(solid[-1]) if solid.size else 0
+
+    def set_blocks(
+            self,
+            x1: int, y1: int, z1: int,
+            x2: int, y2: int, z2: int,
+            block_id: int,
+    ) -> None:
+        _, low, high = self._clip(x1, y1, z1, x2, y2, z2)
+        if (high > low).all():
+            self.blocks[tuple(map(slice, low, high))] = block_id
+
+
+class StandInServer:
+    """
+    Local TCP server that speaks the mcpi protocol over a SyntheticWorld.
+    - Handles world.getBlock, getBlockWithData, getBlocks, getHeight,
+      setBlock and setBlocks, player.getTile, getPos, setTile and setPos,
+      and chat.post. Anything else replies Fail.
+    - Replies arrive latency seconds after their command, as over a
+      network. Commands behind a reply are not held up, so pipelined and
+      parallel clients overlap their latency as against a remote server.
+    - Every write takes write_latency seconds of server time.
+    """
+
+    def __init__(
+            self,
+            world: SyntheticWorld,
+            /, *,
+            address: str = '127.0.0.1',
+            port: int = 0,
+            latency: float = 0.0,
+            write_latency: float = 0.0,
+    ) -> None:
+        self.world: Final = world
+        self.latency: Final = latency
+        self.write_latency: Final = write_latency
+        surface = world.get_height(0, 0)
+        # Standing on the surface at the origin.
+        self.player: List[int] = [0, surface + 1, 0]
+        self.commands: int = 0
+        self.chat: List[str] = []
+        self._server: Final = _TCPServer((address, port), _Handler)
+        self._server.standin = self
+        self._thread: Optional[threading.Thread] = None
+        self._commands: Final[Dict[str, Callable[[List[str]], Optional[str]]]] = {
+            'world.getBlock': self._get_block,
+            'world.getBlockWithData': self._get_block_with_data,
+            'world.getBlocks': self._get_blocks,
+            'world.getHeight': self._get_height,
+            'world.setBlock': self._set_block,
+            'world.setBlocks': self._set_blocks,
+            'player.getTile': self._get_tile,
+            'player.getPos': self._get_tile,
+            'player.setTile': self._set_tile,
+            'player.setPos': self._set_tile,
+            'chat.post': self._post,
+        }
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def start(self) -> StandInServer:
+        """Serve from a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='mcpi-standin', daemon=True
+        )
+        self._thread.start()
+        logger.info(f'Stand-in server listening on {self.address}.')
+        return self
+
+    def serve_forever(self) -> None:
+        logger.info(f'Stand-in server listening on {self.address}.')
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> StandInServer:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def handle(self, line: str) -> Optional[str]:
+        """Run one command line, returning its reply or None for writes."""
+        name, _, args = line.partition('(')
+        args = args.rstrip(')')
+        command = self._commands.get(name)
+        try:
+            if command is None:
+                raise ValueError(f'Unknown command {name}.')
+            with self.world.lock:
+                self.commands += 1
+                reply = command(args.split(',') if args else [])
+        except (ValueError, TypeError, IndexError) as error:
+            logger.warning(f'Failed {line!r}: {error}')
+            reply = 'Fail'
+        if reply is None:
+            time.sleep(self.write_latency)
+        return reply
+
+    def _get_block(self, args: List[str]) -> str:
+        return str(self.world.get_block(*_ints(args, 3)))
+
+    def _get_block_with_data(self, args: List[str]) -> str:
+        return f'{self.world.get_block(*_ints(args, 3))},0'
+
+    def _get_blocks(self, args: List[str]) -> str:
+        return ','.join(map(str, self.world.get_blocks(*_ints(args, 6))))
+
+    def _get_height(self, args: List[str]) -> str:
+        return str(self.world.get_height(*_ints(args, 2)))
+
+    def _set_block(self, args: List[str]) -> None:
+        x, y, z, block_id = _ints(args, 4)
+        self.world.set_blocks(x, y, z, x, y, z, block_id)
+
+    def _set_blocks(self, args: List[str]) -> None:
+        self.world.set_blocks(*_ints(args, 7))
+
+    def _get_tile(self, args: List[str]) -> str:
+        return ','.join(map(str, self.player))
+
+    def _set_tile(self, args: List[str]) -> None:
+        self.player = [int(math.floor(float(arg))) for arg in args[:3]]
+
+    def _post(self, args: List[str]) -> None:
+        self.chat.append(','.join(args))
+
+
+def _ints(args: List[str], count: int) -> List[int]:
+    # Leading arguments as whole blocks; trailing block data is ignored.
+    if len(args) < count:
+        raise ValueError(f'Expected {count} arguments, got {len(args)}.')
+    return [int(math.floor(float(arg))) for arg in args[:count]]
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    standin: StandInServer
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: _TCPServer
+    # Replies are single short lines that must not wait on an ACK.
+    disable_nagle_algorithm = True
+
+    def handle(self) -> None:
+        standin = self.server.standin
+        # Replies wait out their latency on a second thread, in order.
+        replies: queue.SimpleQueue = queue.SimpleQueue()
+        sender = threading.Thread(target=self._send, args=(replies,), daemon=True)
+        sender.start()
+        try:
+            for raw in self.rfile:
+                line = raw.decode('cp437').strip()
+                if not line:
+                    continue
+                reply = standin.handle(line)
+                if reply is not None:
+                    replies.put((time.monotonic() + standin.latency, reply))
+        finally:
+            replies.put(None)
+            sender.join()
+
+    def _send(self, replies: queue.SimpleQueue) -> None:
+        while (item := replies.get()) is not None:
+            due, reply = item
+            if (delay := due - time.monotonic()) > 0:
+                time.sleep(delay)
+            try:
+                self.wfile.write(f'{reply}\n'.encode('cp437'))
+            except OSError:
+                return
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Stand-in mcpi server.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4711)
+    parser.add_argument(
+        '--latency', type=float, default=0.0, help='seconds every reply takes to arrive'
+    )
+    parser.add_argument(
+        '--write-latency', type=float, default=0.0, help='seconds spent on every write'
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    StandInServer(
+        SyntheticWorld(args.seed),
+        address=args.address,
+        port=args.port,
+        latency=args.latency,
+        write_latency=args.write_latency,
+    ).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
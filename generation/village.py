@@ -1,12 +1,19 @@
 from biome import Biome
 from grid import Grid, Tile
-from mcpi.minecraft import Minecraft
+from generation.eligibility import PlotAllocator
+from generation.planning import HouseJob, plan_houses
+from generation.transport.snapshot import WorldSnapshot
 from mcpi.vec3 import Vec3
+from generation import connection as server_connection
+from collections import deque
+from itertools import islice
 import mcpi.block as block
+import asyncio
 import random
+import enum
 from generation.structure.legacy.__legacy_house import House
 
-mc = Minecraft.create()
+mc = server_connection
 post = mc.postToChat
 player_tile_position = mc.player.getTilePos
 get_blocks = mc.getBlocks
@@ -16,21 +23,54 @@ set_block = mc.setBlock
 get_height = mc.getHeight
 
 
+class RoadPlanner(enum.Enum):
+    INCREMENTAL = "Incremental"
+    STEINER = "Steiner"
+
+
 class Village:
     """
     - Manages generation and layout of town plan.
     - Determines optimal placement of a random number of house blocks.
-    - Determines and stores road tiles according to shortest path algorithm.
+    - Determines and stores road tiles according to shortest path algorithm,
+    either one house at a time or as a single Steiner tree over all houses.
     - Randomly generates landmark and minor structures to accompany houses.
+    - With more than one worker, houses are planned in a process pool and
+      sent by a single uploader thread. Zero workers uses every core.
 
     """
 
-    def __init__(self, max_houses, max_grid_size):
-        self.grid = Grid(max_grid_size)
+    def __init__(
+        self, max_houses, max_grid_size, road_planner=RoadPlanner.STEINER, workers=1
+    ):
+        self._setup(Grid(max_grid_size), max_houses, road_planner, workers)
+        self.town_planner()
+        self.build_tc()
+
+    @classmethod
+    async def create_async(
+        cls, max_houses, max_grid_size, connection, road_planner=RoadPlanner.STEINER
+    ):
+        """
+        Builds a village with terrain sampled and houses sent over an asyncio
+        connection. Roads, decorations and the town centre still go through
+        the blocking connection.
+        """
+        village = cls.__new__(cls)
+        village._setup(
+            await Grid.create_async(max_grid_size, connection), max_houses, road_planner
+        )
+        await village.town_planner_async(connection)
+        village.build_tc()
+        return village
+
+    def _setup(self, grid, max_houses, road_planner, workers=1):
+        self.grid = grid
         self.max_houses = max_houses
+        self.workers = workers
+        self.road_planner = road_planner
         self.available = None
         self.houses = list()
-        self.town_planner()
 
         self.sand_tcs = [
             self._tc_pyramid,
@@ -54,8 +94,6 @@ class Village:
             self._tc_end_portal,
         ]
 
-        self.build_tc()
-
     def __iter__(self):
         for house_tile in self.houses:
             yield house_tile
@@ -74,8 +112,7 @@ class Village:
         """
         Primary method of village class.
         - Determines and allocates 3x3 tile house blocks, biasing land over water.
-        - Determines roads to each house individually, altering grid edge weights to
-        ensure each subsequent road follows previous roads when necessary.
+        - Determines roads to the houses with the configured road planner.
         - Determines global biome and passes to house class.
         - Instantiates house objects.
         - Calls method to build roads.
@@ -83,58 +120,180 @@ class Village:
         around roads and town centers.
 
         """
+        houses_to_build, global_biome, roads, allocated, available_ground = (
+            self._plan_town()
+        )
+        self.build_houses(houses_to_build, global_biome)
+        self._lay_out_town(roads, allocated, available_ground)
+
+    async def town_planner_async(self, connection):
+        houses_to_build, global_biome, roads, allocated, available_ground = (
+            self._plan_town()
+        )
+        await self.build_houses_async(houses_to_build, global_biome, connection)
+        # Roads are laid through the blocking connection, after every house.
+        await connection.sync()
+        self._lay_out_town(roads, allocated, available_ground)
+
+    def _plan_town(self):
+        # Plots, roads and biome of the town, before anything is built.
         post("Planning town.")
         plots = set()
-        roads = set()
-        allocated = set()
-        available = set(filter(self.grid.is_3x3, self.grid.adjacency_list))
+        # Candidate plot centres are bitmaps over the grid array.
+        eligibility = self.grid.eligibility
+        allocator = PlotAllocator(eligibility, exclusion=7)
+        grid_array = eligibility.grid
+        center = self.grid.center.coordinate
+        available = eligibility.eligible.copy()
 
         # Remove the center tiles from available.
-        roads = roads.union(self.grid.get_square(self.grid.center, size=3))
-        available = available.difference(roads)
+        roads = self.grid.get_square(self.grid.center, size=3)
         roads.remove(self.grid.center)
-        available = available.difference(
-            (self.grid.get_square(self.grid.center, size=5))
-        )
-        available_water = {tile for tile in available if tile.terrain == Biome.WATER}
-        available_ground = available.difference(available_water)
+        allocator.exclude(available, center, 5)
+        water = grid_array.terrain_mask(Biome.WATER)
+        available_water = available & water
+        available_ground = available & ~water
         min_houses = 10  # Arbitrary limit.
         max_houses = self.max_houses
         water_houses = 0
         land_houses = 0
         for i in range(max_houses):
-            if len(available_ground) > 0:
-                plot = random.choice(tuple(available_ground))
-                available_ground = available_ground.difference(
-                    self.grid.get_square(plot, size=7)
-                )
-                available_water = available_water.difference(
-                    self.grid.get_square(plot, size=7)
-                )
-                allocated = allocated.union(self.grid.get_square(plot, size=3))
-                plots.add(plot)
+            if (plot := allocator.choose(available_ground)) is not None:
+                allocator.allocate(plot, available_ground, available_water)
+                plots.add(self.grid.find_tile(coordinate=plot))
                 land_houses += 1
             else:
                 if land_houses + water_houses < min_houses:
-                    if len(available_water) > 0:
-                        plot = random.choice(tuple(available_water))
-                        available_water = available_water.difference(
-                            self.grid.get_square(plot, size=7)
-                        )
-                        allocated = allocated.union(self.grid.get_square(plot, size=3))
-                        plots.add(plot)
+                    if (plot := allocator.choose(available_water)) is not None:
+                        allocator.allocate(plot, available_water)
+                        plots.add(self.grid.find_tile(coordinate=plot))
                         water_houses += 1
                     else:
                         break
         post(f"building {land_houses} on ground, {water_houses} on water")
+        allocated = self._tiles(eligibility.occupied)
+        available_ground = self._tiles(available_ground)
 
         possible_roads = set(self.grid.adjacency_list.keys()).difference(allocated)
+        if self.road_planner == RoadPlanner.STEINER:
+            paths, houses_to_build = self._plan_roads_steiner(
+                list(plots), possible_roads, roads
+            )
+        else:
+            paths, houses_to_build = self._plan_roads_incremental(
+                list(plots), possible_roads
+            )
+        roads = roads.union(paths)
+
+        global_biome = self.get_global_biome()
+        # Temporary alteration until house class complete.
+        if global_biome == Biome.GRASSY:
+            if random.randint(1, 3) == 3:
+                global_biome = 3
+            else:
+                global_biome = 0
+        elif global_biome == Biome.DESSERT:
+            global_biome = 1
+        return houses_to_build, global_biome, roads, allocated, available_ground
+
+    def build_houses(self, houses_to_build, global_biome):
+        post("Building Houses...")
+        if self.workers != 1:
+            jobs = [
+                HouseJob(*self._house_site(house, global_biome), random.getrandbits(32))
+                for house in houses_to_build
+            ]
+            plan_houses(
+                mc,
+                House,
+                jobs,
+                workers=self.workers or None,
+                progress=lambda built, total: post(f"{float(built / total) * 100 :.2f}%"),
+            )
+            return
+        for built_count, house in enumerate(houses_to_build, 1):
+            self._build_house(house, global_biome)
+            post(f"{float(built_count / len(houses_to_build)) * 100 :.2f}%")
+
+    async def build_houses_async(self, houses_to_build, global_biome, connection, ahead=4):
+        """
+        Builds houses in order over an asyncio connection.
+        - The region around each house is fetched while the houses before it
+          are built, up to `ahead` houses in advance, so houses must not read
+          each other's blocks.
+        - Each house is built against its region and compacted, then its
+          writes are sent over the connection.
+        - Reads outside the region fall back to the blocking connection, and
+          height reads there send the writes held so far through it.
+        """
+        post("Building Houses...")
+        # Reads over this connection must see what the blocking one has sent.
+        mc.sync()
+        sites = [self._house_site(house, global_biome) for house in houses_to_build]
+        pending = iter(sites)
+        fetches = deque()
+        try:
+            for built_count, (center_vec, door_vec, biome) in enumerate(sites, 1):
+                for center, _, _ in islice(pending, ahead - len(fetches)):
+                    region = WorldSnapshot.around(center, radius=16, depth=8, rise=96)
+                    fetches.append(asyncio.ensure_future(region.fetch_async(connection)))
+                snapshot = await fetches.popleft()
+                with mc.reading(snapshot), mc.compacted(ordered=False) as compactor:
+                    House(center_vec, door_vec, biome=biome)
+                    writes = compactor.release()
+                for write in writes:
+                    connection.setBlocks(*write.lower, *write.upper, *write.block)
+                await connection.drain()
+                post(f"{float(built_count / len(sites)) * 100 :.2f}%")
+        finally:
+            for fetch in fetches:
+                fetch.cancel()
+
+    def _build_house(self, house, global_biome):
+        center_vec, door_vec, biome = self._house_site(house, global_biome)
+        # Only the final state of each block is sent, as in plan_houses.
+        with mc.compacted(ordered=False):
+            House(center_vec, door_vec, biome=biome)
+
+    def _house_site(self, house, global_biome):
+        center_vec = Vec3(house[0].position.x, house[1].position.y, house[0].position.z)
+        door_vec = self.get_door_vec(center_vec, house[1])
+        if house[0].terrain == Biome.WATER:
+            return center_vec, door_vec, 2
+        return center_vec, door_vec, global_biome
+
+    def _lay_out_town(self, roads, allocated, available_ground):
+        self.available = available_ground.difference(roads)
+        available_for_misc = set()
+        for tile in roads:
+            for neighbor in self.grid.adjacency_list[tile]:
+                available_for_misc.add(neighbor)
+        available_for_misc = (available_for_misc.difference(roads)).difference(
+            allocated
+        )
+        # Coalesce road and decoration writes into large frames.
+        with mc.buffered():
+            self._place_roads(roads)
+            self.place_misc(available_for_misc)
+            self.place_lights(roads)
+
+    def _tiles(self, mask):
+        # Tiles at the set cells of a bitmap over the grid array.
+        offset_i, offset_j = self.grid.eligibility.grid.offset
+        return {
+            self.grid.find_tile(coordinate=(int(i) + offset_i, int(j) + offset_j))
+            for i, j in zip(*mask.nonzero())
+        }.difference({None})
+
+    def _plan_roads_incremental(self, plots, possible_roads):
+        """
+        Determines roads to each house individually, lowering the edge weights
+        along each road so subsequent roads follow it when possible.
+        """
+        roads = set()
         houses_to_build = set()
 
-        plots = list(plots)
-        for index in range(max_houses):
-            # post(f'Running Dijkstra {index + 1}')
-            self.grid.dijkstra(possible_roads)
+        for index in range(self.max_houses):
             if index > len(plots) - 1:
                 break
             for plot in plots[index::200]:
@@ -142,10 +301,12 @@ class Village:
                 if not self.grid.is_3x3(plot):
                     continue
                 door_options = list(self._get_candidate_doors(plot))
+                # Search only until every candidate door is settled.
+                paths = self.grid.dijkstra(possible_roads, targets=door_options)
                 best_option = None
                 chosen_door = None
                 for option in door_options:
-                    option_path = self.grid.shortest_path(option)
+                    option_path = self.grid.shortest_path(option, paths=paths)
                     if option_path is False:
                         continue
                     if best_option is None or len(option_path) < len(best_option):
@@ -156,56 +317,48 @@ class Village:
                     post("Found unreachable house.")
                     plots.remove(plot)
                     continue
-                # Adjust relevant edge weights.
-                for tile in best_option:
-                    for adjacent in self.grid.adjacency_list:
-                        if adjacent in best_option:
-                            self.grid.edge_weights[(tile, adjacent)] = 1
-                            self.grid.edge_weights[(adjacent, tile)] = 1
+                # Adjust relevant edge weights. The cached search is repaired
+                # in place rather than rerun for the next house.
+                on_path = set(best_option)
+                self.grid.lower_edge_weights(
+                    [
+                        (tile, adjacent)
+                        for tile in best_option
+                        for adjacent in self.grid.adjacency_list[tile]
+                        if adjacent in on_path
+                    ],
+                    1,
+                )
                 roads = roads.union(best_option)
                 houses_to_build.add((plot, chosen_door))
                 self.houses.append(plot)
+        return roads, houses_to_build
 
-        global_biome = self.get_global_biome()
-        # Temporary alteration until house class complete.
-        if global_biome == Biome.GRASSY:
-            if random.randint(1, 3) == 3:
-                global_biome = 3
-            else:
-                global_biome = 0
-        elif global_biome == Biome.DESSERT:
-            global_biome = 1
-
-        # Instantiate House Objects
-        built_count = 0
-        post("Building Houses...")
-
-        for house in houses_to_build:
-            center_vec = Vec3(
-                house[0].position.x, house[1].position.y, house[0].position.z
-            )
-            door_vec = self.get_door_vec(center_vec, house[1])
-            if house[0].terrain == Biome.WATER:
-                House(center_vec, door_vec, biome=2)
-            else:
-                House(center_vec, door_vec, biome=global_biome)
-            built_count += 1
-
-            post(f"{float(built_count / len(houses_to_build)) * 100 :.2f}%")
-
-        self.available = available_ground.difference(roads)
-        self._place_roads(roads)
-
-        available_for_misc = set()
-        for tile in roads:
-            for neighbor in self.grid.adjacency_list[tile]:
-                available_for_misc.add(neighbor)
-        available_for_misc = (available_for_misc.difference(roads)).difference(
-            allocated
+    def _plan_roads_steiner(self, plots, possible_roads, existing_roads):
+        """
+        Determines roads to every house at once as an approximate minimum
+        Steiner tree grown from the existing roads, joining the nearest
+        candidate door of any unconnected house first.
+        """
+        groups = {
+            plot: self._get_candidate_doors(plot)
+            for plot in plots
+            if self.grid.is_3x3(plot)
+        }
+        tree = self.grid.steiner_tree(
+            available=possible_roads,
+            sources={self.grid.center, *existing_roads},
         )
-        self.place_misc(available_for_misc)
-
-        self.place_lights(roads)
+        doors = tree.connect(groups)
+        houses_to_build = set()
+        for plot in groups:
+            if plot not in doors:
+                # Don't add if unreachable.
+                post("Found unreachable house.")
+                continue
+            houses_to_build.add((plot, doors[plot]))
+            self.houses.append(plot)
+        return tree.nodes, houses_to_build
 
     def place_lights(self, roads):
 
@@ -382,36 +535,40 @@ class Village:
             return Vec3(c.x, c.y, c.z - 4)
 
     def _place_roads(self, roads):
-        for road in roads:
-            neighbors = []
-            second_block = None
-            if road.terrain == Biome.WATER:
-                block_type = block.WOOD_PLANKS.id
-                second_block = block.WOOD.id
-                random_type = None
-            elif road.terrain == Biome.DESSERT:
-                block_type = block.COBBLESTONE.id
-                random_type = [block.SAND.id]
-
-            else:
-                block_type = block.COBBLESTONE.id
-                random_type = [
-                    block.GRASS.id,
-                    block.MOSS_STONE.id,
-                    block.MOSS_STONE.id,
-                    block.COBBLESTONE.id,
-                ]
-
-            for adjacent in self.grid.adjacency_list[road]:
-                if adjacent in roads:
-                    neighbors.append(adjacent)
-
-            self._place_road_square(road.position, block_type, random_type)
+        # Road tiles overlap and clear the same air, so the network is
+        # resolved as one volume and sent as a few large boxes. Boxes go
+        # out bottom up, which is all the order road blocks need.
+        with mc.compacted(ordered=False):
+            for road in roads:
+                neighbors = []
+                second_block = None
+                if road.terrain == Biome.WATER:
+                    block_type = block.WOOD_PLANKS.id
+                    second_block = block.WOOD.id
+                    random_type = None
+                elif road.terrain == Biome.DESSERT:
+                    block_type = block.COBBLESTONE.id
+                    random_type = [block.SAND.id]
 
-            for join in neighbors:
-                self._place_road_connector(
-                    road.position, join.position, block_type, second_block
-                )
+                else:
+                    block_type = block.COBBLESTONE.id
+                    random_type = [
+                        block.GRASS.id,
+                        block.MOSS_STONE.id,
+                        block.MOSS_STONE.id,
+                        block.COBBLESTONE.id,
+                    ]
+
+                for adjacent in self.grid.adjacency_list[road]:
+                    if adjacent in roads:
+                        neighbors.append(adjacent)
+
+                self._place_road_square(road.position, block_type, random_type)
+
+                for join in neighbors:
+                    self._place_road_connector(
+                        road.position, join.position, block_type, second_block
+                    )
 
     @staticmethod
     def _place_road_square(a, block_type, random_type):
@@ -578,7 +735,8 @@ class Village:
             post("Invalid town center tile.")
             return
 
-        tc_function()
+        with mc.buffered():
+            tc_function()
 
     def _tc_pyramid(self):
         c = self.grid.center.position
@@ -773,23 +931,33 @@ class Village:
             ]
         )
         c = self.grid.center.position
-        selections = random.choices(blocks, weights=(40, 20, 30, 5, 5), k=121)
-        index = 0
-        for i in range(-5, 6):
-            for j in range(-5, 6):
-                set_block(
-                    c.x + i, get_height(c.x + 1, c.z + j), c.z + j, selections[index]
-                )
-                index += 1
-        # Change weights for denser inner area.
-        selections = random.choices(blocks, weights=(15, 5, 50, 5, 25), k=49)
-        index = 0
-        for i in range(-3, 4):
-            for j in range(-3, 4):
-                set_block(
-                    c.x + i, get_height(c.x + 1, c.z + j), c.z + j, selections[index]
-                )
-                index += 1
+        # Surface heights are read locally instead of once per block.
+        lower = Vec3(c.x - 5, c.y - 16, c.z - 5)
+        upper = Vec3(c.x + 5, c.y + 16, c.z + 5)
+        with mc.snapshot(lower, upper):
+            selections = random.choices(blocks, weights=(40, 20, 30, 5, 5), k=121)
+            index = 0
+            for i in range(-5, 6):
+                for j in range(-5, 6):
+                    set_block(
+                        c.x + i,
+                        get_height(c.x + 1, c.z + j),
+                        c.z + j,
+                        selections[index],
+                    )
+                    index += 1
+            # Change weights for denser inner area.
+            selections = random.choices(blocks, weights=(15, 5, 50, 5, 25), k=49)
+            index = 0
+            for i in range(-3, 4):
+                for j in range(-3, 4):
+                    set_block(
+                        c.x + i,
+                        get_height(c.x + 1, c.z + j),
+                        c.z + j,
+                        selections[index],
+                    )
+                    index += 1
         set_blocks(c.x - 2, c.y + 1, c.z, c.x + 2, c.y + 10, c.z, block.OBSIDIAN.id)
         set_blocks(c.x + 1, c.y + 2, c.z, c.x - 1, c.y + 9, c.z, 90)  # Nether Portal
 
@@ -1,6 +1,13 @@
 from village_grid_unit import VillageGridUnit
 from village_grid_foundation import VillageGridFoundation
+from generation.pathfinding import ShortestPaths, AStar
 import typing
+import enum
+
+
+class PathAlgorithm(enum.Enum):
+    DIJKSTRA = "Dijkstra"
+    A_STAR = "A*"
 
 
 class VillageEntity:
@@ -8,7 +15,8 @@ class VillageEntity:
         self,
         *,
         grid_foundation: VillageGridFoundation = None,
-        house_upper_bound: int = 200
+        house_upper_bound: int = 200,
+        path_algorithm: PathAlgorithm = PathAlgorithm.A_STAR
     ) -> None:
         # Create grid with default values if no object provided.
         self.__grid_foundation: VillageGridFoundation = (
@@ -16,6 +24,9 @@ class VillageEntity:
         )
         self.__curr_house_units: list[VillageGridUnit] = list()
         self.house_upper_bound: int = abs(house_upper_bound)
+        self.path_algorithm: PathAlgorithm = path_algorithm
+        # Units expanded by the most recent path search, used for benchmarking.
+        self.expanded_units: int = 0
 
     def __iter__(self) -> typing.Iterable[VillageGridUnit]:
         for curr_house_unit in self.__curr_house_units:
@@ -24,11 +35,57 @@ class VillageEntity:
     def allocate_house_blocks(self) -> None:
         raise NotImplementedError()
 
-    def __create_paths_dijkstra(self) -> None:
-        raise NotImplementedError
+    def create_paths(
+        self, destinations: typing.Iterable[VillageGridUnit] = None
+    ) -> dict[VillageGridUnit, typing.Optional[list[VillageGridUnit]]]:
+        # Paths lead from each destination back to the centre; None if unreachable.
+        destinations = list(
+            destinations if destinations is not None else self.__curr_house_units
+        )
+        if self.path_algorithm == PathAlgorithm.A_STAR:
+            return self.__create_paths_a_star(destinations)
+        return self.__create_paths_dijkstra(destinations)
 
-    def __create_paths_a_star(self) -> None:
-        raise NotImplementedError()
+    def __create_paths_dijkstra(
+        self, destinations: list[VillageGridUnit]
+    ) -> dict[VillageGridUnit, typing.Optional[list[VillageGridUnit]]]:
+        foundation = self.__grid_foundation
+        # A single search serves every destination and stops once all are settled.
+        search = ShortestPaths(
+            foundation.adjacency_list.__getitem__,
+            foundation.edge_weights,
+            foundation.centre_unit,
+        ).settle(destinations)
+        self.expanded_units = search.expanded
+        return {destination: search.path(destination) for destination in destinations}
+
+    def __create_paths_a_star(
+        self, destinations: list[VillageGridUnit]
+    ) -> dict[VillageGridUnit, typing.Optional[list[VillageGridUnit]]]:
+        foundation = self.__grid_foundation
+        search = AStar(
+            foundation.adjacency_list.__getitem__,
+            foundation.edge_weights,
+            foundation.centre_unit,
+            heuristic=self.__label_distance_heuristic(),
+        )
+        paths = {destination: search.search(destination) for destination in destinations}
+        self.expanded_units = search.expanded
+        return paths
+
+    def __label_distance_heuristic(
+        self,
+    ) -> typing.Callable[[VillageGridUnit, VillageGridUnit], int]:
+        # Each step changes the label distance by one and costs at least the
+        # cheapest edge, so the scaled distance never overestimates.
+        minimum_weight: int = min(self.__grid_foundation.edge_weights.values(), default=0)
+
+        def label_distance(unit: VillageGridUnit, target: VillageGridUnit) -> int:
+            unit_x, unit_y = unit.coordinate_label
+            target_x, target_y = target.coordinate_label
+            return minimum_weight * (abs(unit_x - target_x) + abs(unit_y - target_y))
+
+        return label_distance
 
 
 def _village_entity_test() -> None:
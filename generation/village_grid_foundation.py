@@ -1,8 +1,13 @@
 from generation import connection as server_connection
 from collections import deque
-from village_grid_unit import VillageGridUnit, TerrainType
+from village_grid_unit import VillageGridUnit, TerrainType, TERRAIN_TYPES
+from generation.terrain import classify_block
 from mcpi.vec3 import Vec3
+from generation.grid_array import GridArray, NO_EDGE
+import numpy as np
+import operator
 import typing
+import math
 
 # TODO: Figure out if caching aids performance.
 # import functools
@@ -18,27 +23,28 @@ class VillageGridFoundation:  # TODO: Test function to display edges between con
         prohibited_terrain: set[TerrainType] = None,
         water_road_penalty: int = 7,
     ) -> None:
+        # Maps reflecting an undirected graph structure that underpins the village layout.
+        self._adjacency_list: dict[VillageGridUnit, list[VillageGridUnit]] = dict()
+        self._edge_weights: dict[tuple[VillageGridUnit, VillageGridUnit], int] = dict()
+        self._label_index: dict[tuple[int, int], VillageGridUnit] = dict()
         self.starting_position: Vec3 = (
             server_connection.player.getTilePos()
         )  # Use current player position as the central grid unit.
         self.unit_upper_bound: int = unit_upper_bound
         self.unit_side_length: int = unit_side_length
         self.height_variance_tolerance: int = abs(height_variance_tolerance)
-        # Maps reflecting an undirected graph structure that underpins the village layout.
-        self._adjacency_list: dict[VillageGridUnit, list[VillageGridUnit]] = dict()
-        self._edge_weights: dict[tuple[VillageGridUnit, VillageGridUnit], int] = dict()
         self.__water_road_penalty = water_road_penalty
         self.__prohibited_terrain = (
             prohibited_terrain
             if prohibited_terrain is not None
             else {TerrainType.LAVA, TerrainType.TREE}
         )
-        # Functions used repeatedly to create adjacent units.
-        self.__adjacent_unit_functions: list[typing.Callable] = [
-            VillageGridUnit.create_unit_north,
-            VillageGridUnit.create_unit_east,
-            VillageGridUnit.create_unit_south,
-            VillageGridUnit.create_unit_west,
+        # Label offsets of adjacent units: north, east, south and west.
+        self.__label_direction_offsets: list[tuple[int, int]] = [
+            (-1, 0),
+            (0, 1),
+            (1, 0),
+            (0, -1),
         ]
 
     def __iter__(self) -> typing.Iterator[VillageGridUnit]:
@@ -56,6 +62,18 @@ class VillageGridFoundation:  # TODO: Test function to display edges between con
     def unit_side_length(self) -> int:
         return self.__unit_side_length
 
+    @property
+    def adjacency_list(self) -> dict[VillageGridUnit, list[VillageGridUnit]]:
+        return self._adjacency_list
+
+    @property
+    def edge_weights(self) -> dict[tuple[VillageGridUnit, VillageGridUnit], int]:
+        return self._edge_weights
+
+    @property
+    def centre_unit(self) -> typing.Optional[VillageGridUnit]:
+        return self.find_grid_unit(coordinate_label=(0, 0))
+
     @property
     def unit_separation(self) -> int:
         # Total blocks traversed when travelling between centres of adjacent units.
@@ -88,12 +106,15 @@ class VillageGridFoundation:  # TODO: Test function to display edges between con
         ):
             # Add the new tile with an empty adjacency list.
             self._adjacency_list[new_grid_unit] = list()
+            self._label_index[new_grid_unit.coordinate_label] = new_grid_unit
 
     def find_grid_unit(
         self, *, coordinate_label: tuple[int, int] = None, vector_position: Vec3 = None
     ) -> typing.Optional[VillageGridUnit]:
         if coordinate_label is None and vector_position is None:
             return None
+        if coordinate_label is not None:
+            return self._label_index.get(coordinate_label)
         checking_coord_label: bool = coordinate_label is not None
         # Return the grid unit object that corresponds with the search arg; label used by default.
         search_value = coordinate_label if checking_coord_label else vector_position
@@ -112,7 +133,7 @@ class VillageGridFoundation:  # TODO: Test function to display edges between con
             unit_one,
             unit_two,
         )  # Use both pairs for an undirected edge.
-        unit_pair_two: tuple[VillageGridUnit] = reversed(unit_pair_one)
+        unit_pair_two: tuple[VillageGridUnit] = (unit_two, unit_one)
         # Return and don't create the edge if it's pre-existing or invalid.
         if unit_pair_one in self._edge_weights or unit_pair_two in self._edge_weights:
             return False
@@ -129,18 +150,28 @@ class VillageGridFoundation:  # TODO: Test function to display edges between con
         self,
         unit_one: VillageGridUnit,
         unit_two: VillageGridUnit,
+    ) -> typing.Optional[int]:
+        return self.__terrain_edge_weight(
+            unit_one._terrain_type,
+            unit_one.vector_position.y,
+            unit_two._terrain_type,
+            unit_two.vector_position.y,
+        )
+
+    def __terrain_edge_weight(
+        self,
+        terrain_one: TerrainType,
+        height_one: int,
+        terrain_two: TerrainType,
+        height_two: int,
     ) -> typing.Optional[int]:
         # Return null if the edge is not allowed due to terrain or height variation.
-        terrain_one: TerrainType = unit_one._terrain_type
-        terrain_two: TerrainType = unit_two._terrain_type
         if (
             terrain_one in self.__prohibited_terrain
             or terrain_two in self.__prohibited_terrain
         ):
             return None
-        elevation_difference: int = abs(
-            unit_one.vector_position.y - unit_two.vector_position.y
-        )
+        elevation_difference: int = abs(height_one - height_two)
         if elevation_difference > self.height_variance_tolerance:
             return None
         # Add one to the difference so edge weights are always positive.
@@ -151,31 +182,71 @@ class VillageGridFoundation:  # TODO: Test function to display edges between con
             else edge_weight
         )
 
+    def to_array(self) -> GridArray:
+        # Dense copy of the graph, a few bytes per unit instead of an object.
+        return GridArray.from_graph(
+            self._adjacency_list,
+            self._edge_weights,
+            label=operator.attrgetter("coordinate_label"),
+            position=operator.attrgetter("vector_position"),
+            terrain=operator.attrgetter("_terrain_type"),
+            terrain_types=tuple(TerrainType),
+            stride=self.unit_separation,
+        )
+
+    def snapshot_region(
+        self, *, depth: int = 32, rise: int = 32
+    ) -> tuple[Vec3, Vec3]:
+        # Box reached when the grid grows to its upper bound as a square.
+        half_width: int = math.isqrt(self.unit_upper_bound) // 2 + 1
+        radius: int = self.unit_separation * half_width
+        centre: Vec3 = self.starting_position
+        return (
+            Vec3(centre.x - radius, centre.y - depth, centre.z - radius),
+            Vec3(centre.x + radius, centre.y + rise, centre.z + radius),
+        )
+
     def build_village_grid(self, *, auto_connect: bool = True) -> set[VillageGridUnit]:
+        # Answer every terrain probe from one bulk fetch of the region.
+        with server_connection.snapshot(*self.snapshot_region()):
+            return self.__build_village_grid(auto_connect=auto_connect)
+
+    def __build_village_grid(self, *, auto_connect: bool) -> set[VillageGridUnit]:
         visited_units: set[VillageGridUnit] = set()
         include_units: set[VillageGridUnit] = set()
         # The frontier tracks all units to be visited from starting position.
         frontier: deque[VillageGridUnit] = deque()
-        frontier.append(VillageGridUnit(self.starting_position, (0, 0)))
-        # Visit each unit using breadth-first search.
+        starting_unit = VillageGridUnit(self.starting_position, (0, 0))
+        self.add_grid_unit(starting_unit)
+        frontier.append(starting_unit)
+        # Visit each unit using breadth-first search, one frontier layer at a time.
         # Connect adjacent units if they exist and create new units where they don't.
         while frontier and len(include_units) < self.unit_upper_bound:
-            current_unit: VillageGridUnit = frontier.popleft()
-            if current_unit not in visited_units:
+            layer: list[VillageGridUnit] = list(frontier)
+            frontier.clear()
+            # Every unit the layer could create is probed in one batch up front.
+            probed_units = self.__probe_adjacent_units(
+                [unit for unit in layer if unit not in visited_units]
+            )
+            for current_unit in layer:
+                if len(include_units) >= self.unit_upper_bound:
+                    break
+                if current_unit in visited_units:
+                    continue
                 visited_units.add(current_unit)
                 include_units.add(current_unit)
                 label_x, label_y = current_unit.coordinate_label
                 adjacent_exists: list[bool] = self.__connect_existing_grid_units(
                     current_unit, label_x, label_y
                 )
-                for unit_already_exists, unit_creation_function in zip(
-                    adjacent_exists, self.__adjacent_unit_functions
+                for unit_already_exists, (x_offset, y_offset) in zip(
+                    adjacent_exists, self.__label_direction_offsets
                 ):
                     # If no unit exists yet, create one and connect it to the grid.
                     if not unit_already_exists:
-                        adjacent_unit = unit_creation_function(
-                            current_unit, vector_offset=self.unit_separation
-                        )
+                        adjacent_unit = probed_units[
+                            (label_x + x_offset, label_y + y_offset)
+                        ]
                         self.__handle_created_grid_unit(
                             current_unit, adjacent_unit, frontier
                         )
@@ -183,9 +254,165 @@ class VillageGridFoundation:  # TODO: Test function to display edges between con
         if auto_connect:
             for added_unit in self:
                 label_x, label_y = added_unit.coordinate_label
-                self.__connect_existing_grid_units()
+                self.__connect_existing_grid_units(added_unit, label_x, label_y)
         return include_units
 
+    def __probe_adjacent_units(
+        self, layer: list[VillageGridUnit]
+    ) -> dict[tuple[int, int], VillageGridUnit]:
+        # Units are spaced evenly, so any neighbour gives the same position for a label.
+        columns: dict[tuple[int, int], tuple[int, int]] = dict()
+        for unit in layer:
+            label_x, label_y = unit.coordinate_label
+            for x_offset, y_offset in self.__label_direction_offsets:
+                label = (label_x + x_offset, label_y + y_offset)
+                if label not in self._label_index and label not in columns:
+                    columns[label] = (
+                        unit.vector_position.x + x_offset * self.unit_separation,
+                        unit.vector_position.z + y_offset * self.unit_separation,
+                    )
+        return {
+            label: VillageGridUnit(position, label, terrain_type)
+            for label, (position, terrain_type) in self.__probe_columns(columns).items()
+        }
+
+    def __probe_columns(
+        self, columns: dict[tuple[int, int], tuple[int, int]]
+    ) -> dict[tuple[int, int], tuple[Vec3, TerrainType]]:
+        # Surface position and terrain of every labelled column, in two batches.
+        heights = server_connection.probe_heights(list(columns.values()))
+        positions = [
+            Vec3(x, height, z) for (x, z), height in zip(columns.values(), heights)
+        ]
+        block_ids = server_connection.probe_blocks(positions)
+        return {
+            label: (position, TERRAIN_TYPES[classify_block(block_id)])
+            for label, position, block_id in zip(columns, positions, block_ids)
+        }
+
+    def build_village_array(self, *, auto_connect: bool = True) -> GridArray:
+        # Grown like build_village_grid, but straight into arrays. No unit object
+        # is created, so a unit costs a few bytes and the foundation stays empty.
+        # Probes are batched per layer without a snapshot, as a copy of the
+        # region would cost kilobytes per unit.
+        return self.__build_village_array(auto_connect=auto_connect)
+
+    def __build_village_array(self, *, auto_connect: bool) -> GridArray:
+        start: Vec3 = self.starting_position
+        grid = GridArray.empty(
+            (0, 0),
+            terrain_types=tuple(TerrainType),
+            origin=(start.x, start.z),
+            stride=self.unit_separation,
+        )
+        weights: np.ndarray = self.__edge_weight_table(grid.terrain_types)
+        grid.add_tile((0, 0), start.y, VillageGridUnit.derive_vector_terrain(start))
+        # Labels are only queued when created, so none is visited twice.
+        frontier: deque[tuple[int, int]] = deque([(0, 0)])
+        included_units: int = 0
+        while frontier and included_units < self.unit_upper_bound:
+            layer: list[tuple[int, int]] = list(frontier)
+            frontier.clear()
+            columns: dict[tuple[int, int], tuple[int, int]] = dict()
+            for label_x, label_y in layer:
+                for x_offset, y_offset in self.__label_direction_offsets:
+                    label = (label_x + x_offset, label_y + y_offset)
+                    if label not in grid and label not in columns:
+                        columns[label] = (
+                            grid.origin[0] + label[0] * grid.stride,
+                            grid.origin[1] + label[1] * grid.stride,
+                        )
+            probed_columns = self.__probe_columns(columns)
+            for label_x, label_y in layer:
+                if included_units >= self.unit_upper_bound:
+                    break
+                included_units += 1
+                # Existing neighbours are connected before any is created.
+                adjacent_labels = [
+                    (label_x + x_offset, label_y + y_offset)
+                    for x_offset, y_offset in self.__label_direction_offsets
+                ]
+                adjacent_exists = [label in grid for label in adjacent_labels]
+                for label, exists in zip(adjacent_labels, adjacent_exists):
+                    if exists:
+                        self.__add_array_edge(grid, weights, (label_x, label_y), label)
+                for label, exists in zip(adjacent_labels, adjacent_exists):
+                    if not exists:
+                        position, terrain_type = probed_columns[label]
+                        grid.add_tile(label, position.y, terrain_type)
+                        if self.__add_array_edge(
+                            grid, weights, (label_x, label_y), label
+                        ):
+                            frontier.append(label)
+        if auto_connect:
+            # Every pair of adjacent units is connected at once, as in the unit graph.
+            grid.south[:-1] = self.__array_edge_weights(
+                weights, grid, (slice(None, -1), slice(None)), (slice(1, None), slice(None))
+            )
+            grid.east[:, :-1] = self.__array_edge_weights(
+                weights, grid, (slice(None), slice(None, -1)), (slice(None), slice(1, None))
+            )
+        return grid
+
+    def __edge_weight_table(
+        self, terrain_types: typing.Sequence[typing.Optional[TerrainType]]
+    ) -> np.ndarray:
+        # Weight by both terrain codes and elevation difference, zero where not allowed.
+        weights: np.ndarray = np.full(
+            (len(terrain_types), len(terrain_types), self.height_variance_tolerance + 1),
+            NO_EDGE,
+            dtype=np.uint16,
+        )
+        for code_one, terrain_one in enumerate(terrain_types):
+            for code_two, terrain_two in enumerate(terrain_types):
+                if terrain_one is None or terrain_two is None:
+                    continue  # Missing units have no edges.
+                for difference in range(self.height_variance_tolerance + 1):
+                    edge_weight = self.__terrain_edge_weight(
+                        terrain_one, 0, terrain_two, difference
+                    )
+                    if edge_weight is not None:
+                        weights[code_one, code_two, difference] = edge_weight
+        return weights
+
+    def __array_edge_weights(
+        self,
+        weights: np.ndarray,
+        grid: GridArray,
+        region_one: tuple[slice, slice],
+        region_two: tuple[slice, slice],
+    ) -> np.ndarray:
+        difference = np.abs(grid.heights[region_one] - grid.heights[region_two])
+        edge_weights = weights[
+            grid.terrain[region_one],
+            grid.terrain[region_two],
+            np.minimum(difference, self.height_variance_tolerance),
+        ]
+        edge_weights[difference > self.height_variance_tolerance] = NO_EDGE
+        return edge_weights
+
+    def __add_array_edge(
+        self,
+        grid: GridArray,
+        weights: np.ndarray,
+        label_one: tuple[int, int],
+        label_two: tuple[int, int],
+    ) -> bool:
+        # Return and don't create the edge if it's pre-existing or invalid.
+        if grid.weight(label_one, label_two) != NO_EDGE:
+            return False
+        index_one, index_two = grid.index(label_one), grid.index(label_two)
+        difference = abs(int(grid.heights[index_one]) - int(grid.heights[index_two]))
+        if difference > self.height_variance_tolerance:
+            return False
+        edge_weight = int(
+            weights[grid.terrain[index_one], grid.terrain[index_two], difference]
+        )
+        if edge_weight == NO_EDGE:
+            return False
+        grid.set_weight(label_one, label_two, edge_weight)
+        return True
+
     def __connect_existing_grid_units(
         self,
         current_unit: VillageGridUnit,
@@ -199,8 +426,7 @@ class VillageGridFoundation:  # TODO: Test function to display edges between con
             new_x, new_y = label_x + x_offset, label_y + y_offset
             if (
                 found_unit := self.find_grid_unit(coordinate_label=(new_x, new_y))
-                is not None
-            ):
+            ) is not None:
                 self.add_grid_edge(current_unit, found_unit)
                 adjacent_unit_exists[index] = True
         return adjacent_unit_exists  # Return indication of where units exist.
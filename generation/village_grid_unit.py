@@ -1,14 +1,11 @@
 from __future__ import annotations
 from generation import connection as server_connection
+from generation.terrain import TERRAIN_NAMES, classify_block
 from mcpi.vec3 import Vec3
 import dataclasses
 import typing
 import enum
 import math
-import json
-
-
-terrain_type_codes = json.load("config/block_terrain_types.json")
 
 
 class TerrainType(enum.Enum):
@@ -19,7 +16,13 @@ class TerrainType(enum.Enum):
     TREE = "Tree"
 
 
-@dataclasses.dataclass
+# Terrain type of every terrain code.
+TERRAIN_TYPES: tuple[TerrainType, ...] = tuple(map(TerrainType, TERRAIN_NAMES))
+
+
+# Units are graph nodes, so they hash by identity.
+# Slotted as foundations hold thousands of units.
+@dataclasses.dataclass(eq=False, slots=True)
 class VillageGridUnit:
     vector_position: Vec3
     coordinate_label: tuple[int, int]
@@ -29,24 +32,19 @@ class VillageGridUnit:
     _distance_to_centre: float = math.inf
 
     def __post_init__(self) -> None:
-        # Use vector field to derive terrain.
-        self._terrain_type = VillageGridUnit.derive_vector_terrain(self.vector_position)
+        # Use vector field to derive terrain unless it was probed in advance.
+        if self._terrain_type is None:
+            self._terrain_type = VillageGridUnit.derive_vector_terrain(
+                self.vector_position
+            )
 
     @staticmethod
     def derive_vector_terrain(block_position: Vec3) -> TerrainType:
         block_id = server_connection.getBlock(
             block_position.x, block_position.y, block_position.z
         )
-        # Match the received block id against those grouped by terrain type.
-        for terrain_type, terrain_type_value in TerrainType:
-            terrain_type_block_ids = terrain_type_codes.get(terrain_type_value)
-            if (
-                terrain_type_block_ids is not None
-                and block_id in terrain_type_block_ids
-            ):
-                return terrain_type
-        # Return ground if no matches identified for another type.
-        return TerrainType.GROUND
+        # Unlisted block ids classify as ground.
+        return TERRAIN_TYPES[classify_block(block_id)]
 
     # TODO: Clean up these functions below using decorators? Need to consolidate shared code.
 
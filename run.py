@@ -1,16 +1,95 @@
 import logging.config
-from typing import NoReturn
-import generation.village as village
+from typing import NoReturn, Optional, Tuple
+import argparse
+import asyncio
+import generation
+from generation.offline import connect_offline
+from generation.transport import AsyncConnection
+from generation.transport.standin import StandInServer, SyntheticWorld
+from generation.render import export
 
 
 def set_logger() -> NoReturn:
     logging.config.fileConfig('log.conf')
 
 
-def run() -> NoReturn:
+def run(workers: int = 1) -> NoReturn:
     set_logger()
-    village.Village(max_houses=200, max_grid_size=1000)
+    # Imported late, as modules bind the shared connection on import.
+    import generation.village as village
+    village.Village(max_houses=200, max_grid_size=1000, workers=workers)
+
+
+async def run_async(address: Optional[Tuple[str, int]] = None) -> NoReturn:
+    set_logger()
+    import generation.village as village
+    connection = await AsyncConnection.open(*(address or generation.server_address()))
+    try:
+        await village.Village.create_async(
+            max_houses=200, max_grid_size=1000, connection=connection
+        )
+    finally:
+        await connection.close()
 
 
 if __name__ == '__main__':
-    run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--async', dest='use_async', action='store_true',
+        help='sample terrain over an asyncio connection',
+    )
+    parser.add_argument(
+        '--standin', type=int, metavar='SEED',
+        help='generate into a local stand-in server with a synthetic world',
+    )
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='seconds every stand-in server reply takes to arrive',
+    )
+    parser.add_argument(
+        '--offline', type=int, metavar='SEED',
+        help='render into a voxel canvas over a synthetic world instead of a server',
+    )
+    parser.add_argument(
+        '--export', metavar='PATH',
+        help='write the offline render to a .schem or .npz file',
+    )
+    parser.add_argument(
+        '--diff', action='store_true',
+        help='only send the blocks that buffered writes actually change',
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1, metavar='N',
+        help='plan houses in N processes, 0 for one per core',
+    )
+    parser.add_argument(
+        '--record', metavar='LOG',
+        help='also log every block write for replay with generation.transport.recording',
+    )
+    args = parser.parse_args()
+    if args.offline is not None and args.use_async:
+        parser.error('--async needs a server and cannot render offline')
+    if args.record is not None and args.offline is not None:
+        parser.error('--record logs writes to a server and cannot render offline')
+    if args.export is not None and args.offline is None:
+        parser.error('--export needs --offline')
+    if args.workers != 1 and args.use_async:
+        parser.error('--workers plans houses without asyncio')
+    if args.workers < 0:
+        parser.error('--workers cannot be negative')
+    if args.offline is not None:
+        connect_offline(SyntheticWorld(args.offline))
+    else:
+        address = generation.server_address()
+        if args.standin is not None:
+            server = StandInServer(SyntheticWorld(args.standin), latency=args.latency)
+            address = server.start().address
+        generation.connect(*address, record=args.record, diff=args.diff)
+    if args.use_async:
+        # --async cannot be offline, so both connections reach the same server.
+        asyncio.run(run_async(address))
+    else:
+        run(args.workers)
+    if args.export is not None:
+        generation.connection.sync()
+        export(generation.connection.canvas, args.export)